@@ -1,7 +1,8 @@
 import os
+import json
 from typing import List, Optional, Any, Dict
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -15,13 +16,28 @@ from src.document_ingestion.data_ingestion import (
 )
 from src.doc_analyzer.data_analysis import DocumentAnalyzer
 from src.doc_compare.doc_comparator import DocumentComparatorLLM
-from src.doc_chat.retrieval import ConversationalRAG
+from src.doc_chat.retrieval import ConversationalRAG, rag_metrics
 from utils.document_ops import FastAPIFileAdapter,read_pdf_via_handler
+from utils.model_loader import MODEL_REGISTRY
+from utils.vectorstore_cache import VECTORSTORE_CACHE
+from utils.executors import get_executor, run_in_pool, executor_stats, shutdown_executors
+from utils.embedding_cache import embedding_cache_stats
+from utils.metrics import memory_breakdown
+from utils.file_io import UploadTooLargeError
+from utils.blob_store import get_blob_store
+from utils.config_loader import load_config_section
+from src.document_ingestion.jobs import QUEUED, get_job_queue, queue_location, run_next_job
+from src.document_ingestion.segments import is_legacy, is_ready
 from logger import GLOBAL_LOGGER as log
 
 FAISS_BASE = os.getenv("FAISS_BASE", "faiss_index")
 UPLOAD_BASE = os.getenv("UPLOAD_BASE", "data")
 FAISS_INDEX_NAME = os.getenv("FAISS_INDEX_NAME", "index")  # <--- keep consistent with save_local()
+WARM_MODELS = os.getenv("WARM_MODELS", "true").lower() == "true"
+# false when a separate ingestion tier (python -m src.document_ingestion.worker) consumes the queue
+JOBS_RUN_IN_API = os.getenv(
+    "JOBS_RUN_IN_API", str(load_config_section("jobs").get("run_in_api", True))
+).lower() == "true"
 
 app = FastAPI(title="Document Portal API", version="0.1")
 
@@ -37,6 +53,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def warm_models() -> None:
+    # load embedding model + LLM client once per worker, before the first request
+    if not WARM_MODELS:
+        return
+    try:
+        stats = MODEL_REGISTRY.warm()
+        log.info("Models warmed", models=stats)
+    except Exception:
+        log.exception("Model warm-up failed; models will load lazily on first use")
+
+@app.on_event("startup")
+def resume_jobs() -> None:
+    # jobs left behind by a killed worker, or queued while no ingest process ran
+    if not JOBS_RUN_IN_API:
+        return
+    try:
+        queue = get_job_queue()
+        queue.requeue_stale(float(load_config_section("jobs").get("stale_after_s", 300)))
+        for _ in range(queue.stats()[QUEUED]):
+            _dispatch_job()
+    except Exception:
+        log.exception("Resuming queued jobs failed")
+
+def _dispatch_job() -> None:
+    # an ingest process claims the oldest queued job, whichever API worker queued it
+    if JOBS_RUN_IN_API:
+        get_executor("ingest").submit(run_next_job, *queue_location())
+
+@app.on_event("shutdown")
+def stop_executors() -> None:
+    shutdown_executors(wait=False)
+
 @app.get("/", response_class=HTMLResponse)
 async def serve_ui(request: Request):
     log.info("Serving UI homepage.")
@@ -49,16 +98,40 @@ def health() -> Dict[str, str]:
     log.info("Health check passed.")
     return {"status": "ok", "service": "document-portal"}
 
+@app.get("/metrics")
+def metrics() -> Dict[str, Any]:
+    return {
+        "models": MODEL_REGISTRY.stats(),
+        "vectorstore_cache": VECTORSTORE_CACHE.stats(),
+        "executors": executor_stats(),
+        "rag": rag_metrics(),
+        "embedding_cache": embedding_cache_stats(),
+        "process": memory_breakdown(),
+        "blob_store": get_blob_store().stats(),
+        "jobs": get_job_queue().stats(),
+    }
+
+def _raise_if_too_large(e: BaseException) -> None:
+    """Surface an upload size-limit hit (possibly wrapped) as 413 instead of 500."""
+    cause: Optional[BaseException] = e
+    while cause is not None:
+        if isinstance(cause, UploadTooLargeError):
+            raise HTTPException(status_code=413, detail=str(cause))
+        cause = cause.__cause__
+
 # ---------- ANALYZE ----------
 @app.post("/analyze")
 async def analyze_document(file: UploadFile = File(...)) -> Any:
     try:
         log.info(f"Received file for analysis: {file.filename}")
         dh = DocHandler()
-        saved_path = dh.save_pdf(FastAPIFileAdapter(file))
-        text = read_pdf_via_handler(dh, saved_path)
+        # disk + parsing run on bounded pools; the LLM call is awaited on the loop
+        saved_path = await run_in_pool("io", dh.save_pdf, FastAPIFileAdapter(file))
+        text = await run_in_pool("cpu", read_pdf_via_handler, dh, saved_path)
+        # title, author, dates, page count, language: read from the PDF, not generated
+        metadata = await run_in_pool("cpu", dh.read_metadata, saved_path)
         analyzer = DocumentAnalyzer()
-        result = analyzer.analyze_document(text)
+        result = await analyzer.aanalyze_document(text, metadata=metadata)
         summary = result["Summary"]
         summary_text = " ".join(result["Summary"])
 
@@ -69,6 +142,7 @@ async def analyze_document(file: UploadFile = File(...)) -> Any:
     except HTTPException:
         raise
     except Exception as e:
+        _raise_if_too_large(e)
         log.exception("Error during document analysis")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {e}")
 
@@ -78,23 +152,61 @@ async def compare_documents(reference: UploadFile = File(...), actual: UploadFil
     try:
         log.info(f"Comparing files: {reference.filename} vs {actual.filename}")
         dc = DocumentComparator()
-        ref_path, act_path = dc.save_uploaded_files(
-            FastAPIFileAdapter(reference), FastAPIFileAdapter(actual)
-        )
-        _ = ref_path, act_path
-        combined_text = dc.combine_documents()
+        await run_in_pool("io", dc.save_uploads, FastAPIFileAdapter(reference), FastAPIFileAdapter(actual))
+        ref_pages, act_pages = await run_in_pool("cpu", dc.load_pages)
         comp = DocumentComparatorLLM()
-        df = comp.compare_documents(combined_text)
+        # identical pages are resolved locally; only page diffs are sent to the LLM
+        df = await comp.acompare_pages(ref_pages, act_pages)
         log.info("Document comparison completed.")
         return {"rows": df.to_dict(orient="records"), "session_id": dc.session_id}
     # except HTTPException:
     #     raise
     except Exception as e:
+        _raise_if_too_large(e)
         log.exception("Comparison failed")
         raise HTTPException(status_code=500, detail=f"Comparison failed: {e}")
 
+@app.post("/compare/stream")
+async def compare_documents_stream(reference: UploadFile = File(...), actual: UploadFile = File(...)) -> Any:
+    """
+    NDJSON variant of /compare: one `{"event": "row", "data": {...}}` line per
+    page as soon as it is known (unchanged pages first, then each LLM window
+    as it completes; `order` gives the row's position), then `done` (or `error`).
+    """
+    try:
+        log.info(f"Comparing files (stream): {reference.filename} vs {actual.filename}")
+        dc = DocumentComparator()
+        await run_in_pool("io", dc.save_uploads, FastAPIFileAdapter(reference), FastAPIFileAdapter(actual))
+        ref_pages, act_pages = await run_in_pool("cpu", dc.load_pages)
+        comp = DocumentComparatorLLM()
+    except Exception as e:
+        _raise_if_too_large(e)
+        log.exception("Comparison setup failed")
+        raise HTTPException(status_code=500, detail=f"Comparison failed: {e}")
+
+    async def row_stream():
+        rows = 0
+        try:
+            async for row in comp.astream_rows(ref_pages, act_pages):
+                rows += 1
+                yield _ndjson("row", row)
+            yield _ndjson("done", {"session_id": dc.session_id, "rows": rows})
+        except Exception as e:
+            # headers are already sent, so report failures in-band
+            log.exception("Comparison stream failed")
+            yield _ndjson("error", {"detail": f"Comparison failed: {e}"})
+
+    return StreamingResponse(
+        row_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _ndjson(event: str, data: Any) -> str:
+    return json.dumps({"event": event, "data": data}, ensure_ascii=False) + "\n"
+
 # ---------- CHAT: INDEX ----------
-@app.post("/chat/index")
+@app.post("/chat/index", status_code=202)
 async def chat_build_index(
     files: List[UploadFile] = File(...),
     session_id: Optional[str] = Form(None),
@@ -103,31 +215,87 @@ async def chat_build_index(
     chunk_overlap: int = Form(200),
     k: int = Form(5),
 ) -> Any:
+    """Save the uploads and queue the indexing; poll /chat/index/{job_id} for progress."""
     try:
         log.info(f"Indexing chat session. Session ID: {session_id}, Files: {[f.filename for f in files]}")
         wrapped = [FastAPIFileAdapter(f) for f in files]
-        # this is my main class for storing a data into VDB
-        # created a object of ChatIngestor
         ci = ChatIngestor(
             temp_base=UPLOAD_BASE,
             faiss_base=FAISS_BASE,
             use_session_dirs=use_session_dirs,
             session_id=session_id or None,
         )
-        # NOTE: ensure your ChatIngestor saves with index_name="index" or FAISS_INDEX_NAME
-        # e.g., if it calls FAISS.save_local(dir, index_name=FAISS_INDEX_NAME)
-        ci.built_retriver(  # if your method name is actually build_retriever, fix it there as well
-            wrapped, chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k
-        )
-        log.info(f"Index created successfully for session: {ci.session_id}")
-        return {"session_id": ci.session_id, "k": k, "use_session_dirs": use_session_dirs}
+        # only the uploads are persisted in the request; parse + embed + index run as a job
+        records = await run_in_pool("io", ci.save, wrapped)
+        job_id = get_job_queue().submit("chat_index", {
+            "session_id": ci.session_id,
+            "temp_base": UPLOAD_BASE,
+            "faiss_base": FAISS_BASE,
+            "use_session_dirs": use_session_dirs,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "files": [{"path": str(r.path), "name": r.name, "sha256": r.sha256, "size": r.size} for r in records],
+        })
+        _dispatch_job()
+        log.info("Index job queued", session_id=ci.session_id, job_id=job_id, files=len(records))
+        return {
+            "job_id": job_id,
+            "state": QUEUED,
+            "status_url": f"/chat/index/{job_id}",
+            "session_id": ci.session_id,
+            "k": k,
+            "use_session_dirs": use_session_dirs,
+        }
     except HTTPException:
         raise
     except Exception as e:
+        _raise_if_too_large(e)
         log.exception("Chat index building failed")
         raise HTTPException(status_code=500, detail=f"Indexing failed: {e}")
 
+@app.get("/chat/index/{job_id}")
+def chat_index_status(job_id: str) -> Dict[str, Any]:
+    """State (queued/running/succeeded/failed), per-stage progress, timings and, once done, the sync stats."""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return {
+        "job_id": job["id"],
+        "state": job["state"],
+        "session_id": job["payload"].get("session_id"),
+        "progress": job["progress"] or {},
+        "timings": job["timings"],
+        "result": job["result"],
+        "error": job["error"],
+    }
+
 # ---------- CHAT: QUERY ----------
+def _resolve_index_dir(session_id: Optional[str], use_session_dirs: bool) -> str:
+    if use_session_dirs and not session_id:
+        raise HTTPException(status_code=400, detail="session_id is required when use_session_dirs=True")
+
+    index_dir = os.path.join(FAISS_BASE, session_id) if use_session_dirs else FAISS_BASE  # type: ignore
+    if not os.path.isdir(index_dir):
+        raise HTTPException(status_code=404, detail=f"FAISS index not found at: {index_dir}")
+    if is_legacy(Path(index_dir), FAISS_INDEX_NAME):
+        # queries never unpickle; pre-segment sessions are converted once, offline
+        raise HTTPException(
+            status_code=409,
+            detail=f"Index at {index_dir} uses the legacy pickled layout; "
+                   f"run `python -m src.document_ingestion.migrate_indexes {index_dir}`",
+        )
+    if not is_ready(Path(index_dir), FAISS_INDEX_NAME):
+        # /chat/index creates the session dir before its job has committed anything
+        raise HTTPException(
+            status_code=409,
+            detail=f"Index at {index_dir} is not ready yet; poll /chat/index/{{job_id}} until the job succeeds",
+        )
+    return index_dir
+
+def _sse(event: str, data: Any) -> str:
+    # JSON-encode the payload so newlines inside tokens can't break SSE framing
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @app.post("/chat/query")
 async def chat_query(
     question: str = Form(...),
@@ -137,16 +305,13 @@ async def chat_query(
 ) -> Any:
     try:
         log.info(f"Received chat query: '{question}' | session: {session_id}")
-        if use_session_dirs and not session_id:
-            raise HTTPException(status_code=400, detail="session_id is required when use_session_dirs=True")
-
-        index_dir = os.path.join(FAISS_BASE, session_id) if use_session_dirs else FAISS_BASE  # type: ignore
-        if not os.path.isdir(index_dir):
-            raise HTTPException(status_code=404, detail=f"FAISS index not found at: {index_dir}")
+        index_dir = _resolve_index_dir(session_id, use_session_dirs)
 
         rag = ConversationalRAG(session_id=session_id)
-        rag.load_retriever_from_faiss(index_dir, k=k, index_name=FAISS_INDEX_NAME)  # build retriever + chain
-        response = rag.invoke(question, chat_history=[])
+        await run_in_pool(  # build retriever + chain (disk load on cache miss)
+            "io", rag.load_retriever_from_faiss, index_dir, k=k, index_name=FAISS_INDEX_NAME
+        )
+        response = await rag.ainvoke(question, chat_history=[])
         log.info("Chat query handled successfully.")
 
         return {
@@ -161,6 +326,43 @@ async def chat_query(
         log.exception("Chat query failed")
         raise HTTPException(status_code=500, detail=f"Query failed: {e}")
 
+@app.post("/chat/query/stream")
+async def chat_query_stream(
+    question: str = Form(...),
+    session_id: Optional[str] = Form(None),
+    use_session_dirs: bool = Form(True),
+    k: int = Form(5),
+) -> Any:
+    """Server-sent events: `sources` first, then `token` chunks, then `done` (or `error`)."""
+    try:
+        log.info(f"Received streaming chat query: '{question}' | session: {session_id}")
+        index_dir = _resolve_index_dir(session_id, use_session_dirs)
+
+        rag = ConversationalRAG(session_id=session_id)
+        await run_in_pool(
+            "io", rag.load_retriever_from_faiss, index_dir, k=k, index_name=FAISS_INDEX_NAME
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.exception("Chat stream setup failed")
+        raise HTTPException(status_code=500, detail=f"Query failed: {e}")
+
+    async def event_stream():
+        try:
+            async for event in rag.astream(question, chat_history=[]):
+                yield _sse(event["event"], event["data"])
+        except Exception as e:
+            # headers are already sent, so report failures in-band
+            log.exception("Chat stream failed")
+            yield _sse("error", {"detail": f"Query failed: {e}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # command for executing the fast api
 # uvicorn api.main:app --port 8080 --reload    
 #uvicorn api.main:app --host 0.0.0.0 --port 8080 --reload
\ No newline at end of file
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import json
+import time
 
 # ================= CONFIG =================
 API_BASE = "http://localhost:8000"  # change if needed
@@ -19,6 +20,19 @@ pre { background:#0a0f16; color:#e8f0ff; padding:1rem; border-radius:12px; }
 </style>
 """, unsafe_allow_html=True)
 
+
+def iter_sse(res):
+    """Yield (event, data) pairs from a server-sent-events response."""
+    event = "message"
+    for line in res.iter_lines(decode_unicode=True):
+        if not line:
+            event = "message"
+            continue
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):].strip())
+
 # ================= HEADER =================
 st.title("📚 Document Portal")
 
@@ -141,12 +155,20 @@ with tab_chat:
                             data=data
                         )
 
-                        if res.status_code != 200:
+                        if res.status_code not in (200, 202):
                             st.error(res.text)
                         else:
                             out = res.json()
-                            st.session_state["session"] = out.get("session_id")
-                            st.success(f"Indexed ✔ Session: {st.session_state['session']}")
+                            # indexing runs as a background job; poll until it settles
+                            job = {"state": out.get("state", "succeeded")}
+                            while job["state"] in ("queued", "running"):
+                                time.sleep(1)
+                                job = requests.get(f"{API_BASE}{out['status_url']}").json()
+                            if job["state"] != "succeeded":
+                                st.error(job.get("error") or job["state"])
+                            else:
+                                st.session_state["session"] = out.get("session_id")
+                                st.success(f"Indexed ✔ Session: {st.session_state['session']}")
                     except Exception as e:
                         st.error(str(e))
 
@@ -160,26 +182,45 @@ with tab_chat:
         elif use_session and "session" not in st.session_state:
             st.warning("Build index first.")
         else:
-            with st.spinner("Thinking..."):
-                try:
-                    data = {
-                        "question": question,
-                        "k": top_k,
-                        "use_session_dirs": str(use_session).lower()
-                    }
-                    if use_session:
-                        data["session_id"] = st.session_state["session"]
-
+            try:
+                data = {
+                    "question": question,
+                    "k": top_k,
+                    "use_session_dirs": str(use_session).lower()
+                }
+                if use_session:
+                    data["session_id"] = st.session_state["session"]
+
+                # stream tokens as they arrive instead of waiting for the full answer
+                with st.spinner("Retrieving..."):
                     res = requests.post(
-                        f"{API_BASE}/chat/query",
-                        data=data
+                        f"{API_BASE}/chat/query/stream",
+                        data=data,
+                        stream=True
                     )
 
-                    if res.status_code != 200:
-                        st.error(res.text)
-                    else:
-                        answer = res.json().get("answer")
-                        st.markdown("### Answer")
-                        st.markdown(answer or "No answer.")
-                except Exception as e:
-                    st.error(str(e))
+                if res.status_code != 200:
+                    st.error(res.text)
+                else:
+                    st.markdown("### Answer")
+                    placeholder = st.empty()
+                    answer = ""
+                    sources = []
+                    for event, payload in iter_sse(res):
+                        if event == "sources":
+                            sources = payload
+                            placeholder.markdown("_Generating answer..._")
+                        elif event == "token":
+                            answer += payload
+                            placeholder.markdown(answer + "▌")
+                        elif event == "error":
+                            st.error(payload.get("detail"))
+                    placeholder.markdown(answer or "No answer.")
+                    if sources:
+                        with st.expander(f"Sources ({len(sources)})"):
+                            for s in sources:
+                                page = s.get("page")
+                                st.markdown(f"**{s.get('source')}**" + (f" — page {page + 1}" if isinstance(page, int) else ""))
+                                st.caption(s.get("preview", ""))
+            except Exception as e:
+                st.error(str(e))
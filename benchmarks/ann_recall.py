@@ -0,0 +1,98 @@
+"""
+Recall@k / latency of the FAISS index types built by utils.index_factory,
+measured against exact flat search on synthetic clustered embeddings.
+
+    python benchmarks/ann_recall.py --n 200000 --dim 384 --k 10
+    python benchmarks/ann_recall.py --nprobe 8 16 32 --ef-search 32 64 128
+"""
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils.index_factory import apply_search_params, index_settings, new_index  # noqa: E402
+
+
+def synthetic(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    # sentence embeddings are clustered by topic; uniform noise would flatter IVF
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    data = centers[rng.integers(0, clusters, n)] + 0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def run(kind: str, data: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, settings: dict) -> dict:
+    n, dim = data.shape
+    t0 = time.perf_counter()
+    index = new_index(dim, n, kind, settings)
+    if not index.is_trained:
+        rows = np.random.default_rng(0).choice(n, min(n, int(settings["train_sample"])), replace=False)
+        index.train(data[rows])
+    index.add(data)
+    build_s = time.perf_counter() - t0
+    apply_search_params(index, settings)
+
+    t0 = time.perf_counter()
+    _, found = index.search(queries, k)
+    per_query_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+    return {
+        "type": kind,
+        "build_s": round(build_s, 2),
+        "ms/query": round(per_query_ms, 3),
+        "MB": round(faiss.serialize_index(index).nbytes / 2**20, 1),
+        f"recall@{k}": round(recall_at_k(found, truth), 3),
+        "nprobe": settings["nprobe"] if kind.startswith("ivf") else "-",
+        "efSearch": settings["ef_search"] if kind == "hnsw" else "-",
+    }
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--n", type=int, default=100_000)
+    p.add_argument("--dim", type=int, default=384)
+    p.add_argument("--queries", type=int, default=500)
+    p.add_argument("--clusters", type=int, default=200)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--types", nargs="+", default=["flat", "hnsw", "ivf_flat", "ivf_pq"])
+    p.add_argument("--nprobe", type=int, nargs="+", default=None)
+    p.add_argument("--ef-search", type=int, nargs="+", default=None)
+    args = p.parse_args()
+
+    data = synthetic(args.n, args.dim, args.clusters)
+    queries = synthetic(args.queries, args.dim, args.clusters, seed=1)
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(data)
+    _, truth = exact.search(queries, args.k)
+
+    base = index_settings()
+    rows = []
+    for kind in args.types:
+        if kind.startswith("ivf"):
+            variants = [{"nprobe": v} for v in (args.nprobe or [base["nprobe"]])]
+        elif kind == "hnsw":
+            variants = [{"ef_search": v} for v in (args.ef_search or [base["ef_search"]])]
+        else:
+            variants = [{}]
+        for v in variants:
+            rows.append(run(kind, data, queries, truth, args.k, {**base, **v}))
+
+    cols = list(rows[0])
+    print(f"n={args.n} dim={args.dim} queries={args.queries} k={args.k}")
+    print("  ".join(f"{c:>10}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{str(r[c]):>10}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Cold load time and heap growth of a session index: pickled docstore
+(FAISS.save_local / load_local) vs. chunks.sqlite + memory-mapped index.
+
+    python benchmarks/chunk_store_load.py --chunks 100000
+"""
+from __future__ import annotations
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# runs in a fresh interpreter so every load is cold and measured in isolation
+_PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from utils.metrics import memory_breakdown
+from utils.config_loader import load_config_section
+from src.document_ingestion.chunk_store import load_store
+emb = DeterministicFakeEmbedding(size={dim})
+load_config_section("faiss_db")  # keep config parsing out of the timed load
+before = memory_breakdown()
+t0 = time.perf_counter()
+if {legacy}:
+    store = FAISS.load_local({path!r}, emb, allow_dangerous_deserialization=True)
+else:
+    store = load_store({path!r}, emb, mmap=True)
+loaded = time.perf_counter() - t0
+t0 = time.perf_counter()
+store.similarity_search_by_vector([0.1] * {dim}, k=5)
+query = time.perf_counter() - t0
+after = memory_breakdown()
+print(json.dumps({{"load_s": loaded, "first_query_s": query,
+                  "heap_mb": (after.get("rss_anon", after["rss"]) - before.get("rss_anon", before["rss"])) / 2**20}}))
+"""
+
+
+def build(path: Path, chunks: int, dim: int) -> None:
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_community.vectorstores import FAISS
+    from src.document_ingestion.chunk_store import save_store
+
+    rng = np.random.default_rng(0)
+    texts = [f"chunk {i} " + "lorem ipsum dolor sit amet " * 30 for i in range(chunks)]
+    metas = [{"source": f"/data/session/upload_{i // 400}.pdf", "file_name": f"report_{i // 400}.pdf",
+              "doc_id": f"{i // 400:064x}", "total_pages": 400, "page": i % 400} for i in range(chunks)]
+    vectors = rng.random((chunks, dim), dtype=np.float32)
+    store = FAISS.from_embeddings(list(zip(texts, vectors)), DeterministicFakeEmbedding(size=dim), metadatas=metas)
+    store.save_local(str(path / "pickled"))
+    save_store(store, path / "sqlite")
+
+
+def probe(path: Path, dim: int, legacy: bool) -> dict:
+    code = _PROBE.format(root=str(ROOT), dim=dim, legacy=legacy, path=str(path))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--chunks", type=int, default=100_000)
+    p.add_argument("--dim", type=int, default=384)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        t0 = time.perf_counter()
+        build(tmp, args.chunks, args.dim)
+        print(f"built {args.chunks} chunks x {args.dim}d in {time.perf_counter() - t0:.1f}s")
+        for label, legacy in (("pickled docstore", True), ("chunks.sqlite + mmap", False)):
+            r = probe(tmp / ("pickled" if legacy else "sqlite"), args.dim, legacy)
+            print(f"{label:>22}: load {r['load_s'] * 1000:8.1f} ms  first query {r['first_query_s'] * 1000:7.1f} ms"
+                  f"  heap +{r['heap_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
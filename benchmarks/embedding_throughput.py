@@ -0,0 +1,65 @@
+"""
+Embedding throughput (chunks/sec) of the stock HuggingFaceEmbeddings call
+vs. BatchEmbeddings across batch sizes and process counts, on synthetic
+chunks of mixed length (or lines of a text file you pass in).
+
+    python benchmarks/embedding_throughput.py --chunks 5000
+    python benchmarks/embedding_throughput.py --batch-sizes 32 64 128 --processes 0 4
+"""
+from __future__ import annotations
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils.config_loader import load_config_section  # noqa: E402
+from utils.embedding_engine import BatchEmbeddings  # noqa: E402
+
+_WORDS = ("revenue", "contract", "liability", "quarter", "clause", "termination", "payment", "schedule",
+          "warranty", "indemnity", "growth", "segment", "margin", "policy", "renewal", "notice")
+
+
+def make_chunks(n: int, seed: int = 0) -> list:
+    # splitter output is mostly full chunks with a tail of short ones
+    rng = random.Random(seed)
+    lengths = [rng.choice((40, 80, 120, 160, 200, 200, 200)) for _ in range(n)]
+    return [" ".join(rng.choice(_WORDS) for _ in range(words)) for words in lengths]
+
+
+def timed(label: str, fn, texts: list) -> None:
+    fn(texts[:64])  # warm-up: first call pays for lazy init
+    t0 = time.perf_counter()
+    fn(texts)
+    secs = time.perf_counter() - t0
+    print(f"{label:>34}: {len(texts) / secs:9.1f} chunks/sec  ({secs:6.2f}s)")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--chunks", type=int, default=5000)
+    p.add_argument("--text", type=Path, default=None, help="one chunk per line")
+    p.add_argument("--model", default=load_config_section("embedding_model").get("model"))
+    p.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 64, 128])
+    p.add_argument("--processes", type=int, nargs="+", default=[0])
+    args = p.parse_args()
+
+    texts = args.text.read_text(encoding="utf-8").splitlines() if args.text else make_chunks(args.chunks)
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    baseline = HuggingFaceEmbeddings(model_name=args.model)
+    timed("HuggingFaceEmbeddings (lists)", baseline.embed_documents, texts)
+    model = baseline.client  # reuse the loaded SentenceTransformer
+    for procs in args.processes:
+        for bs in args.batch_sizes:
+            emb = BatchEmbeddings(args.model, batch_size=bs, processes=procs, pool_min_texts=1, model=model)
+            try:
+                timed(f"BatchEmbeddings bs={bs} procs={procs or 1}", emb.embed_array, texts)
+            finally:
+                emb.close()
+
+
+if __name__ == "__main__":
+    main()
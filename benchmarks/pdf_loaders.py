@@ -0,0 +1,62 @@
+"""
+Pages/sec of LangChain's PyPDFLoader (pypdf) vs. PyMuPDFPageLoader (fitz)
+on a generated text-heavy PDF, or on a PDF you pass in.
+
+    python benchmarks/pdf_loaders.py --pages 500
+    python benchmarks/pdf_loaders.py --pdf path/to/report.pdf
+"""
+from __future__ import annotations
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fitz
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils.document_ops import PyMuPDFPageLoader  # noqa: E402
+
+_PARAGRAPH = (
+    "Revenue for the quarter increased 12% year over year, driven by subscription growth "
+    "in the enterprise segment and improved retention. Operating expenses rose 4%. "
+)
+
+
+def make_pdf(path: Path, pages: int) -> None:
+    doc = fitz.open()
+    for n in range(pages):
+        page = doc.new_page()
+        text = f"Section {n + 1}\n\n" + (_PARAGRAPH * 18)
+        page.insert_textbox(fitz.Rect(50, 50, 545, 800), text, fontsize=9)
+    doc.save(str(path))
+    doc.close()
+
+
+def timed(label: str, loader) -> None:
+    t0 = time.perf_counter()
+    pages = sum(1 for _ in loader.lazy_load())
+    secs = time.perf_counter() - t0
+    print(f"{label:>18}: {pages:5d} pages in {secs:7.2f}s  -> {pages / secs:8.1f} pages/sec")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--pages", type=int, default=500)
+    p.add_argument("--pdf", type=Path, default=None)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = args.pdf
+        if pdf is None:
+            pdf = Path(tmp) / "bench.pdf"
+            make_pdf(pdf, args.pages)
+        from langchain_community.document_loaders import PyPDFLoader
+
+        timed("PyPDFLoader", PyPDFLoader(str(pdf)))
+        timed("PyMuPDFPageLoader", PyMuPDFPageLoader(pdf))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Index size and recall@k of float32 vs. scalar-quantized (fp16 / sq8)
+vector storage, with and without exact re-ranking from the float32 side
+file, against exact float32 search.
+
+    python benchmarks/vector_storage.py --n 100000 --dim 384
+    python benchmarks/vector_storage.py --index-dir faiss_index/<session_id> --types flat hnsw
+
+--index-dir uses the vectors of an existing session index (our corpus);
+queries are held-out rows of it.
+"""
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ann_recall import recall_at_k, synthetic  # noqa: E402
+from utils.index_factory import apply_search_params, index_settings, new_index, reconstruct_all  # noqa: E402
+
+
+def corpus_vectors(index_dir: Path) -> np.ndarray:
+    from src.document_ingestion.chunk_store import EXACT_VECTORS_NAME
+
+    parts = []
+    for seg in sorted((index_dir / "segments").glob("seg_*")) or [index_dir]:
+        side = seg / EXACT_VECTORS_NAME
+        index = faiss.read_index(str(seg / "index.faiss"))
+        if side.exists():
+            parts.append(np.fromfile(side, dtype=np.float32).reshape(-1, index.d))
+        else:
+            vectors = reconstruct_all(index)
+            if vectors is None:
+                raise SystemExit(f"{seg}: lossy codes and no float32 side file")
+            parts.append(vectors)
+    return np.vstack(parts)
+
+
+def run(kind: str, storage: str, rescore: int, data, queries, truth, k: int, settings: dict) -> dict:
+    n, dim = data.shape
+    s = {**settings, "storage": storage}
+    t0 = time.perf_counter()
+    index = new_index(dim, n, kind, s)
+    if not index.is_trained:
+        rows = np.random.default_rng(0).choice(n, min(n, int(s["train_sample"])), replace=False)
+        index.train(data[rows])
+    index.add(data)
+    build_s = time.perf_counter() - t0
+    apply_search_params(index, s)
+
+    t0 = time.perf_counter()
+    _, found = index.search(queries, k * rescore if rescore else k)
+    if rescore:  # what RescoringFAISS does per query
+        reranked = []
+        for q, cand in zip(queries, found):
+            cand = cand[cand >= 0]
+            exact = ((data[cand] - q) ** 2).sum(axis=1)
+            reranked.append(cand[np.argsort(exact, kind="stable")[:k]])
+        found = np.array(reranked)
+    per_query_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+    index_mb = faiss.serialize_index(index).nbytes / 2**20
+    return {
+        "type": kind,
+        "storage": storage,
+        "rescore": f"x{rescore}" if rescore else "-",
+        "index_MB": round(index_mb, 1),
+        "side_MB": round(data.nbytes / 2**20, 1) if rescore else 0.0,
+        f"recall@{k}": round(recall_at_k(found, truth), 4),
+        "ms/query": round(per_query_ms, 3),
+        "build_s": round(build_s, 2),
+    }
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--n", type=int, default=100_000)
+    p.add_argument("--dim", type=int, default=384)
+    p.add_argument("--index-dir", type=Path, default=None)
+    p.add_argument("--queries", type=int, default=500)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--types", nargs="+", default=["flat"])
+    p.add_argument("--rescore-factor", type=int, default=4)
+    args = p.parse_args()
+
+    if args.index_dir:
+        vectors = corpus_vectors(args.index_dir)
+        rng = np.random.default_rng(0)
+        held_out = rng.choice(len(vectors), min(args.queries, len(vectors) // 10), replace=False)
+        queries = vectors[held_out]
+        data = np.delete(vectors, held_out, axis=0)
+    else:
+        data = synthetic(args.n, args.dim, 200)
+        queries = synthetic(args.queries, args.dim, 200, seed=1)
+    exact = faiss.IndexFlatL2(data.shape[1])
+    exact.add(data)
+    _, truth = exact.search(queries, args.k)
+
+    base = index_settings()
+    rows = []
+    for kind in args.types:
+        rows.append(run(kind, "float32", 0, data, queries, truth, args.k, base))
+        for storage in ("fp16", "sq8"):
+            rows.append(run(kind, storage, 0, data, queries, truth, args.k, base))
+            rows.append(run(kind, storage, args.rescore_factor, data, queries, truth, args.k, base))
+
+    cols = list(rows[0])
+    print(f"n={len(data)} dim={data.shape[1]} queries={len(queries)} k={args.k}")
+    print("  ".join(f"{c:>10}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{str(r[c]):>10}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
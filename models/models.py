@@ -18,6 +18,15 @@ class Metadata(BaseModel):
     
     SentimentTone : str 
 
+
+
+class AnalysisSummary(BaseModel):
+    """The Metadata fields only the LLM can produce; the rest are read from the PDF."""
+
+    Summary:List[str] = Field(default_factory=list , description='summary of the document')
+
+    SentimentTone : str
+
      
 class ChangeFormat(BaseModel):
     Page : str
@@ -28,6 +37,9 @@ class SummaryResponse(RootModel[list[ChangeFormat]]):
 
 class PromptType(str, Enum):
     DOCUMENT_ANALYSIS = "document_analysis"
+    DOCUMENT_ANALYSIS_MAP = "document_analysis_map"
+    DOCUMENT_ANALYSIS_REDUCE = "document_analysis_reduce"
     DOCUMENT_COMPARISON = "document_comparison"
+    DOCUMENT_COMPARISON_DIFF = "document_comparison_diff"
     CONTEXTUALIZE_QUESTION = "contextualize_question"
     CONTEXT_QA = "context_qa"
\ No newline at end of file
@@ -34,6 +34,43 @@ Document to analyze:
 """)
 
 
+# map-reduce analysis of large documents: each page window is summarized
+# on its own (map), then the partial summaries are merged into Metadata (reduce)
+document_analysis_map_prompt = ChatPromptTemplate.from_template("""
+You are summarizing one section ({section}) of a larger document.
+
+Write a detailed summary of this section only:
+- Capture its themes, key facts, figures, arguments and conclusions
+- Keep names, dates and numbers exactly as written
+- Do not invent information that is not in the section
+
+Return plain text paragraphs, no JSON and no preamble.
+
+Section text:
+{document_text}
+""")
+
+document_analysis_reduce_prompt = ChatPromptTemplate.from_template("""
+You are a highly capable document analysis assistant.
+
+Below are summaries of consecutive sections of one document, in page order.
+Combine them into a **detailed, comprehensive summary** of the whole document:
+- Capture all major themes, ideas, and arguments across sections
+- Preserve important context, intent, and nuance
+- Remove repetition between sections
+- Be useful to someone who has NOT read the document
+
+Return ONLY valid JSON that strictly follows the schema below.
+Do NOT add explanations, markdown, or extra text.
+Format the summary as multiple readable paragraphs with line breaks.
+
+{format_instructions}
+
+Section summaries:
+{section_summaries}
+""")
+
+
 document_comparison_prompt = ChatPromptTemplate.from_template("""
 You will be provided with content from two PDFs. Your tasks are as follows:
 
@@ -51,6 +88,26 @@ Your response should follow this format:
 {format_instruction}
 """)
 
+document_comparison_diff_prompt = ChatPromptTemplate.from_template("""
+You will be given line diffs between a reference PDF and an actual PDF, one section per changed page.
+Pages not listed are identical and are handled separately.
+
+Diff notation: lines starting with '- ' were removed, '+ ' were added, '~ ' were edited in place
+with [-old words-] {{+new words+}}, and '  ' lines are unchanged context.
+
+1. For every changed page, describe what changed in plain language
+2. Use exactly the page label given in the section header as the Page value
+3. Return one entry per changed page: {changed_pages}
+
+Page diffs:
+
+{page_diffs}
+
+Your response should follow this format:
+
+{format_instruction}
+""")
+
 contextualize_question_prompt = ChatPromptTemplate.from_messages([
     ("system", (
         "Given a conversation history and the most recent user query, rewrite the query as a standalone question "
@@ -82,7 +139,10 @@ context_qa_prompt = ChatPromptTemplate.from_messages([
 
 PROMPT_REGISTRY = {
     "document_analysis": document_analysis_prompt,
+    "document_analysis_map": document_analysis_map_prompt,
+    "document_analysis_reduce": document_analysis_reduce_prompt,
     "document_comparison": document_comparison_prompt,
+    "document_comparison_diff": document_comparison_diff_prompt,
     "contextualize_question": contextualize_question_prompt,
     "context_qa": context_qa_prompt,
 }
@@ -1,16 +1,34 @@
 import os
-from utils.model_loader import ModelLoader
+import re
+from utils.model_loader import MODEL_REGISTRY
+from utils.config_loader import load_config_section
+from utils.pdf_metadata import UNKNOWN, detect_language
+from src.document_ingestion.pipeline import Timer
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentportalException
 from datetime import datetime
 from models.models import *
 import sys
-from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 
 # from langchain.output_parsers.fix import OutputFixingParser
 
 
 from prompt.prompt_library import PROMPT_REGISTRY
+
+# page separators written by DocHandler.read_pdf / DocumentComparator.read_pdf
+_PAGE_MARKER = re.compile(r"^\s*---\s*Page (\d+)\s*---\s*$", re.MULTILINE)
+
+
+def split_pages(document_text: str) -> list[tuple[int, str]]:
+    """(page number, text) from read_pdf output; text without markers is one page."""
+    marks = list(_PAGE_MARKER.finditer(document_text))
+    if not marks:
+        return [(1, document_text)]
+    ends = [m.start() for m in marks[1:]] + [len(document_text)]
+    return [(int(m.group(1)), document_text[m.end():end].strip()) for m, end in zip(marks, ends)]
+
+
 class DocumentAnalyzer:
     
     
@@ -18,14 +36,25 @@ class DocumentAnalyzer:
         self.log = CustomLogger().get_logger(__name__)
         
         try:
-            self.loader = ModelLoader()
-            self.llm = self.loader.load_llm()
+            self.loader = MODEL_REGISTRY.loader
+            self.llm = MODEL_REGISTRY.get_llm()
             
-            self.parser = JsonOutputParser(pydantic_object=Metadata)
+            # only Summary / SentimentTone come from the LLM; the other Metadata fields are read locally
+            self.parser = JsonOutputParser(pydantic_object=AnalysisSummary)
 
          
             
             self.prompt = PROMPT_REGISTRY['document_analysis']
+
+            # map-reduce mode for documents above the token threshold
+            self.map_chain = PROMPT_REGISTRY['document_analysis_map'] | self.llm | StrOutputParser()
+            self.reduce_chain = PROMPT_REGISTRY['document_analysis_reduce'] | self.llm | self.parser
+            cfg = load_config_section("analysis")
+            self.threshold_tokens = int(cfg.get("map_reduce_threshold_tokens", 12000))
+            self.chars_per_token = float(cfg.get("chars_per_token", 4))
+            self.window_pages = int(cfg.get("window_pages", 10))
+            self.window_max_tokens = int(cfg.get("window_max_tokens", 6000))
+            self.max_concurrency = int(cfg.get("max_concurrency", 4))
             
             self.log.info(f' initialized document successfully ')
             
@@ -38,22 +67,171 @@ class DocumentAnalyzer:
             self.log.error(f'error initializing document error:{e}')
             raise DocumentportalException('error in document analyzer initialization' , sys)
     
-    def analyze_document(self ,document_text):
+    def analyze_document(self ,document_text, metadata=None):
+        """
+        Summary and SentimentTone from the LLM, merged with the fields read
+        locally (`metadata`, e.g. DocHandler.read_metadata(); derived from the
+        text when not given) into the Metadata schema.
+        """
         try:
+            return self._run(self._analysis_steps(document_text, metadata))
+        except Exception as e:
+            self.log.error("Metadata analysis failed", error=str(e))
+            raise DocumentportalException("Metadata extraction failed",sys)
+
+    async def aanalyze_document(self, document_text, metadata=None):
+        """Async variant of analyze_document() for the API event loop."""
+        try:
+            return await self._arun(self._analysis_steps(document_text, metadata))
+        except Exception as e:
+            self.log.error("Metadata analysis failed", error=str(e))
+            raise DocumentportalException("Metadata extraction failed",sys)
+
+    def _analysis_steps(self, document_text, metadata):
+        # one LLM call, or map-reduce above the token threshold
+        if self._tokens(document_text) > self.threshold_tokens:
+            response = yield from self._map_reduce_steps(document_text)
+        else:
             chain = self.prompt | self.llm | self.parser
-            
             self.log.info("Meta-data analysis chain initialized")
-
-            response = chain.invoke({
+            response = yield chain, {
                 "format_instructions": self.parser.get_format_instructions(),
                 "document_text": document_text
-            })
-
+            }
             self.log.info("Metadata extraction successful", keys=list(response.keys()))
-            
-            return response
+        return self._with_metadata(response, metadata, document_text)
 
+    def _with_metadata(self, response, metadata, document_text) -> dict:
+        # local fields + the two the LLM produced, validated against the full Metadata schema
+        fields = dict(metadata) if metadata else self._text_metadata(document_text)
+        summary = response.get("Summary") or []
+        fields["Summary"] = [summary] if isinstance(summary, str) else list(summary)
+        fields["SentimentTone"] = response.get("SentimentTone") or UNKNOWN
+        return Metadata(**fields).model_dump()
+
+    @staticmethod
+    def _text_metadata(document_text) -> dict:
+        # without the PDF itself: page count from read_pdf's page markers, language from the text
+        pages = split_pages(document_text)
+        return {
+            "Title": UNKNOWN, "Author": UNKNOWN, "DateCreated": UNKNOWN, "LastModifiedDate": UNKNOWN,
+            "Publisher": UNKNOWN, "PageCount": str(len(pages)),
+            "Language": detect_language(document_text[:20000]) or UNKNOWN,
+        }
+
+    def analyze_map_reduce(self, document_text):
+        """
+        Hierarchical analysis for large documents: page windows are
+        summarized concurrently (map), summaries are merged in further map
+        rounds while they are still above the threshold, and the final set
+        is reduced into Summary / SentimentTone.
+        """
+        try:
+            return self._run(self._map_reduce_steps(document_text))
         except Exception as e:
-            self.log.error("Metadata analysis failed", error=str(e))
+            self.log.error("Map-reduce analysis failed", error=str(e))
             raise DocumentportalException("Metadata extraction failed",sys)
-            
\ No newline at end of file
+
+    async def aanalyze_map_reduce(self, document_text):
+        """Async variant of analyze_map_reduce(); map calls run concurrently on the event loop."""
+        try:
+            return await self._arun(self._map_reduce_steps(document_text))
+        except Exception as e:
+            self.log.error("Map-reduce analysis failed", error=str(e))
+            raise DocumentportalException("Metadata extraction failed",sys)
+
+    def _map_reduce_steps(self, document_text):
+        timings, clock = {}, Timer()
+        inputs = self._map_inputs(document_text)
+        timings["split_s"] = round(clock.lap(), 3)
+        summaries = yield self.map_chain, inputs
+        timings["map_s"] = round(clock.lap(), 3)
+        rounds = 0
+        while len(summaries) > 1 and self._tokens("".join(summaries)) > self.threshold_tokens:
+            summaries = yield self.map_chain, self._collapse_inputs(summaries)
+            rounds += 1
+        timings["collapse_s"] = round(clock.lap(), 3)
+        response = yield self.reduce_chain, self._reduce_inputs(summaries)
+        timings["reduce_s"] = round(clock.lap(), 3)
+        self.log.info("Map-reduce analysis completed", windows=len(inputs), collapse_rounds=rounds,
+                      max_concurrency=self.max_concurrency, **timings)
+        return response
+
+    # The *_steps generators hold the analysis logic once: they yield (chain, inputs) requests
+    # (a list is batched, a dict is a single call) and receive the results. _run / _arun execute them.
+
+    def _run(self, steps):
+        try:
+            chain, inputs = next(steps)
+            while True:
+                if isinstance(inputs, list):
+                    result = chain.batch(inputs, config={"max_concurrency": self.max_concurrency})
+                else:
+                    result = chain.invoke(inputs)
+                chain, inputs = steps.send(result)
+        except StopIteration as done:
+            return done.value
+
+    async def _arun(self, steps):
+        try:
+            chain, inputs = next(steps)
+            while True:
+                if isinstance(inputs, list):
+                    result = await chain.abatch(inputs, config={"max_concurrency": self.max_concurrency})
+                else:
+                    result = await chain.ainvoke(inputs)
+                chain, inputs = steps.send(result)
+        except StopIteration as done:
+            return done.value
+
+    def _tokens(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token)
+
+    def _map_inputs(self, document_text: str) -> list[dict]:
+        # page windows of at most window_pages pages / window_max_tokens; oversized pages are sliced
+        max_chars = int(self.window_max_tokens * self.chars_per_token)
+        parts = []
+        for number, text in split_pages(document_text):
+            parts.extend((number, text[i:i + max_chars]) for i in range(0, max(len(text), 1), max_chars))
+        windows, current, chars = [], [], 0
+        for number, text in parts:
+            if current and (len(current) >= self.window_pages or chars + len(text) > max_chars):
+                windows.append(current)
+                current, chars = [], 0
+            current.append((number, text))
+            chars += len(text)
+        if current:
+            windows.append(current)
+        return [
+            {
+                "section": f"pages {w[0][0]}-{w[-1][0]}" if w[0][0] != w[-1][0] else f"page {w[0][0]}",
+                "document_text": "\n".join(f"--- Page {n} ---\n{t}" for n, t in w),
+            }
+            for w in windows
+        ]
+
+    def _collapse_inputs(self, summaries: list[str]) -> list[dict]:
+        # group consecutive summaries up to the window cap, at least two per group so every round shrinks
+        max_chars = int(self.window_max_tokens * self.chars_per_token)
+        groups, current, chars = [], [], 0
+        for i, summary in enumerate(summaries):
+            if len(current) >= 2 and chars + len(summary) > max_chars:
+                groups.append(current)
+                current, chars = [], 0
+            current.append(i)
+            chars += len(summary)
+        if current:
+            groups.append(current)
+        return [
+            {
+                "section": f"summaries of parts {g[0] + 1}-{g[-1] + 1}",
+                "document_text": "\n\n".join(f"Part {i + 1}:\n{summaries[i]}" for i in g),
+            }
+            for g in groups
+        ]
+
+    def _reduce_inputs(self, summaries: list[str]) -> dict:
+        return {
+            "format_instructions": self.parser.get_format_instructions(),
+            "section_summaries": "\n\n".join(f"Section {i + 1}:\n{s}" for i, s in enumerate(summaries)),
+        }
@@ -1,19 +1,50 @@
 import sys
 import os
+import re
+import time
 from operator import itemgetter
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 # from logs 
 from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.vectorstores import FAISS
+from langchain_core.runnables import RunnableBranch, RunnableLambda, RunnableParallel
 
-from utils.model_loader import ModelLoader
+from utils.model_loader import MODEL_REGISTRY
+from utils.vectorstore_cache import VECTORSTORE_CACHE
+from src.document_ingestion.segments import load_index
+from utils.config_loader import load_config_section
+from utils.metrics import Counters
 from exception.custom_exception import DocumentportalException
 from logger import GLOBAL_LOGGER as log
 from prompt.prompt_library import PROMPT_REGISTRY
 from models.models import PromptType
 
+_RETRIEVER_CFG = load_config_section("retriever")
+# histories shorter than this can't change the meaning of the question
+REWRITE_MIN_HISTORY = int(_RETRIEVER_CFG.get("rewrite_min_history", 2))
+# rewritten queries at least this similar (token Jaccard) to the raw one are ignored
+REWRITE_SIMILARITY = float(_RETRIEVER_CFG.get("rewrite_similarity", 0.8))
+
+RAG_METRICS = Counters((
+    "retrievals", "rewrite_skipped", "rewrite_run", "rewrite_used",
+    "rewrite_ms_total", "saved_ms_est",
+))
+
+
+def rag_metrics() -> Dict[str, float]:
+    """Counters plus derived skip rate / average rewrite latency for /metrics."""
+    snap = RAG_METRICS.snapshot()
+    total = snap["retrievals"] or 1
+    runs = snap["rewrite_run"] or 1
+    snap["rewrite_skip_rate"] = round(snap["rewrite_skipped"] / total, 3)
+    snap["rewrite_ms_avg"] = round(snap["rewrite_ms_total"] / runs, 1)
+    return snap
+
+
+def _tokens(text: str) -> set:
+    return set(re.findall(r"\w+", (text or "").lower()))
+
 
 class ConversationalRAG:
     """
@@ -23,6 +54,10 @@ class ConversationalRAG:
         rag = ConversationalRAG(session_id="abc")
         rag.load_retriever_from_faiss(index_path="faiss_index/abc", k=5, index_name="index")
         answer = rag.invoke("What is ...?", chat_history=[])
+
+        # or, token by token (sources first):
+        async for event in rag.astream("What is ...?"):
+            ...
     """
 
     def __init__(self, session_id: Optional[str], retriever=None):
@@ -40,6 +75,8 @@ class ConversationalRAG:
 
             # Lazy pieces
             self.retriever = retriever
+            self.retrieve_chain = None
+            self.answer_chain = None
             self.chain = None
             if self.retriever is not None:
                 self._build_lcel_chain()
@@ -66,12 +103,13 @@ class ConversationalRAG:
             if not os.path.isdir(index_path):
                 raise FileNotFoundError(f"FAISS index directory not found: {index_path}")
 
-            embeddings = ModelLoader().load_embedding_model()
-            vectorstore = FAISS.load_local(
+            embeddings = MODEL_REGISTRY.get_embedding_model()
+            # cached per worker; reloaded only when the index files change on disk
+            vectorstore = VECTORSTORE_CACHE.get_or_load(
                 index_path,
-                embeddings,
-                index_name=index_name,
-                allow_dangerous_deserialization=True,  # ok if you trust the index
+                index_name,
+                # segmented session indexes fan out per segment; legacy dirs load as plain FAISS
+                lambda: load_index(index_path, embeddings, index_name=index_name),
             )
 
             if search_kwargs is None:
@@ -105,27 +143,80 @@ class ConversationalRAG:
             chat_history = chat_history or []
             payload = {"input": user_input, "chat_history": chat_history}
             answer = self.chain.invoke(payload)
-            if not answer:
-                log.warning(
-                    "No answer generated", user_input=user_input, session_id=self.session_id
+            return self._check_answer(user_input, answer)
+        except Exception as e:
+            log.error("Failed to invoke ConversationalRAG", error=str(e))
+            raise DocumentportalException("Invocation error in ConversationalRAG", sys)
+
+    async def ainvoke(self, user_input: str, chat_history: Optional[List[BaseMessage]] = None) -> str:
+        """Async variant of invoke(); LLM calls don't hold a thread while waiting."""
+        try:
+            if self.chain is None:
+                raise DocumentportalException(
+                    "RAG chain not initialized. Call load_retriever_from_faiss() before ainvoke().", sys
                 )
-                return "no answer generated."
-            log.info(
-                "Chain invoked successfully",
-                session_id=self.session_id,
-                user_input=user_input,
-                answer_preview=str(answer)[:150],
-            )
-            return answer
+            chat_history = chat_history or []
+            payload = {"input": user_input, "chat_history": chat_history}
+            answer = await self.chain.ainvoke(payload)
+            return self._check_answer(user_input, answer)
         except Exception as e:
             log.error("Failed to invoke ConversationalRAG", error=str(e))
             raise DocumentportalException("Invocation error in ConversationalRAG", sys)
 
+    async def astream(
+        self, user_input: str, chat_history: Optional[List[BaseMessage]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the answer through the same LCEL pieces as invoke().
+
+        Yields {"event": "sources", ...} as soon as retrieval finishes, then one
+        {"event": "token", ...} per LLM chunk and a final {"event": "done", ...}.
+        """
+        if self.retrieve_chain is None or self.answer_chain is None:
+            raise DocumentportalException(
+                "RAG chain not initialized. Call load_retriever_from_faiss() before astream().", sys
+            )
+        chat_history = chat_history or []
+        payload = {"input": user_input, "chat_history": chat_history}
+        docs = await self.retrieve_chain.ainvoke(payload)
+        yield {"event": "sources", "data": self._describe_sources(docs)}
+
+        parts: List[str] = []
+        async for token in self.answer_chain.astream({**payload, "context": self._format_docs(docs)}):
+            if token:
+                parts.append(token)
+                yield {"event": "token", "data": token}
+
+        answer = "".join(parts)
+        if not answer:
+            log.warning("No answer generated", user_input=user_input, session_id=self.session_id)
+        log.info(
+            "Chain streamed successfully",
+            session_id=self.session_id,
+            user_input=user_input,
+            answer_preview=answer[:150],
+        )
+        yield {"event": "done", "data": {"session_id": self.session_id, "chars": len(answer)}}
+
     # ---------- Internals ----------
 
+    def _check_answer(self, user_input: str, answer: str) -> str:
+        if not answer:
+            log.warning(
+                "No answer generated", user_input=user_input, session_id=self.session_id
+            )
+            return "no answer generated."
+        log.info(
+            "Chain invoked successfully",
+            session_id=self.session_id,
+            user_input=user_input,
+            answer_preview=str(answer)[:150],
+        )
+        return answer
+
     def _load_llm(self):
         try:
-            llm = ModelLoader().load_llm()
+            llm = MODEL_REGISTRY.get_llm()
             if not llm:
                 raise ValueError("LLM could not be loaded")
             log.info("LLM loaded successfully", session_id=self.session_id)
@@ -138,32 +229,112 @@ class ConversationalRAG:
     def _format_docs(docs) -> str:
         return "\n\n".join(getattr(d, "page_content", str(d)) for d in docs)
 
+    @staticmethod
+    def _describe_sources(docs) -> List[Dict[str, Any]]:
+        sources = []
+        for d in docs:
+            md = getattr(d, "metadata", None) or {}
+            sources.append({
+                "source": md.get("source") or md.get("file_path"),
+                "page": md.get("page"),
+                "preview": getattr(d, "page_content", "")[:200],
+            })
+        return sources
+
+    # ---------- Question rewrite fast path ----------
+
+    @staticmethod
+    def _needs_rewrite(inputs: Dict[str, Any]) -> bool:
+        return len(inputs.get("chat_history") or []) >= REWRITE_MIN_HISTORY
+
+    @staticmethod
+    def _differs_materially(original: str, rewritten: str) -> bool:
+        a, b = _tokens(original), _tokens(rewritten)
+        if not b:
+            return False
+        return len(a & b) / len(a | b) < REWRITE_SIMILARITY
+
+    @staticmethod
+    def _record_skip() -> None:
+        RAG_METRICS.incr("retrievals")
+        RAG_METRICS.incr("rewrite_skipped")
+        runs = RAG_METRICS.get("rewrite_run")
+        if runs:
+            RAG_METRICS.incr("saved_ms_est", RAG_METRICS.get("rewrite_ms_total") / runs)
+
+    @staticmethod
+    def _record_rewrite(started: float) -> None:
+        RAG_METRICS.incr("retrievals")
+        RAG_METRICS.incr("rewrite_run")
+        RAG_METRICS.incr("rewrite_ms_total", (time.perf_counter() - started) * 1000)
+
+    def _retrieve_raw(self, inputs: Dict[str, Any], config=None):
+        self._record_skip()
+        return self.retriever.invoke(inputs["input"], config)
+
+    async def _aretrieve_raw(self, inputs: Dict[str, Any], config=None):
+        self._record_skip()
+        return await self.retriever.ainvoke(inputs["input"], config)
+
+    def _rewrite(self, inputs: Dict[str, Any], config=None) -> str:
+        started = time.perf_counter()
+        rewritten = self.question_rewriter.invoke(inputs, config)
+        self._record_rewrite(started)
+        return rewritten
+
+    async def _arewrite(self, inputs: Dict[str, Any], config=None) -> str:
+        started = time.perf_counter()
+        rewritten = await self.question_rewriter.ainvoke(inputs, config)
+        self._record_rewrite(started)
+        return rewritten
+
+    def _pick_docs(self, out: Dict[str, Any], config=None):
+        if not self._differs_materially(out["input"], out["rewritten"]):
+            return out["raw_docs"]
+        RAG_METRICS.incr("rewrite_used")
+        return self.retriever.invoke(out["rewritten"], config)
+
+    async def _apick_docs(self, out: Dict[str, Any], config=None):
+        if not self._differs_materially(out["input"], out["rewritten"]):
+            return out["raw_docs"]
+        RAG_METRICS.incr("rewrite_used")
+        return await self.retriever.ainvoke(out["rewritten"], config)
+
     def _build_lcel_chain(self):
         try:
             if self.retriever is None:
                 raise DocumentportalException("No retriever set before building chain", sys)
 
             # 1) Rewrite user question with chat history context
-            question_rewriter = (
+            self.question_rewriter = (
                 {"input": itemgetter("input"), "chat_history": itemgetter("chat_history")}
                 | self.contextualize_prompt
                 | self.llm
                 | StrOutputParser()
             )
 
-            # 2) Retrieve docs for rewritten question
-            retrieve_docs = question_rewriter | self.retriever | self._format_docs
+            # 2) Retrieve docs: raw question when there is no usable history; otherwise
+            #    rewrite and raw retrieval run in parallel and the rewrite only wins if
+            #    it actually changed the question
+            rewrite_then_pick = RunnableParallel(
+                rewritten=RunnableLambda(self._rewrite, afunc=self._arewrite),
+                raw_docs=itemgetter("input") | self.retriever,
+                input=itemgetter("input"),
+            ) | RunnableLambda(self._pick_docs, afunc=self._apick_docs)
+            self.retrieve_chain = RunnableBranch(
+                (self._needs_rewrite, rewrite_then_pick),
+                RunnableLambda(self._retrieve_raw, afunc=self._aretrieve_raw),
+            )
 
             # 3) Answer using retrieved context + original input + chat history
+            self.answer_chain = self.qa_prompt | self.llm | StrOutputParser()
             self.chain = (
                 {
-                    "context": retrieve_docs,
+                    "context": self.retrieve_chain | self._format_docs,
                     "input": itemgetter("input"),
                     "chat_history": itemgetter("chat_history"),
                 }
-                | self.qa_prompt
-                | self.llm
-                | StrOutputParser()
+                | self.answer_chain
             )
 
             log.info("LCEL graph built successfully", session_id=self.session_id)
@@ -1,13 +1,19 @@
+import re
 import sys
+import time
 from dotenv import load_dotenv
 import pandas as pd
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentportalException
 from models.models import *
 from prompt.prompt_library import PROMPT_REGISTRY
-from utils.model_loader import ModelLoader
+from utils.model_loader import MODEL_REGISTRY
 from langchain_core.output_parsers import JsonOutputParser
+from utils.config_loader import load_config_section
+from src.doc_compare.page_diff import DELETED, INSERTED, UNCHANGED, PagePair, diff_pages
 
+# "5", "Page 5" or "5 (was 4)": a label naming an actual page by number
+_PAGE_NUMBER = re.compile(r"(?:page\s*)?(\d+)(?:\s*\(was\s*\d+\))?$", re.IGNORECASE)
 
 
 class DocumentComparatorLLM:
@@ -15,14 +21,27 @@ class DocumentComparatorLLM:
     def __init__(self):
         load_dotenv()
         self.log = CustomLogger().get_logger(__name__)
-        self.loader = ModelLoader()
+        self.loader = MODEL_REGISTRY.loader
         
-        self.llm = self.loader.load_llm()
+        self.llm = MODEL_REGISTRY.get_llm()
         self.parser = JsonOutputParser(pydantic_object=SummaryResponse)
         # self.fixing_parser = 
         self.prompt = PROMPT_REGISTRY['document_comparison']
         
         self.chain = self.prompt | self.llm | self.parser
+        # page-diff path: only pages that differ (as line diffs) reach the LLM
+        self.diff_chain = PROMPT_REGISTRY['document_comparison_diff'] | self.llm | self.parser
+        cfg = load_config_section("comparison")
+        self.diff_context = int(cfg.get("diff_context_lines", 1))
+        self.max_diff_chars = int(cfg.get("max_diff_chars_per_page", 4000))
+        self.align_opts = {
+            "shingle_size": int(cfg.get("shingle_size", 3)),
+            "num_perm": int(cfg.get("minhash_permutations", 64)),
+            "min_similarity": float(cfg.get("min_page_similarity", 0.3)),
+        }
+        self.window_pages = int(cfg.get("window_pages", 4))
+        self.window_max_chars = int(cfg.get("window_max_chars", 12000))
+        self.max_concurrency = int(cfg.get("max_concurrency", 4))
         
         self.log.info('Document Comparator LLM initialized')
         
@@ -45,10 +64,140 @@ class DocumentComparatorLLM:
         except Exception as e:
             self.log.error(f'error in document compare {e}')
             raise DocumentportalException('an error occured in comparing document' , sys)
+
+    async def acompare_documents(self, combined_docs):
+        """Async variant of compare_documents() for the API event loop."""
+        try:
+            inputs = {
+                "combined_docs":combined_docs,
+                "format_instruction" : self.parser.get_format_instructions()
+            }
+            self.log.info("started document comparison")
+            response = await self.chain.ainvoke(inputs)
+
+            self.log.info('Document comparison completed' , response = response)
+
+            return self._format_response(response)
+        except Exception as e:
+            self.log.error(f'error in document compare {e}')
+            raise DocumentportalException('an error occured in comparing document' , sys)
         
     
     
     
+    def compare_pages(self, ref_pages, act_pages) -> pd.DataFrame:
+        """
+        Page-wise comparison from (page number, text) lists. Identical pages
+        are answered locally with 'NO CHANGE'; diffs of changed pages are
+        grouped into windows that go to the LLM concurrently (at most
+        `max_concurrency` calls in flight), and the rows come back in page order.
+        """
+        try:
+            pairs, windows, inputs = self._plan(ref_pages, act_pages)
+            responses = self.diff_chain.batch(inputs, config={"max_concurrency": self.max_concurrency})
+            rows = self._unchanged_rows(pairs)
+            for window, response in zip(windows, responses):
+                rows.extend(self._window_rows(pairs, window, response))
+            return self._format_response(self._in_page_order(rows))
+        except Exception as e:
+            self.log.error(f'error in page compare {e}')
+            raise DocumentportalException('an error occured in comparing document' , sys)
+
+    async def acompare_pages(self, ref_pages, act_pages) -> pd.DataFrame:
+        """Async variant of compare_pages() for the API event loop."""
+        rows = [row async for row in self.astream_rows(ref_pages, act_pages)]
+        return self._format_response(self._in_page_order(rows))
+
+    async def astream_rows(self, ref_pages, act_pages):
+        """
+        Yield comparison rows as they are ready: unchanged pages first, then
+        each window's rows when its LLM call completes. Rows carry `order`
+        (their position in page order) because windows finish out of order.
+        """
+        try:
+            pairs, windows, inputs = self._plan(ref_pages, act_pages)
+            for row in self._unchanged_rows(pairs):
+                yield row
+            started = time.perf_counter()
+            async for w, response in self.diff_chain.abatch_as_completed(
+                inputs, config={"max_concurrency": self.max_concurrency}
+            ):
+                self.log.info('Comparison window completed', window=w, pages=len(windows[w]),
+                              elapsed_s=round(time.perf_counter() - started, 3))
+                for row in self._window_rows(pairs, windows[w], response):
+                    yield row
+            self.log.info('Page comparison completed', windows=len(windows), max_concurrency=self.max_concurrency,
+                          elapsed_s=round(time.perf_counter() - started, 3))
+        except Exception as e:
+            self.log.error(f'error in page compare {e}')
+            raise DocumentportalException('an error occured in comparing document' , sys)
+
+    def _plan(self, ref_pages, act_pages):
+        # aligned page pairs, windows of changed pair indices, and one prompt input per window
+        pairs = diff_pages(ref_pages, act_pages, self.diff_context, self.max_diff_chars, **self.align_opts)
+        windows, current, chars = [], [], 0
+        for i, pair in enumerate(pairs):
+            if pair.status == UNCHANGED:
+                continue
+            if current and (len(current) >= self.window_pages or chars + len(pair.diff) > self.window_max_chars):
+                windows.append(current)
+                current, chars = [], 0
+            current.append(i)
+            chars += len(pair.diff)
+        if current:
+            windows.append(current)
+        inputs = [
+            {
+                "changed_pages": ", ".join(pairs[i].label for i in window),
+                "page_diffs": "\n\n".join(
+                    f"=== Page {pairs[i].label} ({pairs[i].status}) ===\n{pairs[i].diff}" for i in window
+                ),
+                "format_instruction": self.parser.get_format_instructions(),
+            }
+            for window in windows
+        ]
+        changed = sum(len(w) for w in windows)
+        self.log.info('Page diff computed', pages=len(pairs), changed=changed, windows=len(windows),
+                      inserted=sum(p.status == INSERTED for p in pairs), deleted=sum(p.status == DELETED for p in pairs),
+                      unchanged_fraction=round(1 - changed / len(pairs), 3) if pairs else 1.0,
+                      diff_chars=sum(len(x["page_diffs"]) for x in inputs),
+                      full_text_chars=sum(len(t) for _, t in ref_pages) + sum(len(t) for _, t in act_pages))
+        return pairs, windows, inputs
+
+    @staticmethod
+    def _unchanged_rows(pairs: list[PagePair]) -> list[dict]:
+        return [
+            {"order": i, "Page": pair.label, "changes": "NO CHANGE"}
+            for i, pair in enumerate(pairs) if pair.status == UNCHANGED
+        ]
+
+    @staticmethod
+    def _window_rows(pairs: list[PagePair], window: list[int], response) -> list[dict]:
+        # LLM rows keyed by page label; a bare actual page number ("5", "Page 5", "5 (was 4)") is accepted as a
+        # fallback key. "(removed)"/"(added)" labels never are: a removed page's number is a reference page and
+        # can equal an actual one.
+        by_label = {}
+        for row in response or []:
+            if isinstance(row, dict) and row.get("Page") is not None:
+                label = str(row["Page"]).strip()
+                by_label.setdefault(label, row.get("changes", ""))
+                number = _PAGE_NUMBER.match(label)
+                if number:
+                    by_label.setdefault(number.group(1), row.get("changes", ""))
+        fallback = {INSERTED: "Page added.", DELETED: "Page removed."}
+        rows = []
+        for i in window:
+            pair = pairs[i]
+            number = _PAGE_NUMBER.match(pair.label)
+            changes = by_label.get(pair.label) or (number and by_label.get(number.group(1))) \
+                or fallback.get(pair.status, "Text changed.")
+            rows.append({"order": i, "Page": pair.label, "changes": changes})
+        return rows
+
+    @staticmethod
+    def _in_page_order(rows: list[dict]) -> list[dict]:
+        return [{k: v for k, v in row.items() if k != "order"} for row in sorted(rows, key=lambda r: r["order"])]
+
     def _format_response(self ,response_parsed : list[dict]) -> pd.DataFrame:
         try:
             df = pd.DataFrame(response_parsed)
@@ -0,0 +1,137 @@
+from __future__ import annotations
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# (page number as printed in the UI, 1-based; page text)
+Page = Tuple[int, str]
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)  # odd multiplier for combining word ids into shingle hashes
+_EMPTY = np.iinfo(np.uint32).max
+
+
+def _tokens(text: str, vocab: Dict[str, int]) -> np.ndarray:
+    # whitespace-split, case-folded words as ids shared by both documents
+    words = unicodedata.normalize("NFC", text).casefold().split()
+    add = vocab.setdefault
+    return np.fromiter([add(w, len(vocab)) for w in words], dtype=np.uint64, count=len(words))
+
+
+def shingle_hashes(tokens: np.ndarray, k: int) -> np.ndarray:
+    """Distinct 64-bit hashes of the page's word k-shingles (one shingle for pages shorter than k)."""
+    if tokens.size == 0:
+        return tokens
+    k = min(k, tokens.size)
+    n = tokens.size - k + 1
+    h = np.zeros(n, dtype=np.uint64)
+    for t in range(k):
+        h = h * _MIX + tokens[t:t + n]
+    return np.unique(h)
+
+
+class MinHasher:
+    """num_perm multiply-shift hash functions; signatures of equal sets are equal."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = (rng.integers(1, 2**63, num_perm, dtype=np.uint64) | np.uint64(1))[:, None]
+        self.b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)[:, None]
+
+    def signature(self, shingles: np.ndarray) -> np.ndarray:
+        if shingles.size == 0:
+            return np.full(self.a.shape[0], _EMPTY, dtype=np.uint32)
+        return ((self.a * shingles[None, :] + self.b) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+def signatures(pages: Sequence[Page], hasher: MinHasher, k: int, vocab: Dict[str, int]) -> np.ndarray:
+    """(pages, num_perm) MinHash signatures; `vocab` caches token hashes across both documents."""
+    if not pages:
+        return np.empty((0, hasher.a.shape[0]), dtype=np.uint32)
+    return np.stack([hasher.signature(shingle_hashes(_tokens(text, vocab), k)) for _, text in pages])
+
+
+def similarity(ref_sigs: np.ndarray, act_sigs: np.ndarray, block: int = 128) -> np.ndarray:
+    """Estimated Jaccard similarity of every (reference, actual) page: fraction of equal MinHash slots."""
+    sim = np.empty((len(ref_sigs), len(act_sigs)), dtype=np.float32)
+    for start in range(0, len(ref_sigs), block):
+        rows = ref_sigs[start:start + block]
+        sim[start:start + block] = (rows[:, None, :] == act_sigs[None, :, :]).mean(axis=2)
+    return sim
+
+
+def align_scores(score: np.ndarray) -> List[Tuple[Optional[int], Optional[int]]]:
+    """
+    Optimal monotonic alignment (Needleman-Wunsch, zero gap cost): pick
+    non-crossing (i, j) matches maximizing the summed score; only positive
+    scores are ever matched. Rows are vectorized, with the left-gap
+    recurrence solved by a running maximum. Returns (i, j), (i, None)
+    and (None, j) steps in document order.
+    """
+    n, m = score.shape
+    h = np.zeros((n + 1, m + 1), dtype=np.float64)
+    for i in range(1, n + 1):
+        best = np.maximum(h[i - 1, :-1] + score[i - 1], h[i - 1, 1:])
+        h[i, 1:] = np.maximum.accumulate(best)
+    steps: List[Tuple[Optional[int], Optional[int]]] = []
+    i, j = n, m
+    while i > 0 and j > 0:
+        s = score[i - 1, j - 1]
+        if s > 0 and h[i, j] == h[i - 1, j - 1] + s:
+            steps.append((i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif h[i, j] == h[i - 1, j]:
+            steps.append((i - 1, None))
+            i -= 1
+        else:
+            steps.append((None, j - 1))
+            j -= 1
+    steps.extend((r, None) for r in range(i - 1, -1, -1))
+    steps.extend((None, c) for c in range(j - 1, -1, -1))
+    steps.reverse()
+    return steps
+
+
+def _pair_rewrites(steps: List[Tuple[Optional[int], Optional[int]]]) -> List[Tuple[Optional[int], Optional[int]]]:
+    # exactly one deleted and one inserted page between the same two matches: the page was rewritten in place
+    out: List[Tuple[Optional[int], Optional[int]]] = []
+    gap: List[Tuple[Optional[int], Optional[int]]] = []
+
+    def flush() -> None:
+        dels = [r for r, c in gap if c is None]
+        ins = [c for r, c in gap if r is None]
+        out.extend([(dels[0], ins[0])] if len(dels) == len(ins) == 1 else gap)
+        gap.clear()
+
+    for r, c in steps:
+        if r is None or c is None:
+            gap.append((r, c))
+            continue
+        flush()
+        out.append((r, c))
+    flush()
+    return out
+
+
+def align_pages(
+    ref_pages: Sequence[Page],
+    act_pages: Sequence[Page],
+    shingle_size: int = 3,
+    num_perm: int = 64,
+    min_similarity: float = 0.3,
+) -> List[Tuple[Optional[Page], Optional[Page]]]:
+    """
+    Pair reference and actual pages so that inserted or deleted pages do not
+    shift everything after them. Pages are fingerprinted with MinHash over
+    word shingles; pages at least `min_similarity` alike can be matched,
+    and the monotonic alignment with the highest total similarity wins.
+    """
+    vocab: Dict[str, int] = {}
+    hasher = MinHasher(num_perm)
+    sim = similarity(
+        signatures(ref_pages, hasher, shingle_size, vocab), signatures(act_pages, hasher, shingle_size, vocab)
+    )
+    steps = _pair_rewrites(align_scores(sim - np.float32(min_similarity) + np.float32(1e-6)))
+    return [
+        (ref_pages[r] if r is not None else None, act_pages[c] if c is not None else None) for r, c in steps
+    ]
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import difflib
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from src.doc_compare.page_align import Page, align_pages
+
+UNCHANGED, MODIFIED, INSERTED, DELETED = "unchanged", "modified", "inserted", "deleted"
+
+_WS = re.compile(r"[ \t\f\v\u00a0]+")
+
+
+def normalize_lines(text: str) -> List[str]:
+    """Page text as comparable lines: NFC, collapsed spaces, no blank lines."""
+    text = unicodedata.normalize("NFC", text)
+    return [line for line in (_WS.sub(" ", raw).strip() for raw in text.splitlines()) if line]
+
+
+def same_text(a: str, b: str) -> bool:
+    """Equal after unicode normalization and whitespace collapsing."""
+    return a == b or unicodedata.normalize("NFC", a).split() == unicodedata.normalize("NFC", b).split()
+
+
+@dataclass
+class PagePair:
+    """One reference page matched with one actual page (either may be missing)."""
+    ref: Optional[Page]
+    act: Optional[Page]
+    status: str
+    diff: str = ""
+
+    @property
+    def label(self) -> str:
+        """`Page` value of the comparison row: actual page number, annotated when it moved."""
+        if self.act is None:
+            return f"{self.ref[0]} (removed)"
+        if self.ref is None:
+            return f"{self.act[0]} (added)"
+        if self.ref[0] != self.act[0]:
+            return f"{self.act[0]} (was {self.ref[0]})"
+        return str(self.act[0])
+
+
+def _word_diff(a: str, b: str) -> str:
+    # inline word-level markup for one changed line: [-removed-] {+added+}
+    aw, bw = a.split(" "), b.split(" ")
+    out = []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, aw, bw, autojunk=False).get_opcodes():
+        if op == "equal":
+            out.append(" ".join(aw[i1:i2]))
+            continue
+        if i2 > i1:
+            out.append("[-" + " ".join(aw[i1:i2]) + "-]")
+        if j2 > j1:
+            out.append("{+" + " ".join(bw[j1:j2]) + "+}")
+    return " ".join(out)
+
+
+def diff_text(ref: str, act: str, context: int = 1, max_chars: int = 4000) -> str:
+    """
+    Line diff of two pages with word-level markup on modified lines:
+    `  ` context, `- ` removed, `+ ` added, `~ ` changed in place. Capped at
+    max_chars so one rewritten page cannot blow up the prompt.
+    """
+    a, b = normalize_lines(ref), normalize_lines(act)
+    out: List[str] = []
+    for group in difflib.SequenceMatcher(None, a, b, autojunk=False).get_grouped_opcodes(context):
+        out.append(f"@@ reference line {group[0][1] + 1}, actual line {group[0][3] + 1} @@")
+        for op, i1, i2, j1, j2 in group:
+            if op == "equal":
+                out.extend(f"  {line}" for line in a[i1:i2])
+            elif op == "replace" and i2 - i1 == j2 - j1:
+                out.extend(f"~ {_word_diff(x, y)}" for x, y in zip(a[i1:i2], b[j1:j2]))
+            else:
+                out.extend(f"- {line}" for line in a[i1:i2])
+                out.extend(f"+ {line}" for line in b[j1:j2])
+    text = "\n".join(out)
+    if len(text) > max_chars:
+        text = text[:max_chars] + f"\n… diff truncated ({len(text) - max_chars} more characters)"
+    return text
+
+
+def diff_pages(
+    ref_pages: Sequence[Page],
+    act_pages: Sequence[Page],
+    context: int = 1,
+    max_chars: int = 4000,
+    **align_opts,
+) -> List[PagePair]:
+    """
+    Align the two page lists (see page_align.align_pages, which takes
+    `align_opts`) and classify every pair. Identical pages (after
+    whitespace/unicode normalization) are UNCHANGED with no diff; the rest
+    carry a line/word diff for the LLM to describe.
+    """
+    pairs = []
+    for ref, act in align_pages(ref_pages, act_pages, **align_opts):
+        if ref is not None and act is not None and same_text(ref[1], act[1]):
+            pairs.append(PagePair(ref, act, UNCHANGED))
+            continue
+        status = MODIFIED if ref is not None and act is not None else (DELETED if act is None else INSERTED)
+        diff = diff_text(ref[1] if ref else "", act[1] if act else "", context, max_chars)
+        # differences only in line wrapping / whitespace leave no hunks
+        pairs.append(PagePair(ref, act, status if diff else UNCHANGED, diff))
+    return pairs
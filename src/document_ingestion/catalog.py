@@ -0,0 +1,87 @@
+from __future__ import annotations
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class IndexCatalog:
+    """
+    Chunk bookkeeping of one session index, in <index_dir>/catalog.sqlite:
+
+        documents(name, doc_id)                      one row per ingested file
+        chunks(chunk_id, name, chunk_hash, segment)  which segment holds each live chunk
+
+    Updates touch only the rows of the files being synced, so bookkeeping cost
+    follows the size of the change rather than the size of the session.
+    """
+
+    def __init__(self, index_dir: Path):
+        self.path = Path(index_dir) / "catalog.sqlite"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (name TEXT PRIMARY KEY, doc_id TEXT);
+            CREATE INDEX IF NOT EXISTS documents_doc_id ON documents(doc_id);
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY, name TEXT NOT NULL, chunk_hash TEXT NOT NULL, segment TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_name ON chunks(name);
+            """
+        )
+
+    def doc_id(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT doc_id FROM documents WHERE name=?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def has_document(self, name: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM documents WHERE name=?", (name,)).fetchone() is not None
+
+    def name_for_doc_id(self, doc_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT name FROM documents WHERE doc_id=?", (doc_id,)).fetchone()
+        return row[0] if row else None
+
+    def chunks(self, name: str) -> Dict[str, Tuple[str, str]]:
+        """chunk_id -> (chunk_hash, segment) for one file."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT chunk_id, chunk_hash, segment FROM chunks WHERE name=?", (name,)
+            ).fetchall()
+        return {cid: (h, seg) for cid, h, seg in rows}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def commit(
+        self,
+        documents: Dict[str, Optional[str]],
+        added: Iterable[Tuple[str, str, str, str]],
+        removed: Iterable[str],
+    ) -> None:
+        """Apply one sync in a single transaction; `added` rows are (chunk_id, name, chunk_hash, segment)."""
+        with self._lock:
+            cur = self._db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.executemany("DELETE FROM chunks WHERE chunk_id=?", [(c,) for c in removed])
+                cur.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", list(added))
+                cur.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?)", list(documents.items()))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def relocate_all(self, segment: str) -> None:
+        """After a compaction every live chunk sits in the merged segment."""
+        with self._lock:
+            self._db.execute("UPDATE chunks SET segment=?", (segment,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,266 @@
+from __future__ import annotations
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+
+from utils.index_factory import apply_search_params, index_settings, read_index
+
+class LegacyIndexError(RuntimeError):
+    """An index dir still in FAISS.save_local's pickled layout; migrate it before querying."""
+
+
+CHUNK_STORE_NAME = "chunks.sqlite"
+# exact float32 copies of a quantized index's vectors, row i = index position i
+EXACT_VECTORS_NAME = "vectors.f32"
+# how much of a chunk store SQLite maps (PRAGMA mmap_size); reads past it go through its page cache
+CHUNK_STORE_MMAP_BYTES = 256 * 2**20
+
+# per-chunk metadata; every other key is document-level and stored once per document
+CHUNK_KEYS = frozenset({"page", "page_label", "start_index", "chunk_hash", "chunk_id"})
+
+_SCHEMA = """
+CREATE TABLE documents (doc INTEGER PRIMARY KEY, meta TEXT NOT NULL UNIQUE);
+CREATE TABLE chunks (
+    pos INTEGER PRIMARY KEY,        -- row in the FAISS index
+    chunk_id TEXT NOT NULL UNIQUE,
+    doc INTEGER NOT NULL REFERENCES documents(doc),
+    meta TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+"""
+
+
+def write_chunk_store(path: Path, rows: Iterator[Tuple[int, str, Document]]) -> int:
+    """
+    Write (position, chunk id, Document) rows to a new chunk store at `path`.
+
+    Built under a temp name and renamed into place, so readers never see a
+    partial file. Returns the number of chunks written.
+    """
+    path = Path(path)
+    tmp = path.with_suffix(".sqlite.tmp")
+    tmp.unlink(missing_ok=True)
+    db = sqlite3.connect(str(tmp))
+    try:
+        db.executescript(_SCHEMA)
+        doc_ids: Dict[str, int] = {}
+        n = 0
+        for pos, cid, doc in rows:
+            md = doc.metadata or {}
+            doc_meta = json.dumps({k: v for k, v in md.items() if k not in CHUNK_KEYS}, sort_keys=True, default=str)
+            chunk_meta = json.dumps({k: v for k, v in md.items() if k in CHUNK_KEYS}, default=str)
+            if doc_meta not in doc_ids:
+                doc_ids[doc_meta] = db.execute("INSERT INTO documents(meta) VALUES (?)", (doc_meta,)).lastrowid
+            db.execute(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?, ?)", (int(pos), cid, doc_ids[doc_meta], chunk_meta, doc.page_content)
+            )
+            n += 1
+        db.commit()
+    finally:
+        db.close()
+    os.replace(tmp, path)
+    return n
+
+
+
+def stored_chunk_ids(path: Path, chunk_ids: Iterable[str]) -> Set[str]:
+    """Which of `chunk_ids` the chunk store at `path` holds."""
+    wanted = list(chunk_ids)
+    found: Set[str] = set()
+    db = sqlite3.connect(f"file:{Path(path)}?mode=ro&immutable=1", uri=True)
+    try:
+        for start in range(0, len(wanted), 500):  # below SQLite's bound-parameter limit
+            part = wanted[start:start + 500]
+            marks = ",".join("?" * len(part))
+            found.update(cid for (cid,) in db.execute(f"SELECT chunk_id FROM chunks WHERE chunk_id IN ({marks})", part))
+    finally:
+        db.close()
+    return found
+
+class SQLiteDocstore(Docstore):
+    """
+    Read-only docstore over a chunk store: a query fetches only the rows of
+    its top-k hits instead of unpickling every chunk of the session.
+
+    Segments never change once written, so the file is opened immutable and
+    memory-mapped; its pages are shared through the OS page cache.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        self._db.execute(f"PRAGMA mmap_size={CHUNK_STORE_MMAP_BYTES}")
+        self._doc_meta: Dict[int, Dict[str, Any]] = {}
+
+    def _document_meta(self, doc: int) -> Dict[str, Any]:
+        meta = self._doc_meta.get(doc)
+        if meta is None:
+            row = self._db.execute("SELECT meta FROM documents WHERE doc=?", (doc,)).fetchone()
+            meta = self._doc_meta[doc] = json.loads(row[0])
+        return meta
+
+    def _to_document(self, cid: str, doc: int, meta: str, text: str) -> Document:
+        return Document(id=cid, page_content=text, metadata={**self._document_meta(doc), **json.loads(meta)})
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            row = self._db.execute("SELECT doc, meta, text FROM chunks WHERE chunk_id=?", (search,)).fetchone()
+            if row is None:
+                return f"ID {search} not found."
+            return self._to_document(search, *row)
+
+    def position_of(self, pos: int) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT chunk_id FROM chunks WHERE pos=?", (int(pos),)).fetchone()
+        return row[0] if row else None
+
+    def iter_rows(self) -> Iterator[Tuple[int, str, Document]]:
+        """All (position, chunk id, Document) rows in index order; used by compaction."""
+        with self._lock:
+            rows = self._db.execute("SELECT pos, chunk_id, doc, meta, text FROM chunks ORDER BY pos").fetchall()
+            return iter([(pos, cid, self._to_document(cid, doc, meta, text)) for pos, cid, doc, meta, text in rows])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class PositionIdMap(Mapping):
+    """Lazy FAISS row -> chunk id mapping, resolved per hit from the chunk store."""
+
+    def __init__(self, docstore: SQLiteDocstore):
+        self.docstore = docstore
+
+    def __getitem__(self, pos: int) -> str:
+        cid = self.docstore.position_of(pos)
+        if cid is None:
+            raise KeyError(pos)
+        return cid
+
+    def __iter__(self) -> Iterator[int]:
+        return (pos for pos, _, _ in self.docstore.iter_rows())
+
+    def __len__(self) -> int:
+        return len(self.docstore)
+
+
+class RescoringFAISS(FAISS):
+    """
+    FAISS store over a scalar-quantized index that re-ranks its candidates
+    exactly: k * rescore_factor hits come from the compact codes, then their
+    float32 vectors (memory-mapped side file; only hit rows are paged in)
+    give the true L2 distances and the final top k.
+    """
+
+    def __init__(self, *args: Any, exact_vectors: np.ndarray, rescore_factor: int = 4, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.exact_vectors = exact_vectors
+        self.rescore_factor = max(1, int(rescore_factor))
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Any = None, fetch_k: int = 20, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        import faiss
+
+        vector = np.array([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vector)
+        wanted = k * self.rescore_factor if filter is None else max(fetch_k, k * self.rescore_factor)
+        _, indices = self.index.search(vector, wanted)
+        rows = indices[0][indices[0] >= 0]
+        exact = ((np.asarray(self.exact_vectors[rows]) - vector[0]) ** 2).sum(axis=1)
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+        docs = []
+        for j in np.argsort(exact, kind="stable"):
+            i = int(rows[j])
+            doc = self.docstore.search(self.index_to_docstore_id[i])
+            if not isinstance(doc, Document):
+                raise ValueError(f"Could not find document for position {i}, got {doc}")
+            if filter_func is None or filter_func(doc.metadata):
+                docs.append((doc, float(exact[j])))
+            if len(docs) == k:
+                break
+        threshold = kwargs.get("score_threshold")
+        if threshold is not None:
+            docs = [(d, score) for d, score in docs if score <= threshold]
+        return docs
+
+
+def store_rows(store: FAISS) -> Iterator[Tuple[int, str, Document]]:
+    if isinstance(store.docstore, SQLiteDocstore):
+        return store.docstore.iter_rows()
+    mapping = store.index_to_docstore_id
+    return ((pos, mapping[pos], store.docstore.search(mapping[pos])) for pos in sorted(mapping))
+
+
+def save_store(store: FAISS, path: Path) -> None:
+    """Persist a FAISS store as index.faiss + chunks.sqlite (replaces save_local's index.pkl)."""
+    import faiss
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    write_chunk_store(path / CHUNK_STORE_NAME, store_rows(store))
+    faiss.write_index(store.index, str(path / "index.faiss"))
+    exact = getattr(store, "exact_vectors", None)
+    if exact is not None:
+        np.ascontiguousarray(exact, dtype=np.float32).tofile(path / EXACT_VECTORS_NAME)
+
+
+def load_store(
+    path: Path, embeddings: Embeddings, index_name: str = "index", index_type: str = "flat", mmap: bool = False
+) -> FAISS:
+    """
+    Load a store written by save_store. Never unpickles: dirs that only have
+    FAISS.save_local's index.pkl raise LegacyIndexError and must be converted
+    first (segments.migrate_legacy_index).
+    """
+    path = Path(path)
+    if not (path / CHUNK_STORE_NAME).exists():
+        if (path / f"{index_name}.pkl").exists():
+            raise LegacyIndexError(
+                f"{path} has a pickled docstore (index.pkl); run "
+                f"`python -m src.document_ingestion.migrate_indexes {path}` to convert it"
+            )
+        raise FileNotFoundError(f"No chunk store in {path}")
+    docstore = SQLiteDocstore(path / CHUNK_STORE_NAME)
+    index_to_docstore_id: Mapping = PositionIdMap(docstore)
+    index = read_index(path / f"{index_name}.faiss", index_type, mmap=mmap)
+    settings = index_settings()
+    apply_search_params(index, settings)
+    rescore = int(settings.get("rescore_factor") or 0)
+    if rescore > 0 and (path / EXACT_VECTORS_NAME).exists():
+        exact = np.memmap(path / EXACT_VECTORS_NAME, dtype=np.float32, mode="r", shape=(int(index.ntotal), index.d))
+        return RescoringFAISS(embeddings, index, docstore, index_to_docstore_id,
+                              exact_vectors=exact, rescore_factor=rescore)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def convert_pickled_store(path: Path, index_name: str = "index") -> int:
+    """
+    Rewrite a save_local dir's index.pkl as chunks.sqlite; returns the number
+    of chunks. Migration only (under the index write lock), never on queries.
+    """
+    path = Path(path)
+    with open(path / f"{index_name}.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    rows = ((pos, index_to_docstore_id[pos], docstore.search(index_to_docstore_id[pos]))
+            for pos in sorted(index_to_docstore_id))
+    n = write_chunk_store(path / CHUNK_STORE_NAME, rows)
+    (path / f"{index_name}.pkl").unlink()
+    return n
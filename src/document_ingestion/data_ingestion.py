@@ -5,94 +5,276 @@ import json
 import uuid
 import hashlib
 import shutil
+import time
 from pathlib import Path
-from typing import Iterable, List, Optional, Dict, Any
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import fitz  # PyMuPDF
+import numpy as np
 # from langchain.schema import Document
 from langchain_core.documents import Document
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from utils.model_loader import ModelLoader
+from langchain_core.vectorstores import VectorStore
+from utils.model_loader import ModelLoader, MODEL_REGISTRY
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentportalException
-from utils.file_io import generate_session_id, save_uploaded_files
-from utils.document_ops import load_documents, concat_for_analysis, concat_for_comparison
+from utils.file_io import generate_session_id, save_uploaded_files, save_uploads, UploadRecord
+from utils.blob_store import get_blob_store
+from utils.pdf_metadata import extract_pdf_metadata
+from utils.embedding_cache import text_key
+from utils.embedding_engine import embed_array
+from utils.document_ops import iter_pages, parse_files, concat_for_analysis, concat_for_comparison
+from utils.vectorstore_cache import VECTORSTORE_CACHE
+from utils.executors import get_executor
+from utils.config_loader import load_config_section
+from utils.index_factory import build_vectorstore
+from src.document_ingestion.catalog import IndexCatalog
+from src.document_ingestion.pipeline import PipelineProgress, Timer, log_progress, run_stages
+from src.document_ingestion.segments import (
+    compact_segments,
+    ensure_manifest,
+    index_write_lock,
+    is_legacy,
+    is_segmented,
+    load_index,
+    locate_chunks,
+    needs_compaction,
+    segment_dir,
+    write_manifest,
+    write_segment,
+)
 
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 
 # FAISS Manager (load-or-create)
 class FaissManager:
+    """
+    Session FAISS index stored as append-only segments (see segments.py).
+
+    Every sync writes one new segment holding only the chunks it embedded and
+    records removed chunks as tombstones in manifest.json; chunk-level
+    bookkeeping lives in catalog.sqlite. Nothing already on disk is rewritten,
+    so the cost of an ingest follows the size of the upload, not the session.
+    Chunk ids are derived from (file name, chunk hash, occurrence), so
+    re-ingesting a revised file only embeds new/changed chunks.
+    """
     def __init__(self, index_dir: Path, model_loader: Optional[ModelLoader] = None):
         self.index_dir = Path(index_dir)
         self.index_dir.mkdir(parents=True, exist_ok=True)
-        
-        self.meta_path = self.index_dir / "ingested_meta.json"
-        self._meta: Dict[str, Any] = {"rows": {}} ## this is dict of rows
-        
-        if self.meta_path.exists():
-            try:
-                self._meta = json.loads(self.meta_path.read_text(encoding="utf-8")) or {"rows": {}} # load it if alrady there
-            except Exception:
-                self._meta = {"rows": {}} # init the empty one if dones not exists
-        
+        self.catalog = IndexCatalog(self.index_dir)
 
-        self.model_loader = model_loader or ModelLoader()
-        self.emb = self.model_loader.load_embedding_model()
-        self.vs: Optional[FAISS] = None
+        # shared per-process embedding model unless a custom loader is injected
+        self.model_loader = model_loader
+        self.emb = model_loader.load_embedding_model() if model_loader else MODEL_REGISTRY.get_embedding_model()
+        self.vs: Optional[VectorStore] = None
         
     def _exists(self)-> bool:
-        return (self.index_dir / "index.faiss").exists() and (self.index_dir / "index.pkl").exists()
+        return is_segmented(self.index_dir) or is_legacy(self.index_dir)
     
     @staticmethod
-    def _fingerprint(text: str, md: Dict[str, Any]) -> str:
-        src = md.get("source") or md.get("file_path")
-        rid = md.get("row_id")
-        if src is not None:
-            return f"{src}::{'' if rid is None else rid}"
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
-    
-    def _save_meta(self):
-        self.meta_path.write_text(json.dumps(self._meta, ensure_ascii=False, indent=2), encoding="utf-8")
-        
-        
+    def _doc_key(md: Dict[str, Any]) -> str:
+        return str(md.get("file_name") or md.get("source") or md.get("file_path") or "unknown")
+
+    @staticmethod
+    def _chunk_hash(d: Document) -> str:
+        return (d.metadata or {}).get("chunk_hash") or text_key(d.page_content)
+
+    def _chunk_id(self, key: str, d: Document, seen: Dict[str, int]) -> str:
+        # occurrence counter keeps repeated boilerplate chunks distinct within a file
+        base = f"{key}\0{self._chunk_hash(d)}"
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        return hashlib.sha1(f"{base}\0{n}".encode("utf-8")).hexdigest()
+
+    def _manifest(self) -> Dict[str, Any]:
+        """Current manifest; converts a legacy single-file index into segment 1 (caller holds the write lock)."""
+        return ensure_manifest(self.index_dir)
+
     def add_documents(self,docs: List[Document]):
-        
-        if self.vs is None:
-            raise RuntimeError("Call load_or_create() before add_documents_idempotent().")
-        
-        new_docs: List[Document] = []
-        
+        """Idempotent add; returns the number of newly embedded chunks."""
+        return self.sync_documents(docs)["added"]
+
+    def sync_documents(self, docs: List[Document]) -> Dict[str, int]:
+        """
+        Bring the index in line with `docs` (chunks of one or more files).
+
+        Per file: unchanged content hash -> nothing to do; otherwise only
+        chunks whose ids are new get embedded (into a new segment), and ids no
+        longer present in the file are tombstoned. Returns added/removed/
+        unchanged chunk counts.
+        """
+        groups: Dict[str, List[Document]] = {}
         for d in docs:
-            
-            key = self._fingerprint(d.page_content, d.metadata or {})
-            if key in self._meta["rows"]:
-                continue
-            self._meta["rows"][key] = True
-            new_docs.append(d)
-            
-        if new_docs:
-            self.vs.add_documents(new_docs)
-            self.vs.save_local(str(self.index_dir))
-            self._save_meta()
-        return len(new_docs)
+            groups.setdefault(self._doc_key(d.metadata or {}), []).append(d)
+        return self.sync_stream(
+            (key, (group[0].metadata or {}).get("doc_id"), (lambda g=group: g)) for key, group in groups.items()
+        )
+
+    def sync_stream(
+        self,
+        files: Iterable[Tuple[str, Optional[str], Callable[[], Iterable[Document]]]],
+        progress: Optional[PipelineProgress] = None,
+    ) -> Dict[str, int]:
+        """
+        Streaming form of sync_documents: `files` yields (file key, doc_id,
+        chunks_fn) and chunks_fn() is only called for files that changed.
+
+        Chunks flow parse/split -> embed (batches of `embed_batch_size`) ->
+        segment writer through bounded queues, so the three stages overlap
+        and at most one file's pages plus one segment's buffer
+        (`segment_max_chunks`) are in memory, whatever the corpus size.
+        Segments are only published (manifest, then catalog) once everything
+        succeeded; a failed run leaves the index as it was.
+        """
+        cfg = load_config_section("ingestion")
+        batch_size = int(cfg.get("embed_batch_size", 64))
+        segment_chunks = int(cfg.get("segment_max_chunks", 20000))
+        progress = progress or PipelineProgress()
+
+        with index_write_lock(self.index_dir):
+            manifest = self._manifest()
+            documents: Dict[str, Optional[str]] = {}
+            removed: Dict[str, str] = {}  # chunk id -> segment holding it
+            rows: List[Tuple[str, str, str, str]] = []  # catalog rows of added chunks
+            written: List[str] = []
+            buffer: Dict[str, list] = {"ids": [], "keys": [], "hashes": [], "texts": [], "metas": [], "vectors": []}
+            unchanged = 0
+
+            def chunk_batches() -> Iterator[Tuple[Any, ...]]:
+                nonlocal unchanged
+                timer = Timer()
+                for key, doc_id, chunks_fn in files:
+                    old_chunks = self.catalog.chunks(key)
+                    if doc_id and self.catalog.has_document(key) and self.catalog.doc_id(key) == doc_id:
+                        unchanged += len(old_chunks)
+                        progress.add("parse", skipped=1)
+                        continue
+                    same_as = self.catalog.name_for_doc_id(doc_id) if doc_id else None
+                    if same_as and not self.catalog.has_document(key):
+                        # identical file already indexed under another name
+                        log.info("Duplicate upload skipped", file=key, same_as=same_as)
+                        progress.add("parse", skipped=1)
+                        continue
+
+                    seen: Dict[str, int] = {}
+                    new_ids = set()
+                    batch: List[Document] = []
+                    for d in chunks_fn():
+                        cid = self._chunk_id(key, d, seen)
+                        new_ids.add(cid)
+                        if cid in old_chunks:
+                            unchanged += 1
+                            continue
+                        d.metadata["chunk_id"] = cid
+                        batch.append(d)
+                        if len(batch) >= batch_size:
+                            progress.add("parse", items=len(batch), seconds=timer.lap())
+                            yield ("batch", key, batch)
+                            timer.lap()  # time blocked downstream is not parse time
+                            batch = []
+                    progress.add("parse", items=len(batch), seconds=timer.lap(), files=1)
+                    if batch:
+                        yield ("batch", key, batch)
+                    yield ("file", key, doc_id, {cid: seg for cid, (_, seg) in old_chunks.items() if cid not in new_ids})
+                    timer.lap()
+
+            def embed(item: Tuple[Any, ...]) -> Tuple[Any, ...]:
+                if item[0] != "batch":
+                    return item
+                t0 = time.perf_counter()
+                vectors = embed_array(self.emb, [d.page_content for d in item[2]])
+                progress.add("embed", items=len(vectors), seconds=time.perf_counter() - t0)
+                return item + (vectors,)
+
+            def flush() -> None:
+                if not buffer["ids"]:
+                    return
+                t0 = time.perf_counter()
+                store = build_vectorstore(
+                    buffer["texts"], np.vstack(buffer["vectors"]), self.emb, buffer["metas"], buffer["ids"]
+                )
+                segment = write_segment(self.index_dir, manifest, store)["name"]
+                written.append(segment)
+                rows.extend(zip(buffer["ids"], buffer["keys"], buffer["hashes"], [segment] * len(buffer["ids"])))
+                progress.add("index", items=len(buffer["ids"]), seconds=time.perf_counter() - t0, segments=1)
+                for v in buffer.values():
+                    v.clear()
+
+            def index(item: Tuple[Any, ...]) -> None:
+                if item[0] == "file":
+                    _, key, doc_id, gone = item
+                    removed.update(gone)
+                    documents[key] = doc_id
+                    return
+                _, key, batch, vectors = item
+                buffer["ids"].extend(d.metadata["chunk_id"] for d in batch)
+                buffer["keys"].extend([key] * len(batch))
+                buffer["hashes"].extend(self._chunk_hash(d) for d in batch)
+                buffer["texts"].extend(d.page_content for d in batch)
+                buffer["metas"].extend(d.metadata for d in batch)
+                buffer["vectors"].append(vectors)
+                if len(buffer["ids"]) >= segment_chunks:
+                    flush()
+
+            try:
+                run_stages(chunk_batches(), [embed], index, queue_size=int(cfg.get("queue_batches", 4)))
+                flush()
+            except BaseException:
+                # nothing references these yet
+                for name in written:
+                    shutil.rmtree(segment_dir(self.index_dir, name), ignore_errors=True)
+                raise
+
+            if rows or removed or documents:
+                by_name = {s["name"]: s for s in manifest["segments"]}
+                stale = []
+                for cid, seg in removed.items():
+                    if seg in by_name:
+                        by_name[seg]["tombstones"].append(cid)
+                    else:
+                        stale.append(cid)
+                if stale:
+                    # catalog rows naming a segment the manifest lacks (a compaction that crashed
+                    # before relocating the catalog): find the older segment that holds each chunk
+                    older = [s["name"] for s in manifest["segments"] if s["name"] not in written]
+                    located = locate_chunks(self.index_dir, older, stale)
+                    for cid, seg in located.items():
+                        by_name[seg]["tombstones"].append(cid)
+                    log.warning("Catalog segments missing from manifest; chunks located by id",
+                                index=str(self.index_dir), chunks=len(stale), located=len(located))
+                # manifest first: a crash before the catalog commit re-embeds, never loses chunks
+                write_manifest(self.index_dir, manifest)
+                self.catalog.commit(documents, rows, removed)
+                self.vs = None  # reload lazily with the new segments
+
+        stats = {"added": len(rows), "removed": len(removed), "unchanged": unchanged}
+        log.info("FAISS index synced", index=str(self.index_dir), segments=len(manifest["segments"]), **stats)
+        log_progress(progress, index=str(self.index_dir))
+        if needs_compaction(manifest):
+            get_executor("cpu").submit(self.compact)
+        return stats
+
+    def compact(self):
+        """Merge segments and drop tombstoned vectors (normally run in the background)."""
+        try:
+            return compact_segments(self.index_dir, self.emb, on_commit=self.catalog.relocate_all)
+        except Exception as e:
+            log.error("FAISS compaction failed", index=str(self.index_dir), error=str(e))
+            raise DocumentportalException("FAISS compaction failed", e) from e
     
     def load_or_create(self,texts:Optional[List[str]]=None, metadatas: Optional[List[dict]] = None):
         ## if we running first time then it will not go in this block
         if self._exists():
-            self.vs = FAISS.load_local(
-                str(self.index_dir),
-                embeddings=self.emb,
-                allow_dangerous_deserialization=True,
-            )
+            self.vs = load_index(self.index_dir, self.emb)
             return self.vs
         
         
         if not texts:
             raise DocumentportalException("No existing FAISS index and no data to create one", sys)
-        self.vs = FAISS.from_texts(texts=texts, embedding=self.emb, metadatas=metadatas or [])
-        self.vs.save_local(str(self.index_dir))
+        docs = [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas or [{}] * len(texts))]
+        self.sync_documents(docs)
+        self.vs = load_index(self.index_dir, self.emb)
         return self.vs
         
         
@@ -104,8 +286,6 @@ class ChatIngestor:
         session_id: Optional[str] = None,
     ):
         try:
-            self.model_loader = ModelLoader()
-            
             self.use_session = use_session_dirs
             self.session_id = session_id or generate_session_id()
             
@@ -114,6 +294,9 @@ class ChatIngestor:
             
             self.temp_dir = self._resolve_dir(self.temp_base)
             self.faiss_dir = self._resolve_dir(self.faiss_base)
+            self.stats: Dict[str, int] = {}
+            self.progress = PipelineProgress()
+            self.fm: Optional[FaissManager] = None
 
             log.info("ChatIngestor initialized",
                     session_id=self.session_id,
@@ -132,39 +315,61 @@ class ChatIngestor:
             return d
         return base # fallback: "faiss_index/"
         
-    def _split(self, docs: List[Document], chunk_size=1000, chunk_overlap=200) -> List[Document]:
+    @staticmethod
+    def _file_chunks(record: UploadRecord, splitter: RecursiveCharacterTextSplitter) -> Iterator[Document]:
+        """Chunks of one upload, split page by page as its page ranges are extracted."""
+        # blobs parsed before (by any session) come from the parse cache
+        for page in iter_pages(record.path, record.sha256):
+            # stable identity: original file name + content hash (saved names are random)
+            page.metadata["file_name"] = record.name
+            page.metadata["doc_id"] = record.sha256
+            for c in splitter.split_documents([page]):
+                c.metadata["chunk_hash"] = text_key(c.page_content)
+                yield c
+
+    def save(self, uploaded_files: Iterable) -> List[UploadRecord]:
+        """Persist uploads to this session's temp dir (deduplicated in the blob store)."""
+        records = save_uploads(uploaded_files, self.temp_dir)
+        if not records:
+            raise ValueError("No valid documents loaded")
+        return records
+
+    def index_records(
+        self,
+        records: List[UploadRecord],
+        *,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        on_progress: Optional[Callable[[Dict[str, Dict[str, float]]], None]] = None,
+    ) -> Dict[str, int]:
+        """Parse, split, embed and index saved uploads; returns added/removed/unchanged counts."""
         splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        chunks = splitter.split_documents(docs)
-        log.info("Documents split", chunks=len(chunks), chunk_size=chunk_size, overlap=chunk_overlap)
-        return chunks
-    
+        ## FAISS manager very very important class for the docchat
+        self.fm = FaissManager(self.faiss_dir)
+        # files stream through parse -> split -> embed -> segment write;
+        # only new/changed chunks get embedded, vanished ones are deleted
+        self.progress = PipelineProgress(on_progress)
+        self.stats = self.fm.sync_stream(
+            ((r.name, r.sha256, (lambda r=r: self._file_chunks(r, splitter))) for r in records),
+            progress=self.progress,
+        )
+        log.info("FAISS index updated", index=str(self.faiss_dir), chunk_size=chunk_size,
+                 overlap=chunk_overlap, **self.stats)
+        return self.stats
+
     def built_retriver( self,
         uploaded_files: Iterable,
         *,
         chunk_size: int = 1000,
         chunk_overlap: int = 200,
-        k: int = 5,):
+        k: int = 5,
+        on_progress: Optional[Callable[[Dict[str, Dict[str, float]]], None]] = None,):
         try:
-            paths = save_uploaded_files(uploaded_files, self.temp_dir)
-            docs = load_documents(paths)
-            if not docs:
-                raise ValueError("No valid documents loaded")
-            
-            chunks = self._split(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            
-            ## FAISS manager very very important class for the docchat
-            fm = FaissManager(self.faiss_dir, self.model_loader)
-            
-            texts = [c.page_content for c in chunks]
-            metas = [c.metadata for c in chunks]
-            
-            try:
-                vs = fm.load_or_create(texts=texts, metadatas=metas)
-            except Exception:
-                vs = fm.load_or_create(texts=texts, metadatas=metas)
-                
-            added = fm.add_documents(chunks)
-            log.info("FAISS index updated", added=added, index=str(self.faiss_dir))
+            records = self.save(uploaded_files)
+            self.index_records(records, chunk_size=chunk_size, chunk_overlap=chunk_overlap, on_progress=on_progress)
+            vs = self.fm.load_or_create()
+            # warm this worker's cache so the first /chat/query skips load_local
+            VECTORSTORE_CACHE.put(str(self.faiss_dir), "index", vs)
             
             return vs.as_retriever(search_type="similarity", search_kwargs={"k": k})
             
@@ -187,22 +392,32 @@ class DocHandler:
         log.info("DocHandler initialized", session_id=self.session_id, session_path=self.session_path)
 
     def save_pdf(self, uploaded_file) -> str:
+        return str(self.save_upload(uploaded_file).path)
+
+    def save_upload(self, uploaded_file) -> UploadRecord:
+        """Stream the PDF to the session dir; the record carries its sha256 for caching."""
         try:
             filename = os.path.basename(uploaded_file.name)
             if not filename.lower().endswith(".pdf"):
                 raise ValueError("Invalid file type. Only PDFs are allowed.")
-            save_path = os.path.join(self.session_path, filename)
-            with open(save_path, "wb") as f:
-                if hasattr(uploaded_file, "read"):
-                    f.write(uploaded_file.read())
-                else:
-                    f.write(uploaded_file.getbuffer())
-            log.info("PDF saved successfully", file=filename, save_path=save_path, session_id=self.session_id)
-            return save_path
+            record = get_blob_store().put(uploaded_file, Path(self.session_path) / filename)
+            log.info("PDF saved successfully", file=filename, save_path=str(record.path),
+                     sha256=record.sha256, bytes=record.size, session_id=self.session_id)
+            return record
         except Exception as e:
             log.error("Failed to save PDF", error=str(e), session_id=self.session_id)
             raise DocumentportalException(f"Failed to save PDF: {str(e)}", e) from e
 
+    def read_metadata(self, pdf_path: str) -> Dict[str, str]:
+        """Metadata fields available without the LLM (PDF info dict, page count, local language detection)."""
+        try:
+            metadata = extract_pdf_metadata(pdf_path)
+            log.info("PDF metadata read", pdf_path=pdf_path, session_id=self.session_id, **metadata)
+            return metadata
+        except Exception as e:
+            log.error("Failed to read PDF metadata", error=str(e), pdf_path=pdf_path, session_id=self.session_id)
+            raise DocumentportalException(f"Could not read PDF metadata: {pdf_path}", e) from e
+
     def read_pdf(self, pdf_path: str) -> str:
         try:
             text_chunks = []
@@ -225,22 +440,28 @@ class DocumentComparator:
         self.session_id = session_id or generate_session_id()
         self.session_path = self.base_dir / self.session_id
         self.session_path.mkdir(parents=True, exist_ok=True)
+        self._hashes: Dict[str, str] = {}  # saved path -> sha256, for the parse cache
+        self._pair: Optional[Tuple[Path, Path]] = None  # (reference, actual) of the last save_uploads()
         log.info("DocumentComparator initialized", session_path=str(self.session_path))
 
     def save_uploaded_files(self, reference_file, actual_file):
+        ref, act = self.save_uploads(reference_file, actual_file)
+        return ref.path, act.path
+
+    def save_uploads(self, reference_file, actual_file) -> Tuple[UploadRecord, UploadRecord]:
+        """Stream both PDFs to the session dir; records carry their sha256 for caching."""
         try:
-            ref_path = self.session_path / reference_file.name
-            act_path = self.session_path / actual_file.name
-            for fobj, out in ((reference_file, ref_path), (actual_file, act_path)):
+            records = []
+            for fobj in (reference_file, actual_file):
                 if not fobj.name.lower().endswith(".pdf"):
                     raise ValueError("Only PDF files are allowed.")
-                with open(out, "wb") as f:
-                    if hasattr(fobj, "read"):
-                        f.write(fobj.read())
-                    else:
-                        f.write(fobj.getbuffer())
-            log.info("Files saved", reference=str(ref_path), actual=str(act_path), session=self.session_id)
-            return ref_path, act_path
+                records.append(get_blob_store().put(fobj, self.session_path / os.path.basename(fobj.name)))
+            ref, act = records
+            self._hashes.update({str(r.path): r.sha256 for r in records})
+            self._pair = (Path(ref.path), Path(act.path))
+            log.info("Files saved", reference=str(ref.path), actual=str(act.path),
+                     reference_sha256=ref.sha256, actual_sha256=act.sha256, session=self.session_id)
+            return ref, act
         except Exception as e:
             log.error("Error saving PDF files", error=str(e), session=self.session_id)
             raise DocumentportalException("Error saving files", e) from e
@@ -264,11 +485,12 @@ class DocumentComparator:
 
     def combine_documents(self) -> str:
         try:
+            files = [f for f in sorted(self.session_path.iterdir()) if f.is_file() and f.suffix.lower() == ".pdf"]
             doc_parts = []
-            for file in sorted(self.session_path.iterdir()):
-                if file.is_file() and file.suffix.lower() == ".pdf":
-                    content = self.read_pdf(file)
-                    doc_parts.append(f"Document: {file.name}\n{content}")
+            # both PDFs are extracted concurrently in the parse pool
+            for file, pages in zip(files, parse_files(files, [self._hashes.get(str(f)) for f in files])):
+                content = "\n".join(f"\n --- Page {d.metadata['page'] + 1} --- \n{d.page_content}" for d in pages)
+                doc_parts.append(f"Document: {file.name}\n{content}")
             combined_text = "\n\n".join(doc_parts)
             log.info("Documents combined", count=len(doc_parts), session=self.session_id)
             return combined_text
@@ -276,12 +498,27 @@ class DocumentComparator:
             log.error("Error combining documents", error=str(e), session=self.session_id)
             raise DocumentportalException("Error combining documents", e) from e
 
+    def load_pages(self) -> Tuple[List[Tuple[int, str]], List[Tuple[int, str]]]:
+        """(page number, text) lists for the reference and actual PDF of save_uploads()."""
+        try:
+            if self._pair is None:
+                raise ValueError("No uploaded documents to compare.")
+            docs = parse_files(list(self._pair), [self._hashes.get(str(p)) for p in self._pair])
+            ref_pages, act_pages = ([(d.metadata["page"] + 1, d.page_content) for d in pages] for pages in docs)
+            log.info("Pages loaded", reference_pages=len(ref_pages), actual_pages=len(act_pages),
+                     session=self.session_id)
+            return ref_pages, act_pages
+        except Exception as e:
+            log.error("Error loading pages", error=str(e), session=self.session_id)
+            raise DocumentportalException("Error loading pages", e) from e
+
     def clean_old_sessions(self, keep_latest: int = 3):
         try:
             sessions = sorted([f for f in self.base_dir.iterdir() if f.is_dir()], reverse=True)
             for folder in sessions[keep_latest:]:
                 shutil.rmtree(folder, ignore_errors=True)
                 log.info("Old session folder deleted", path=str(folder))
+            get_blob_store().gc()  # drop uploads no remaining session links to
         except Exception as e:
             log.error("Error cleaning old sessions", error=str(e))
             raise DocumentportalException("Error cleaning old sessions", e) from e
@@ -0,0 +1,359 @@
+from __future__ import annotations
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from logger import GLOBAL_LOGGER as log
+from utils.config_loader import load_config_section
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+STATES = (QUEUED, RUNNING, SUCCEEDED, FAILED)
+
+
+def _with_timings(job: Dict[str, Any]) -> Dict[str, Any]:
+    end = job["finished_at"] or time.time()
+    job["timings"] = {
+        "queued_s": round((job["started_at"] or end) - job["created_at"], 3),
+        "run_s": round(end - job["started_at"], 3) if job["started_at"] else None,
+    }
+    return job
+
+
+class JobQueue:
+    """
+    Durable local job queue in one SQLite file (WAL), shared by the API
+    workers that enqueue and the ingestion processes that run jobs:
+
+        jobs(id, kind, state, payload, progress, result, error, worker,
+             created_at, started_at, finished_at, heartbeat_at)
+
+    claim() moves the oldest queued job to running inside one write
+    transaction, so each job is handed to exactly one worker. Running jobs
+    whose heartbeat stopped (worker killed) are put back by requeue_stale().
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, kind TEXT NOT NULL, state TEXT NOT NULL,
+                payload TEXT NOT NULL, progress TEXT, result TEXT, error TEXT, worker TEXT,
+                created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, created_at);
+            """
+        )
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, state, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(payload, default=str), time.time()),
+            )
+        log.info("Job queued", job_id=job_id, kind=kind)
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Take the oldest queued job (now running under `worker`), or None."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE state=? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET state=?, worker=?, started_at=?, heartbeat_at=? WHERE id=?",
+                        (RUNNING, worker, now, now, row[0]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(row[0]) if row is not None else None
+
+    def update_progress(self, job_id: str, progress: Dict[str, Any]) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET progress=?, heartbeat_at=? WHERE id=?", (json.dumps(progress), time.time(), job_id)
+            )
+
+    def heartbeat(self, job_id: str) -> None:
+        with self._lock:
+            self._db.execute("UPDATE jobs SET heartbeat_at=? WHERE id=?", (time.time(), job_id))
+
+    def finish(self, job_id: str, result: Dict[str, Any]) -> None:
+        self._close(job_id, SUCCEEDED, result=json.dumps(result, default=str))
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._close(job_id, FAILED, error=error)
+
+    def _close(self, job_id: str, state: str, result: Optional[str] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET state=?, result=?, error=?, finished_at=? WHERE id=?",
+                (state, result, error, time.time(), job_id),
+            )
+
+    def requeue_stale(self, older_than_s: float) -> int:
+        """Hand running jobs without a recent heartbeat back to the queue; returns the count."""
+        with self._lock:
+            n = self._db.execute(
+                "UPDATE jobs SET state=?, worker=NULL WHERE state=? AND heartbeat_at < ?",
+                (QUEUED, RUNNING, time.time() - older_than_s),
+            ).rowcount
+        if n:
+            log.warning("Stale jobs requeued", count=n)
+        return n
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cur = self._db.execute("SELECT * FROM jobs WHERE id=?", (job_id,))
+            row = cur.fetchone()
+            cols = [c[0] for c in cur.description]
+        if row is None:
+            return None
+        job = dict(zip(cols, row))
+        for key in ("payload", "progress", "result"):
+            job[key] = json.loads(job[key]) if job[key] else None
+        return _with_timings(job)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {**{state: 0 for state in STATES}, **dict(rows)}
+
+
+class SpoolJobQueue:
+    """
+    Same interface as JobQueue over a directory spool, for hosts where a
+    shared SQLite file is unwelcome (e.g. network filesystems without
+    reliable locking). One JSON file per job, moved between state dirs:
+
+        <root>/{queued,running,succeeded,failed}/<created_us>_<id>.json
+
+    claim() is an atomic rename from queued/ to running/; only the worker
+    that won the rename writes the file afterwards.
+    """
+
+    def __init__(self, root: Path):
+        self.path = Path(root)
+        for state in STATES:
+            (self.path / state).mkdir(parents=True, exist_ok=True)
+
+    def _find(self, job_id: str) -> Optional[Path]:
+        for state in STATES:
+            hit = next((self.path / state).glob(f"*_{job_id}.json"), None)
+            if hit is not None:
+                return hit
+        return None
+
+    @staticmethod
+    def _write(path: Path, job: Dict[str, Any]) -> None:
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp.write_text(json.dumps(job, default=str), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        path = self.path / RUNNING
+        hit = next(path.glob(f"*_{job_id}.json"), None)
+        if hit is None:  # requeued or finished meanwhile
+            return
+        job = json.loads(hit.read_text(encoding="utf-8"))
+        job.update(fields)
+        self._write(hit, job)
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        job = {"id": job_id, "kind": kind, "state": QUEUED, "payload": payload, "progress": None, "result": None,
+               "error": None, "worker": None, "created_at": now, "started_at": None, "finished_at": None,
+               "heartbeat_at": None}
+        self._write(self.path / QUEUED / f"{int(now * 1e6):020d}_{job_id}.json", job)
+        log.info("Job queued", job_id=job_id, kind=kind)
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        for queued in sorted((self.path / QUEUED).glob("*.json")):
+            running = self.path / RUNNING / queued.name
+            try:
+                os.rename(queued, running)
+            except FileNotFoundError:  # another worker got it
+                continue
+            job = json.loads(running.read_text(encoding="utf-8"))
+            now = time.time()
+            job.update(state=RUNNING, worker=worker, started_at=now, heartbeat_at=now)
+            self._write(running, job)
+            return _with_timings(job)
+        return None
+
+    def update_progress(self, job_id: str, progress: Dict[str, Any]) -> None:
+        self._update(job_id, progress=progress, heartbeat_at=time.time())
+
+    def heartbeat(self, job_id: str) -> None:
+        self._update(job_id, heartbeat_at=time.time())
+
+    def finish(self, job_id: str, result: Dict[str, Any]) -> None:
+        self._close(job_id, SUCCEEDED, result=result)
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._close(job_id, FAILED, error=error)
+
+    def _close(self, job_id: str, state: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> None:
+        hit = next((self.path / RUNNING).glob(f"*_{job_id}.json"), None)
+        if hit is None:
+            return
+        job = json.loads(hit.read_text(encoding="utf-8"))
+        job.update(state=state, result=result, error=error, finished_at=time.time())
+        self._write(self.path / state / hit.name, job)
+        hit.unlink(missing_ok=True)
+
+    def requeue_stale(self, older_than_s: float) -> int:
+        n = 0
+        cutoff = time.time() - older_than_s
+        for running in (self.path / RUNNING).glob("*.json"):
+            try:
+                job = json.loads(running.read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                continue
+            if (job.get("heartbeat_at") or 0) < cutoff:
+                job.update(state=QUEUED, worker=None)
+                self._write(self.path / QUEUED / running.name, job)
+                running.unlink(missing_ok=True)
+                n += 1
+        if n:
+            log.warning("Stale jobs requeued", count=n)
+        return n
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        for _ in range(3):  # the file may move between states while we look
+            hit = self._find(job_id)
+            if hit is None:
+                return None
+            try:
+                return _with_timings(json.loads(hit.read_text(encoding="utf-8")))
+            except FileNotFoundError:
+                continue
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {state: sum(1 for _ in (self.path / state).glob("*.json")) for state in STATES}
+
+
+# jobs.backend -> queue class; both take their location (db file / spool dir)
+QUEUE_BACKENDS = {"sqlite": JobQueue, "spool": SpoolJobQueue}
+
+
+def _run_chat_index(payload: Dict[str, Any], on_progress: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    # imported here: the API process only enqueues and never needs the ingestion stack for that
+    from src.document_ingestion.data_ingestion import ChatIngestor
+    from utils.file_io import UploadRecord
+
+    ci = ChatIngestor(
+        temp_base=payload["temp_base"],
+        faiss_base=payload["faiss_base"],
+        use_session_dirs=payload["use_session_dirs"],
+        session_id=payload["session_id"],
+    )
+    records = [UploadRecord(path=Path(f["path"]), name=f["name"], sha256=f["sha256"], size=f["size"])
+               for f in payload["files"]]
+    stats = ci.index_records(
+        records, chunk_size=payload["chunk_size"], chunk_overlap=payload["chunk_overlap"], on_progress=on_progress
+    )
+    return {"session_id": ci.session_id, **stats}
+
+
+# job kind -> handler(payload, on_progress) -> result
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any], Callable[[Dict[str, Any]], None]], Dict[str, Any]]] = {
+    "chat_index": _run_chat_index,
+}
+
+
+def run_job(queue, job: Dict[str, Any]) -> bool:
+    """Run one claimed job to completion, recording progress and the outcome; True on success."""
+    cfg = load_config_section("jobs")
+    interval = float(cfg.get("progress_interval_s", 0.5))
+    job_id = job["id"]
+    latest: Dict[str, Any] = {}
+    last = [0.0]
+
+    def on_progress(snapshot: Dict[str, Any]) -> None:
+        # throttled: the pipeline reports every batch
+        latest.update(snapshot)
+        now = time.monotonic()
+        if now - last[0] >= interval:
+            last[0] = now
+            queue.update_progress(job_id, snapshot)
+
+    done = threading.Event()
+
+    def beat() -> None:
+        # long single stages (one huge PDF) report no progress; keep the job visibly alive
+        while not done.wait(float(cfg.get("heartbeat_s", 10))):
+            queue.heartbeat(job_id)
+
+    threading.Thread(target=beat, name=f"job-{job_id[:8]}-heartbeat", daemon=True).start()
+    t0 = time.perf_counter()
+    try:
+        result = JOB_HANDLERS[job["kind"]](job["payload"], on_progress)
+        queue.update_progress(job_id, latest)
+        queue.finish(job_id, result)
+        log.info("Job succeeded", job_id=job_id, kind=job["kind"], seconds=round(time.perf_counter() - t0, 3))
+        return True
+    except Exception as e:
+        log.exception("Job failed", job_id=job_id, kind=job["kind"])
+        queue.fail(job_id, str(e))
+        return False
+    finally:
+        done.set()
+
+
+def run_next_job(backend: str, location: str) -> Optional[str]:
+    """Claim and run the oldest queued job (API "ingest" pool or worker). Returns its id."""
+    queue = get_job_queue(backend, location)
+    job = queue.claim(f"{socket.gethostname()}:{os.getpid()}")
+    if job is None:
+        return None
+    run_job(queue, job)
+    return job["id"]
+
+
+_QUEUES: Dict[Tuple[str, str], Any] = {}
+_QUEUES_LOCK = threading.Lock()
+
+
+def queue_location() -> Tuple[str, str]:
+    """(backend, location) from the jobs config; env JOBS_BACKEND, JOBS_DB, JOBS_SPOOL_DIR."""
+    cfg = load_config_section("jobs")
+    backend = os.getenv("JOBS_BACKEND", cfg.get("backend", "sqlite"))
+    if backend not in QUEUE_BACKENDS:
+        raise ValueError(f"Unknown jobs backend: {backend}")
+    if backend == "spool":
+        return backend, os.getenv("JOBS_SPOOL_DIR", cfg.get("spool_dir", "data/jobs_spool"))
+    return backend, os.getenv("JOBS_DB", cfg.get("db", "data/jobs.sqlite"))
+
+
+def get_job_queue(backend: Optional[str] = None, location: Optional[str] = None):
+    """Per-process handle of the configured job queue (JobQueue or SpoolJobQueue)."""
+    if backend is None or location is None:
+        backend, location = queue_location()
+    key = (backend, str(location))
+    with _QUEUES_LOCK:
+        queue = _QUEUES.get(key)
+        if queue is None:
+            queue = _QUEUES[key] = QUEUE_BACKENDS[backend](Path(location))
+        return queue
@@ -0,0 +1,43 @@
+"""
+One-time conversion of pre-segment session indexes (FAISS.save_local's
+index.faiss + pickled index.pkl) to the segmented layout, so the query
+path never has to unpickle.
+
+    python -m src.document_ingestion.migrate_indexes            # FAISS_BASE and its session dirs
+    python -m src.document_ingestion.migrate_indexes faiss_index/session_x
+
+Each dir is converted under its index write lock; already migrated dirs
+are skipped. Only run it on index dirs this deployment wrote itself.
+"""
+from __future__ import annotations
+import argparse
+import os
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from logger import GLOBAL_LOGGER as log
+from src.document_ingestion.segments import migrate_legacy_index
+
+
+def _candidates(root: Path) -> Iterator[Path]:
+    yield root
+    if root.is_dir():
+        yield from sorted(p for p in root.iterdir() if p.is_dir())
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("paths", nargs="*", default=[os.getenv("FAISS_BASE", "faiss_index")],
+                   help="index dirs, or a base dir whose session subdirs are checked too")
+    args = p.parse_args(argv)
+    migrated = 0
+    for root in args.paths:
+        for index_dir in _candidates(Path(root)):
+            if migrate_legacy_index(index_dir):
+                migrated += 1
+                print(f"migrated {index_dir}")
+    log.info("Legacy index migration finished", migrated=migrated)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from logger import GLOBAL_LOGGER as log
+
+_DONE = object()
+
+
+class PipelineProgress:
+    """
+    Per-stage progress of one ingestion run: items handled and busy seconds.
+
+    `on_update(snapshot)` is called after every update (cheap; used to feed
+    job status), and a summary is logged when the run finishes.
+    """
+
+    STAGES = ("parse", "embed", "index")
+
+    def __init__(self, on_update: Optional[Callable[[Dict[str, Dict[str, float]]], None]] = None):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {s: {"items": 0, "seconds": 0.0} for s in self.STAGES}
+        self.on_update = on_update
+
+    def add(self, stage: str, items: int = 0, seconds: float = 0.0, **extra: float) -> None:
+        with self._lock:
+            st = self._stages.setdefault(stage, {"items": 0, "seconds": 0.0})
+            st["items"] += items
+            st["seconds"] += seconds
+            for k, v in extra.items():
+                st[k] = st.get(k, 0) + v
+            snap = self._snapshot()
+        if self.on_update is not None:
+            self.on_update(snap)
+
+    def _snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {s: {k: round(v, 3) if isinstance(v, float) else v for k, v in d.items()}
+                for s, d in self._stages.items()}
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return self._snapshot()
+
+
+def _put(q: "queue.Queue[Any]", item: Any, stop: threading.Event) -> None:
+    # bounded put that gives up once a downstream stage has failed
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def run_stages(
+    source: Iterable[Any],
+    stages: List[Callable[[Any], Any]],
+    sink: Callable[[Any], None],
+    queue_size: int = 4,
+) -> None:
+    """
+    Run `source -> stage_1 -> ... -> sink` with one thread per source/stage
+    and bounded queues between them, so at most `queue_size` items wait at
+    each hop and all stages overlap. The sink runs on the calling thread.
+    The first exception anywhere stops the pipeline and is re-raised here.
+    """
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    queues: List["queue.Queue[Any]"] = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    def produce() -> None:
+        try:
+            for item in source:
+                if stop.is_set():
+                    return
+                _put(queues[0], item, stop)
+        except BaseException as e:  # surfaced on the calling thread
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(queues[0], _DONE, stop)
+
+    def work(fn: Callable[[Any], Any], inbox: "queue.Queue[Any]", outbox: "queue.Queue[Any]") -> None:
+        try:
+            while not stop.is_set():
+                try:
+                    item = inbox.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                _put(outbox, fn(item), stop)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(outbox, _DONE, stop)
+
+    threads = [threading.Thread(target=produce, name="ingest-source", daemon=True)]
+    for i, fn in enumerate(stages):
+        threads.append(threading.Thread(
+            target=work, args=(fn, queues[i], queues[i + 1]), name=f"ingest-stage-{i}", daemon=True
+        ))
+    for t in threads:
+        t.start()
+    try:
+        while not stop.is_set():
+            try:
+                item = queues[-1].get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                break
+            sink(item)
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        for t in threads:
+            t.join()
+    if errors:
+        raise errors[0]
+
+
+class Timer:
+    """Accumulates busy time of a generator stage between its yields."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+
+    def lap(self) -> float:
+        now = time.perf_counter()
+        elapsed, self.started = now - self.started, now
+        return elapsed
+
+
+def log_progress(progress: PipelineProgress, **fields: Any) -> None:
+    log.info("Ingestion pipeline finished", stages=progress.snapshot(), **fields)
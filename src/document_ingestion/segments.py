@@ -0,0 +1,410 @@
+from __future__ import annotations
+import json
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_community.vectorstores import FAISS
+
+from logger import GLOBAL_LOGGER as log
+from utils.config_loader import load_config_section
+from utils.embedding_engine import embed_array
+from utils.index_factory import build_vectorstore, index_type_of, read_index, reconstruct_all, storage_of
+from src.document_ingestion.catalog import IndexCatalog
+from src.document_ingestion.chunk_store import (
+    CHUNK_STORE_MMAP_BYTES,
+    CHUNK_STORE_NAME,
+    EXACT_VECTORS_NAME,
+    LegacyIndexError,
+    convert_pickled_store,
+    load_store,
+    save_store,
+    store_rows,
+    stored_chunk_ids,
+)
+
+try:  # advisory cross-process lock; not available on Windows
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+MANIFEST_NAME = "manifest.json"
+SEGMENTS_DIR = "segments"
+
+_SEGMENT_CFG = load_config_section("faiss_db").get("segments", {}) or {}
+MAX_SEGMENTS = int(_SEGMENT_CFG.get("max_segments", 8))
+MAX_TOMBSTONE_RATIO = float(_SEGMENT_CFG.get("max_tombstone_ratio", 0.25))
+# query-side loads map index.faiss read-only so workers share the page cache
+MMAP_LOADS = os.getenv(
+    "FAISS_MMAP", str(load_config_section("faiss_db").get("mmap", True))
+).lower() == "true"
+
+
+# ---------- Manifest ----------
+
+def read_manifest(index_dir: Path) -> Optional[Dict[str, Any]]:
+    path = Path(index_dir) / MANIFEST_NAME
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def write_manifest(index_dir: Path, manifest: Dict[str, Any]) -> None:
+    """Atomically replace manifest.json (readers see the old or the new one, never half)."""
+    manifest["updated_at"] = time.time()
+    path = Path(index_dir) / MANIFEST_NAME
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def empty_manifest() -> Dict[str, Any]:
+    return {"version": 1, "next_seq": 1, "segments": []}
+
+
+@contextmanager
+def index_write_lock(index_dir: Path) -> Iterator[None]:
+    """Serialize writers (ingest, compaction) of one index dir across threads and processes."""
+    path = Path(index_dir) / ".write.lock"
+    with open(path, "a+") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def segment_dir(index_dir: Path, name: str) -> Path:
+    return Path(index_dir) / SEGMENTS_DIR / name
+
+
+def _dir_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+
+
+def write_segment(index_dir: Path, manifest: Dict[str, Any], store: FAISS) -> Dict[str, Any]:
+    """Persist `store` as the next segment and register it in `manifest` (not yet saved)."""
+    name = f"seg_{manifest['next_seq']:06d}"
+    manifest["next_seq"] += 1
+    path = segment_dir(index_dir, name)
+    path.mkdir(parents=True, exist_ok=True)
+    save_store(store, path)
+    entry = {
+        "name": name,
+        "count": int(store.index.ntotal),
+        "index_type": index_type_of(store.index),
+        "storage": storage_of(store.index),
+        "bytes": _dir_bytes(path),
+        "tombstones": [],
+        "created_at": time.time(),
+    }
+    manifest["segments"].append(entry)
+    return entry
+
+
+# ---------- Legacy (FAISS.save_local) dirs ----------
+
+def is_legacy(index_dir: Path, index_name: str = "index") -> bool:
+    """A pre-segment dir: save_local's index.faiss + pickled index.pkl and no manifest."""
+    index_dir = Path(index_dir)
+    return (
+        not is_segmented(index_dir)
+        and (index_dir / f"{index_name}.faiss").exists()
+        and (index_dir / f"{index_name}.pkl").exists()
+    )
+
+
+def _import_legacy_meta(index_dir: Path, segment: str) -> None:
+    # ingested_meta.json v2 -> catalog rows; pre-v2 metas only hold "source::row_id"
+    # keys of random upload names, so there is nothing to reuse
+    meta_path = Path(index_dir) / "ingested_meta.json"
+    if not meta_path.exists():
+        return
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8")) or {}
+    except Exception:
+        meta = {}
+    if meta.get("version") == 2:
+        docs = meta.get("documents", {})
+        catalog = IndexCatalog(index_dir)
+        try:
+            catalog.commit(
+                {name: v.get("doc_id") for name, v in docs.items()},
+                [(cid, name, h, segment) for name, v in docs.items() for cid, h in v.get("chunks", {}).items()],
+                [],
+            )
+        finally:
+            catalog.close()
+    meta_path.unlink()
+
+
+def ensure_manifest(index_dir: Path) -> Dict[str, Any]:
+    """
+    Current manifest, creating it if missing; a legacy dir is converted into
+    segment 1 (its index.pkl becomes chunks.sqlite). Caller holds the write lock.
+    """
+    index_dir = Path(index_dir)
+    manifest = read_manifest(index_dir)
+    if manifest is not None:
+        return manifest
+    manifest = empty_manifest()
+    if is_legacy(index_dir):
+        name = f"seg_{manifest['next_seq']:06d}"
+        manifest["next_seq"] += 1
+        seg = segment_dir(index_dir, name)
+        seg.mkdir(parents=True, exist_ok=True)
+        for fname in ("index.faiss", "index.pkl"):
+            os.replace(index_dir / fname, seg / fname)
+        convert_pickled_store(seg)
+        manifest["segments"].append({
+            "name": name, "count": int(read_index(seg / "index.faiss", "flat", mmap=True).ntotal),
+            "index_type": "flat", "bytes": _dir_bytes(seg), "tombstones": [],
+        })
+        _import_legacy_meta(index_dir, name)
+        log.info("Legacy FAISS index migrated to segments", index=str(index_dir), segment=name)
+    write_manifest(index_dir, manifest)
+    return manifest
+
+
+def migrate_legacy_index(index_dir: Path) -> bool:
+    """Convert a legacy dir in place under the write lock; True if it was legacy."""
+    if not is_legacy(index_dir):
+        return False
+    with index_write_lock(index_dir):
+        if not is_legacy(index_dir):
+            return False
+        ensure_manifest(index_dir)
+        return True
+
+
+
+def locate_chunks(index_dir: Path, names: List[str], chunk_ids: Iterable[str]) -> Dict[str, str]:
+    """Segment (among `names`) whose chunk store holds each chunk id; ids found nowhere are left out."""
+    todo = set(chunk_ids)
+    found: Dict[str, str] = {}
+    for name in names:
+        if not todo:
+            break
+        for cid in stored_chunk_ids(segment_dir(index_dir, name) / CHUNK_STORE_NAME, todo):
+            found[cid] = name
+        todo.difference_update(found)
+    return found
+
+def needs_compaction(manifest: Dict[str, Any]) -> bool:
+    segments = manifest.get("segments", [])
+    total = sum(s.get("count") or 0 for s in segments)
+    dead = sum(len(s.get("tombstones", [])) for s in segments)
+    return len(segments) > MAX_SEGMENTS or (total > 0 and dead / total > MAX_TOMBSTONE_RATIO)
+
+
+# ---------- Read side ----------
+
+def _chunk_id(doc: Document) -> Optional[str]:
+    return getattr(doc, "id", None) or (doc.metadata or {}).get("chunk_id")
+
+
+class SegmentedFAISS(VectorStore):
+    """
+    Read-only view over the segments of a session index.
+
+    Queries fan out to every segment, hits on tombstoned chunks are dropped and
+    the per-segment results are merged by score.
+    """
+
+    def __init__(self, segments: List[Tuple[str, FAISS, Set[str]]], embedding: Embeddings, approx_bytes: int = 0):
+        self.segments = segments
+        self._embedding = embedding
+        self.approx_bytes = approx_bytes
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    @property
+    def ntotal(self) -> int:
+        return sum(int(store.index.ntotal) - len(dead) for _, store, dead in self.segments)
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("SegmentedFAISS is read-only; write through FaissManager")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Build segmented indexes through FaissManager")
+
+    def _higher_is_better(self) -> bool:
+        if not self.segments:
+            return False
+        strategy = getattr(self.segments[0][1], "distance_strategy", None)
+        return str(getattr(strategy, "value", strategy)).upper() in ("MAX_INNER_PRODUCT", "JACCARD")
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        hits: List[Tuple[Document, float]] = []
+        for _, store, dead in self.segments:
+            # over-fetch by the number of dead rows so tombstones can't starve top-k
+            for doc, score in store.similarity_search_with_score_by_vector(embedding, k=k + len(dead), **kwargs):
+                if _chunk_id(doc) not in dead:
+                    hits.append((doc, float(score)))
+        hits.sort(key=lambda h: h[1], reverse=self._higher_is_better())
+        return hits[:k]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [d for d, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [d for d, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        if self.segments:
+            return self.segments[0][1]._select_relevance_score_fn()
+        return self._euclidean_relevance_score_fn
+
+
+# one tombstone: set slot + chunk id string
+_TOMBSTONE_BYTES = 128
+
+
+def _segment_bytes(path: Path, index_name: str, dead: Set[str]) -> int:
+    # charged whether mmap'd or not: mapped pages join the worker's RSS as queries touch them,
+    # and counting them as free would leave the vector store cache budget unenforced
+    mapped = sum((path / n).stat().st_size for n in (f"{index_name}.faiss", EXACT_VECTORS_NAME) if (path / n).exists())
+    chunks = path / CHUNK_STORE_NAME
+    mapped += min(chunks.stat().st_size, CHUNK_STORE_MMAP_BYTES) if chunks.exists() else 0
+    return mapped + len(dead) * _TOMBSTONE_BYTES
+
+
+def _load_segments(index_dir: Path, manifest: Dict[str, Any], embeddings: Embeddings, mmap: bool) -> SegmentedFAISS:
+    segments = []
+    total_bytes = 0
+    for entry in manifest.get("segments", []):
+        path = segment_dir(index_dir, entry["name"])
+        store = load_store(path, embeddings, index_type=entry.get("index_type", "flat"), mmap=mmap)
+        dead = set(entry.get("tombstones", []))
+        segments.append((entry["name"], store, dead))
+        total_bytes += _segment_bytes(path, "index", dead)
+    return SegmentedFAISS(segments, embeddings, approx_bytes=total_bytes)
+
+
+def is_segmented(index_dir: Path) -> bool:
+    return (Path(index_dir) / MANIFEST_NAME).exists()
+
+
+def is_ready(index_dir: Path, index_name: str = "index") -> bool:
+    """
+    Queryable: a manifest with at least one committed segment, or a single
+    save_store dir. A session dir whose first index job has not committed
+    yet has neither (the job may already have written an empty manifest).
+    """
+    index_dir = Path(index_dir)
+    manifest = read_manifest(index_dir)
+    if manifest is not None:
+        return bool(manifest.get("segments"))
+    return (index_dir / f"{index_name}.faiss").exists() and (index_dir / CHUNK_STORE_NAME).exists()
+
+
+def load_index(
+    index_dir: Path, embeddings: Embeddings, index_name: str = "index", mmap: Optional[bool] = None
+) -> VectorStore:
+    """
+    Load a session index for querying: segmented layout if it has a manifest,
+    else a single save_store dir. Legacy pickled dirs raise LegacyIndexError
+    (see migrate_legacy_index). mmap defaults to faiss_db.mmap / FAISS_MMAP.
+    """
+    index_dir = Path(index_dir)
+    mmap = MMAP_LOADS if mmap is None else mmap
+    manifest = read_manifest(index_dir)
+    if manifest is None:
+        if is_legacy(index_dir, index_name):
+            raise LegacyIndexError(
+                f"{index_dir} has not been migrated from the pickled layout; run "
+                f"`python -m src.document_ingestion.migrate_indexes {index_dir}`"
+            )
+        return load_store(index_dir, embeddings, index_name=index_name, mmap=mmap)
+    try:
+        return _load_segments(index_dir, manifest, embeddings, mmap)
+    except (FileNotFoundError, sqlite3.OperationalError):
+        # a compaction swapped segments between our manifest read and the loads
+        return _load_segments(index_dir, read_manifest(index_dir), embeddings, mmap)
+
+
+# ---------- Compaction ----------
+
+def _live_rows(store: FAISS, dead: Set[str]) -> List[Tuple[str, Document, Optional[np.ndarray]]]:
+    # exact side file of quantized segments first; None for lossy (PQ/SQ8) codes -> caller re-embeds
+    vectors = getattr(store, "exact_vectors", None)
+    if vectors is None:
+        vectors = reconstruct_all(store.index)
+    return [
+        (cid, doc, None if vectors is None else vectors[pos])
+        for pos, cid, doc in store_rows(store)
+        if cid not in dead
+    ]
+
+
+def compact_segments(index_dir: Path, embeddings: Embeddings, on_commit: Optional[Callable[[str], None]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Merge all segments into one, dropping tombstoned chunks.
+
+    Runs under the index write lock; `on_commit(new_segment_name)` runs
+    after the new manifest is written and lets the caller relocate its
+    bookkeeping before the old segments are deleted.
+    """
+    index_dir = Path(index_dir)
+    with index_write_lock(index_dir):
+        manifest = read_manifest(index_dir)
+        segments = (manifest or {}).get("segments", [])
+        if not segments or (len(segments) == 1 and not segments[0].get("tombstones")):
+            return None
+        started = time.perf_counter()
+        old = list(manifest["segments"])
+
+        live: Dict[str, Tuple[Document, Optional[np.ndarray]]] = {}
+        for entry in old:  # later segments win for re-added chunk ids
+            store = load_store(segment_dir(index_dir, entry["name"]), embeddings)
+            for cid, doc, vec in _live_rows(store, set(entry.get("tombstones", []))):
+                live[cid] = (doc, vec)
+
+        manifest["segments"] = []
+        new_entry = None
+        if live:
+            ids = list(live)
+            docs = [live[i][0] for i in ids]
+            if any(live[i][1] is None for i in ids):
+                vectors = embed_array(embeddings, [d.page_content for d in docs])
+            else:
+                vectors = [live[i][1] for i in ids]
+            # the merged segment gets the index type its size calls for
+            store = build_vectorstore(
+                [d.page_content for d in docs], vectors, embeddings, [d.metadata for d in docs], ids
+            )
+            new_entry = write_segment(index_dir, manifest, store)
+        # manifest first, like sync_stream: a crash before on_commit leaves the caller's
+        # bookkeeping naming segments the manifest no longer has, which sync resolves
+        write_manifest(index_dir, manifest)
+        if on_commit is not None:
+            on_commit(new_entry["name"] if new_entry else "")
+        for entry in old:
+            shutil.rmtree(segment_dir(index_dir, entry["name"]), ignore_errors=True)
+
+    log.info(
+        "FAISS segments compacted",
+        index=str(index_dir),
+        merged=len(old),
+        live_chunks=len(live),
+        seconds=round(time.perf_counter() - started, 3),
+    )
+    return new_entry
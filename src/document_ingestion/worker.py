@@ -0,0 +1,83 @@
+"""
+Ingestion worker tier: consumes queued /chat/index jobs outside the API.
+
+    python -m src.document_ingestion.worker --concurrency 2
+
+Each worker process loads the embedding model once and runs one job at a
+time; indexes are published through the segment manifest, so API workers
+only ever read committed segments. Run the API with JOBS_RUN_IN_API=false
+so it just enqueues, and scale the two tiers independently.
+"""
+from __future__ import annotations
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Optional
+
+from logger import GLOBAL_LOGGER as log
+from utils.config_loader import load_config_section
+from src.document_ingestion.jobs import get_job_queue, queue_location, run_job
+
+
+def worker_loop(backend: str, location: str, stop, poll_s: float, stale_after_s: float) -> None:
+    """Claim and run jobs until `stop` is set; runs in one worker process."""
+    # the parent handles SIGINT/SIGTERM and sets `stop`; finish the current job
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    from utils.model_loader import MODEL_REGISTRY
+
+    MODEL_REGISTRY.get_embedding_model()  # owned by this process for its lifetime
+    queue = get_job_queue(backend, location)
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    log.info("Ingestion worker started", worker=name, backend=backend, location=location)
+    next_sweep = 0.0
+    while not stop.is_set():
+        if time.monotonic() >= next_sweep:
+            queue.requeue_stale(stale_after_s)
+            next_sweep = time.monotonic() + stale_after_s / 2
+        job = queue.claim(name)
+        if job is None:
+            stop.wait(poll_s)
+            continue
+        run_job(queue, job)
+    log.info("Ingestion worker stopped", worker=name)
+
+
+def main(argv: Optional[list] = None) -> None:
+    cfg = load_config_section("jobs")
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--concurrency", type=int,
+                   default=int(os.getenv("INGEST_WORKER_CONCURRENCY", cfg.get("worker_concurrency", 1))),
+                   help="worker processes (each holds its own embedding model)")
+    p.add_argument("--poll", type=float, default=float(cfg.get("poll_interval_s", 1.0)),
+                   help="seconds between queue checks when idle")
+    args = p.parse_args(argv)
+
+    backend, location = queue_location()
+    get_job_queue(backend, location)  # create the queue before the children race to
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    stale_after_s = float(cfg.get("stale_after_s", 300))
+    procs = [
+        ctx.Process(target=worker_loop, args=(backend, location, stop, args.poll, stale_after_s),
+                    name=f"ingest-worker-{i}")
+        for i in range(max(1, args.concurrency))
+    ]
+    for proc in procs:
+        proc.start()
+
+    def shutdown(signum, _frame) -> None:
+        log.info("Ingestion workers stopping", signal=signum)
+        stop.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    for proc in procs:
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()
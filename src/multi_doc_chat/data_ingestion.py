@@ -1,12 +1,14 @@
 import uuid 
 from pathlib import Path
 import sys
-from langchain_community.document_loaders import PyPDFLoader , Docx2txtLoader, TextLoader
+from langchain_community.document_loaders import Docx2txtLoader, TextLoader
+from utils.document_ops import PyMuPDFPageLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
+from utils.index_factory import build_from_documents
+from src.document_ingestion.chunk_store import save_store
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentportalException
-from utils.model_loader import ModelLoader
+from utils.model_loader import MODEL_REGISTRY
 from datetime import datetime,timezone
 
 class DocumentIngestor:
@@ -32,7 +34,7 @@ class DocumentIngestor:
             self.session_faiss_dir.mkdir(parents=True , exist_ok=True)
             
             
-            self.model_loader = ModelLoader()
+            self.model_loader = MODEL_REGISTRY.loader
             
             self.log.info('initialization completed successfully')
         
@@ -64,7 +66,7 @@ class DocumentIngestor:
                 
                 
                 if ext == '.pdf':
-                    loader = PyPDFLoader(str(temp_path))
+                    loader = PyMuPDFPageLoader(temp_path)
                 
                 
                 elif ext == '.docx':
@@ -100,11 +102,12 @@ class DocumentIngestor:
             
             self.log.info('chunking of documents completed')
             
-            embeddings = self.model_loader.load_embedding_model()
+            embeddings = MODEL_REGISTRY.get_embedding_model()
             
-            vector_store = FAISS.from_documents(documents=chunks,embedding=embeddings)
+            # flat / HNSW / IVF chosen by chunk count (faiss_db.index in config.yaml)
+            vector_store = build_from_documents(chunks, embeddings)
             
-            vector_store.save_local(str(self.session_faiss_dir))
+            save_store(vector_store, self.session_faiss_dir)
             
             self.log.info('FAISS index saved to disk ')
             
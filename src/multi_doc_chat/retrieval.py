@@ -6,7 +6,6 @@ from logger.custom_logger import CustomLogger
 from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.vectorstores import FAISS
 from langchain_core.runnables.history import RunnableWithMessageHistory
 # from langchain.chains import create_history_aware_retriever , create_retrieval_chain
 # from langchain.chains.combine_documents import create_stuff_documents_chain
@@ -17,7 +16,8 @@ from langchain.chains.combine_documents import create_stuff_documents_chain
 
 
 from langchain_core.prompts import ChatPromptTemplate
-from utils.model_loader import ModelLoader
+from utils.model_loader import MODEL_REGISTRY
+from src.document_ingestion.segments import load_index
 from exception.custom_exception import DocumentportalException
 # from logger import GLOBAL_LOGGER as log
 from prompt.prompt_library import PROMPT_REGISTRY
@@ -56,12 +56,12 @@ class ConversationalRAG:
     def load_retriever_from_faiss(self, index_path : str):
         try:
             
-            embeddings = ModelLoader().load_embedding_model()
+            embeddings = MODEL_REGISTRY.get_embedding_model()
             
             if not os.path.isdir(index_path):
                 raise FileNotFoundError(f"FAISS index directort not found{index_path}")
             
-            vector_store = FAISS.load_local(index_path, embeddings,allow_dangerous_deserialization= True)
+            vector_store = load_index(index_path, embeddings)
             
             self.retriever= vector_store.as_retriever(search_type = 'similarity' , search_kwargs= {"k": 5})
             
@@ -104,7 +104,7 @@ class ConversationalRAG:
     def _load_llm(self):
         
         try:
-            llm = ModelLoader().load_llm()
+            llm = MODEL_REGISTRY.get_llm()
             self.log.info('LLM loaded successfully')
             
             return llm
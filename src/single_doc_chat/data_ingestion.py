@@ -1,12 +1,13 @@
 import uuid 
 from pathlib import Path
 import sys
-from langchain_community.document_loaders import PyPDFLoader
+from utils.document_ops import PyMuPDFPageLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentportalException
-from utils.model_loader import ModelLoader
+from utils.model_loader import MODEL_REGISTRY
+from src.document_ingestion.chunk_store import save_store
 from datetime import datetime
 class SingleDocIngestor:
 
@@ -19,7 +20,7 @@ class SingleDocIngestor:
             self.faiss_dir = Path(faiss_dir)
             self.faiss_dir.mkdir(parents=True , exist_ok=True)
             
-            self.model_loader = ModelLoader()
+            self.model_loader = MODEL_REGISTRY.loader
             self.log.info('SingleDocIngestor initialized' , temp_path = str(self.data_dir), faiss_path = str(self.faiss_dir))
         except Exception as e:
             self.log.error("failed to initialize singleDocIngestor" , error = str(e))
@@ -38,7 +39,7 @@ class SingleDocIngestor:
                 with open(temp_path , 'wb') as f_out:
                     f_out.write(uploaded_file.read())
                 self.log.info('PDF saved for ingestion')
-                loader = PyPDFLoader(str(temp_path))
+                loader = PyMuPDFPageLoader(temp_path)
                 docs = loader.load()
                 documents.extend(docs)
                 self.log.info('PDF FILE LOADED')
@@ -66,9 +67,9 @@ class SingleDocIngestor:
             print("========== END DEBUG ==========\n")
             # 🔍 DEBUG END
 
-            embeddings = self.model_loader.load_embedding_model()
+            embeddings = MODEL_REGISTRY.get_embedding_model()
             vector_store = FAISS.from_documents(documents=chunks , embedding=embeddings)
-            vector_store.save_local(str(self.faiss_dir))
+            save_store(vector_store, self.faiss_dir)
             
             self.log.info('FAISS index created and saved')
             
@@ -9,4 +9,734 @@ client = TestClient(app)
 def test_home():
     response = client.get("/")
     assert response.status_code == 200
-    assert "Document Portal" in response.text
\ No newline at end of file
+    assert "Document Portal" in response.text
+
+def test_model_registry_loads_once():
+    from utils.model_loader import ModelRegistry
+
+    calls = []
+    registry = ModelRegistry()
+    factory = lambda: calls.append(1) or object()
+    first = registry._get_or_load("embedding:test", factory)
+    second = registry._get_or_load("embedding:test", factory)
+    assert first is second
+    assert len(calls) == 1
+    assert "load_seconds" in registry.stats()["embedding:test"]
+
+
+def test_vectorstore_cache_lru_and_versioning(tmp_path):
+    from utils.vectorstore_cache import VectorStoreCache
+
+    cache = VectorStoreCache(max_bytes=10, max_entries=2)
+    for name in ("a", "b", "c"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "index.faiss").write_bytes(b"x" * 4)
+        cache.get_or_load(str(tmp_path / name), "index", lambda n=name: n)
+
+    assert cache.get(str(tmp_path / "a")) is None  # evicted (LRU)
+    assert cache.get(str(tmp_path / "c")) == "c"
+    (tmp_path / "c" / "index.faiss").write_bytes(b"y" * 6)  # new on-disk version
+    assert cache.get(str(tmp_path / "c")) is None
+    stats = cache.stats()
+    assert stats["misses"] == 3 and stats["evictions"] == 1 and stats["stale"] == 1
+
+
+
+def test_vectorstore_cache_budget_evicts_mmap_loaded_segments(tmp_path):
+    from src.document_ingestion.data_ingestion import FaissManager
+    from src.document_ingestion.segments import load_index
+    from utils.vectorstore_cache import VectorStoreCache
+
+    emb = _FakeLoader().load_embedding_model()
+    stores = []
+    for name in ("s1", "s2"):
+        FaissManager(tmp_path / name, _FakeLoader()).sync_documents(_chunks("a.pdf", name, ["one", "two", "three"]))
+        stores.append(load_index(tmp_path / name, emb, mmap=True))
+    charged = stores[0].approx_bytes
+    assert charged > (tmp_path / "s1" / "segments" / "seg_000001" / "index.faiss").stat().st_size  # + chunk store
+
+    cache = VectorStoreCache(max_bytes=int(charged * 1.5), max_entries=32)
+    for name, store in zip(("s1", "s2"), stores):
+        cache.put(str(tmp_path / name), "index", store)
+    assert cache.get(str(tmp_path / "s1")) is None and cache.get(str(tmp_path / "s2")) is stores[1]
+    assert cache.stats()["evictions"] == 1
+
+def test_executor_reports_queue_depth():
+    import threading
+    from utils.executors import BoundedExecutor
+
+    gate = threading.Event()
+    pool = BoundedExecutor("test", max_workers=1)
+    futures = [pool.submit(gate.wait) for _ in range(3)]
+    assert pool.stats()["queue_depth"] == 2
+    gate.set()
+    pool.shutdown(wait=True)
+    assert pool.stats()["in_flight"] == 0 and pool.stats()["completed"] == 3
+
+
+def test_rag_astream_emits_sources_before_tokens(monkeypatch):
+    import asyncio
+    from langchain_core.documents import Document
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.runnables import RunnableLambda
+    from utils.model_loader import MODEL_REGISTRY
+    from src.doc_chat.retrieval import ConversationalRAG
+
+    llm = FakeListChatModel(responses=["the answer"])  # no history -> no rewrite call
+    monkeypatch.setattr(MODEL_REGISTRY, "get_llm", lambda: llm)
+    retriever = RunnableLambda(lambda q: [Document(page_content="ctx", metadata={"source": "a.pdf", "page": 0})])
+    rag = ConversationalRAG(session_id="s", retriever=retriever)
+
+    async def collect():
+        return [e async for e in rag.astream("question?")]
+
+    events = asyncio.run(collect())
+    assert events[0]["event"] == "sources" and events[0]["data"][0]["source"] == "a.pdf"
+    assert "".join(e["data"] for e in events if e["event"] == "token") == "the answer"
+    assert events[-1]["event"] == "done"
+
+
+
+def test_rag_rewrite_only_used_when_question_changes(monkeypatch):
+    from langchain_core.documents import Document
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langchain_core.runnables import RunnableLambda
+    from utils.model_loader import MODEL_REGISTRY
+    from src.doc_chat.retrieval import ConversationalRAG, RAG_METRICS
+
+    queries = []
+    retriever = RunnableLambda(lambda q: queries.append(q) or [Document(page_content=q)])
+    history = [HumanMessage(content="tell me about the refund policy"), AIMessage(content="...")]
+
+    llm = FakeListChatModel(responses=["what is the refund window for the refund policy"])
+    monkeypatch.setattr(MODEL_REGISTRY, "get_llm", lambda: llm)
+    rag = ConversationalRAG(session_id="s", retriever=retriever)
+    RAG_METRICS.reset()
+
+    docs = rag.retrieve_chain.invoke({"input": "how long is it?", "chat_history": history})
+    assert docs[0].page_content.startswith("what is the refund window")
+    assert RAG_METRICS.get("rewrite_used") == 1
+
+    rag.retrieve_chain.invoke({"input": "how long is it?", "chat_history": []})
+    assert RAG_METRICS.get("rewrite_skipped") == 1
+    assert queries[-1] == "how long is it?"
+
+
+def test_embedding_cache_serves_repeated_chunks(tmp_path):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from utils.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+    calls = []
+
+    class CountingEmbeddings(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            calls.append(list(texts))
+            return super().embed_documents(texts)
+
+    cache = EmbeddingCache(tmp_path, "fake-model")
+    emb = CachedEmbeddings(CountingEmbeddings(size=16), cache)
+    first = emb.embed_documents(["alpha beta", "gamma"])
+    # reopened cache (new process) + whitespace-only difference -> served from disk
+    emb = CachedEmbeddings(CountingEmbeddings(size=16), EmbeddingCache(tmp_path, "fake-model"))
+    second = emb.embed_documents(["alpha  beta ", "gamma", "delta"])
+
+    assert calls == [["alpha beta", "gamma"], ["delta"]]
+    assert second[:2] == first
+
+
+
+def test_embedding_cache_is_keyed_by_normalize_setting(tmp_path, monkeypatch):
+    import utils.embedding_cache as embedding_cache
+    import utils.model_loader as model_loader
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    calls = []
+
+    class _Engine(DeterministicFakeEmbedding):
+        normalize: bool = False
+
+        def __init__(self, model_name, normalize=False, **kwargs):
+            super().__init__(size=16, normalize=normalize)
+
+        def embed_documents(self, texts):
+            calls.append((self.normalize, list(texts)))
+            return super().embed_documents(texts)
+
+    monkeypatch.setattr(model_loader, "BatchEmbeddings", _Engine)
+    monkeypatch.setattr(embedding_cache, "_CACHES", {})
+    monkeypatch.setenv("EMBEDDING_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    loader = model_loader.ModelLoader()
+    loader.config = {**loader.config, "embedding_model": dict(loader.config["embedding_model"])}  # shared lru copy
+    for normalize in (False, True, False):
+        loader.config["embedding_model"]["normalize"] = normalize
+        loader.load_embedding_model().embed_documents(["alpha", "beta"])
+    # flipping normalize never reuses rows embedded under the other setting
+    assert calls == [(False, ["alpha", "beta"]), (True, ["alpha", "beta"])]
+
+def test_batch_embeddings_sort_by_length_and_return_float32():
+    import numpy as np
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from utils.embedding_engine import BatchEmbeddings, embed_array
+
+    class _Encoder:  # SentenceTransformer.encode contract, vector = [len, 1.0]
+        def __init__(self):
+            self.calls = []
+
+        def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=False, **kw):
+            self.calls.append(list(texts))
+            return np.array([[len(t), 1.0] for t in texts], dtype=np.float64)
+
+    model = _Encoder()
+    emb = BatchEmbeddings("fake", batch_size=2, model=model)
+    texts = ["bb", "a", "dddd", "ccc"]
+    out = emb.embed_array(texts)
+    assert model.calls == [["dddd", "ccc", "bb", "a"]]  # padded batches hold similar lengths
+    assert out.dtype == np.float32 and out[:, 0].tolist() == [2, 1, 4, 3]  # input order restored
+    assert embed_array(DeterministicFakeEmbedding(size=8), texts).shape == (4, 8)
+
+
+class _FakeLoader:
+    def load_embedding_model(self):
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        return DeterministicFakeEmbedding(size=16)
+
+
+def _chunks(name, doc_id, texts):
+    from langchain_core.documents import Document
+    return [Document(page_content=t, metadata={"file_name": name, "doc_id": doc_id}) for t in texts]
+
+
+def test_faiss_manager_reindexes_only_changed_chunks(tmp_path):
+    from src.document_ingestion.data_ingestion import FaissManager
+
+    fm = FaissManager(tmp_path, _FakeLoader())
+    assert fm.sync_documents(_chunks("a.pdf", "v1", ["one", "two", "three"])) == \
+        {"added": 3, "removed": 0, "unchanged": 0}
+
+    fm = FaissManager(tmp_path, _FakeLoader())  # fresh process, same session dir
+    stats = fm.sync_documents(_chunks("a.pdf", "v2", ["one", "two", "four"]))
+    assert stats == {"added": 1, "removed": 1, "unchanged": 2}
+    assert fm.load_or_create().ntotal == 3
+    assert fm.sync_documents(_chunks("a.pdf", "v2", ["one", "two", "four"]))["added"] == 0
+
+
+def test_segmented_index_appends_and_compacts(tmp_path):
+    from src.document_ingestion.data_ingestion import FaissManager
+    from src.document_ingestion.segments import read_manifest
+
+    fm = FaissManager(tmp_path, _FakeLoader())
+    fm.sync_documents(_chunks("a.pdf", "v1", ["one", "two", "three"]))
+    first = (tmp_path / "segments" / "seg_000001" / "index.faiss").stat().st_mtime_ns
+    fm.sync_documents(_chunks("a.pdf", "v2", ["one", "two", "four"]))
+
+    manifest = read_manifest(tmp_path)
+    assert [s["name"] for s in manifest["segments"]] == ["seg_000001", "seg_000002"]
+    assert len(manifest["segments"][0]["tombstones"]) == 1
+    assert (tmp_path / "segments" / "seg_000001" / "index.faiss").stat().st_mtime_ns == first
+    texts = {d.page_content for d in fm.load_or_create().similarity_search("three", k=10)}
+    assert texts == {"one", "two", "four"}
+
+    fm.compact()
+    manifest = read_manifest(tmp_path)
+    assert [s["name"] for s in manifest["segments"]] == ["seg_000003"]
+    assert not (tmp_path / "segments" / "seg_000001").exists()
+    assert fm.load_or_create().ntotal == 3
+    assert fm.sync_documents(_chunks("a.pdf", "v3", ["one", "two", "five"])) == \
+        {"added": 1, "removed": 1, "unchanged": 2}
+
+
+def test_compaction_crash_before_catalog_relocate_keeps_deletes(tmp_path, monkeypatch):
+    from src.document_ingestion.data_ingestion import FaissManager
+    from src.document_ingestion.segments import read_manifest
+
+    fm = FaissManager(tmp_path, _FakeLoader())
+    fm.sync_documents(_chunks("a.pdf", "v1", ["one", "two", "three"]))
+    fm.sync_documents(_chunks("a.pdf", "v2", ["one", "two", "four"]))
+
+    def crash(segment):
+        raise RuntimeError("killed between manifest write and catalog relocate")
+
+    monkeypatch.setattr(fm.catalog, "relocate_all", crash)
+    with pytest.raises(Exception):
+        fm.compact()
+    assert [s["name"] for s in read_manifest(tmp_path)["segments"]] == ["seg_000003"]
+
+    fm.sync_documents(_chunks("a.pdf", "v2", ["one", "two", "four"]) + _chunks("b.pdf", "w1", ["other"]))
+
+    # the catalog still names seg_000001/2; the replaced chunk must not come back
+    fm.sync_documents(_chunks("a.pdf", "v3", ["one", "two", "five"]) + _chunks("b.pdf", "w1", ["other"]))
+    texts = {d.page_content for d in fm.load_or_create().similarity_search("four", k=10)}
+    assert texts == {"one", "two", "five", "other"}
+    # tombstoned only where the chunk lives, not in every older segment
+    tombstones = {s["name"]: len(s["tombstones"]) for s in read_manifest(tmp_path)["segments"]}
+    assert tombstones == {"seg_000003": 1, "seg_000004": 0, "seg_000005": 0}
+
+
+def test_streaming_sync_flushes_segments_and_reports_progress(tmp_path, monkeypatch):
+    import src.document_ingestion.data_ingestion as di
+    from src.document_ingestion.pipeline import PipelineProgress
+    from src.document_ingestion.segments import read_manifest
+
+    monkeypatch.setattr(di, "load_config_section", lambda name: {"embed_batch_size": 2, "segment_max_chunks": 4})
+    fm = di.FaissManager(tmp_path, _FakeLoader())
+    texts = [f"chunk {i}" for i in range(10)]
+    progress = PipelineProgress()
+    stats = fm.sync_stream([("a.pdf", "v1", lambda: iter(_chunks("a.pdf", "v1", texts)))], progress=progress)
+
+    assert stats == {"added": 10, "removed": 0, "unchanged": 0}
+    assert [s["count"] for s in read_manifest(tmp_path)["segments"]] == [4, 4, 2]
+    snap = progress.snapshot()
+    assert (snap["parse"]["items"], snap["embed"]["items"], snap["index"]["items"]) == (10, 10, 10)
+    assert fm.load_or_create().ntotal == 10
+
+    def boom(texts):
+        raise RuntimeError("embedding backend down")
+
+    monkeypatch.setattr(type(fm.emb), "embed_documents", lambda self, texts: boom(texts))
+    with pytest.raises(RuntimeError):
+        fm.sync_documents(_chunks("b.pdf", "w1", ["x", "y", "z"]))
+    assert len(read_manifest(tmp_path)["segments"]) == 3
+    assert sorted(p.name for p in (tmp_path / "segments").iterdir()) == ["seg_000001", "seg_000002", "seg_000003"]
+
+
+def test_sq8_storage_rescores_from_float32_side_file(tmp_path, monkeypatch):
+    from src.document_ingestion.chunk_store import RescoringFAISS
+    from src.document_ingestion.data_ingestion import FaissManager
+    from src.document_ingestion.segments import read_manifest
+
+    monkeypatch.setenv("FAISS_STORAGE", "sq8")
+    fm = FaissManager(tmp_path, _FakeLoader())
+    texts = [f"clause {i}" for i in range(60)]
+    fm.sync_documents(_chunks("a.pdf", "v1", texts))
+    seg = tmp_path / "segments" / "seg_000001"
+    assert read_manifest(tmp_path)["segments"][0]["storage"] == "sq8"
+    assert (seg / "vectors.f32").stat().st_size == 60 * 16 * 4
+    assert (seg / "index.faiss").stat().st_size < (seg / "vectors.f32").stat().st_size
+
+    store = fm.load_or_create()
+    hits = store.similarity_search_with_score("clause 7", k=3)
+    assert hits[0][0].page_content == "clause 7" and hits[0][1] < 1e-6  # exact distance after re-ranking
+    assert [s for _, s in hits] == sorted(s for _, s in hits)
+    assert isinstance(store.segments[0][1], RescoringFAISS)
+
+    fm.sync_documents(_chunks("a.pdf", "v2", texts[:50]))
+    fm.compact()  # merged from the exact side file, not from decoded 8-bit codes
+    assert fm.load_or_create().similarity_search_with_score("clause 7", k=1)[0][1] < 1e-6
+
+    monkeypatch.setenv("FAISS_INDEX_TYPE", "ivf_pq")  # PQ segments keep no float32 side file
+    pq = FaissManager(tmp_path / "pq", _FakeLoader())
+    pq.sync_documents(_chunks("b.pdf", "v1", [f"term {i}" for i in range(300)]))
+    pq_seg = tmp_path / "pq" / "segments" / "seg_000001"
+    assert read_manifest(tmp_path / "pq")["segments"][0]["storage"] == "pq"
+    assert not (pq_seg / "vectors.f32").exists()
+
+
+def test_index_factory_picks_type_by_size():
+    import numpy as np
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from utils.index_factory import build_vectorstore, choose_index_type, index_settings, index_type_of
+
+    s = index_settings({"type": "auto", "flat_max": 100, "hnsw_max": 1000, "ivf_pq_min": 5000})
+    assert [choose_index_type(n, s) for n in (10, 500, 2000, 9000)] == ["flat", "hnsw", "ivf_flat", "ivf_pq"]
+
+    vectors = np.random.default_rng(0).normal(size=(2000, 16)).astype("float32")
+    store = build_vectorstore([str(i) for i in range(2000)], vectors, DeterministicFakeEmbedding(size=16), settings=s)
+    assert index_type_of(store.index) == "ivf_flat"
+    hit, _ = store.similarity_search_with_score_by_vector(vectors[7].tolist(), k=1)[0]
+    assert hit.page_content == "7"
+
+
+def test_mmap_index_load_keeps_vectors_off_the_heap(tmp_path):
+    import faiss
+    import numpy as np
+    from utils.index_factory import read_index
+    from utils.metrics import memory_breakdown
+
+    vectors = np.random.default_rng(0).random((40000, 64), dtype=np.float32)  # ~10 MB
+    index = faiss.IndexFlatL2(64)
+    index.add(vectors)
+    faiss.write_index(index, str(tmp_path / "index.faiss"))
+    del index
+    if "rss_anon" not in memory_breakdown():
+        pytest.skip("needs /proc/self/status")
+
+    def heap_delta(mmap):
+        before = memory_breakdown()["rss_anon"]
+        loaded = read_index(tmp_path / "index.faiss", mmap=mmap)
+        return loaded, memory_breakdown()["rss_anon"] - before
+
+    mapped, mapped_heap = heap_delta(True)
+    private, private_heap = heap_delta(False)
+    assert private_heap > 8 * 2**20
+    assert mapped_heap < 2 * 2**20
+    assert (mapped.search(vectors[:3], 2)[1] == private.search(vectors[:3], 2)[1]).all()
+
+
+def test_chunk_store_replaces_pickled_docstore(tmp_path):
+    import sqlite3
+    from langchain_community.vectorstores import FAISS
+    from src.document_ingestion.chunk_store import load_store, save_store
+    from src.document_ingestion.data_ingestion import FaissManager
+
+    emb = _FakeLoader().load_embedding_model()
+    docs = _chunks("a.pdf", "v1", ["one", "two", "three"])
+    for page, d in enumerate(docs):
+        d.metadata.update(source="/data/a.pdf", page=page)
+    save_store(FAISS.from_documents(docs, emb), tmp_path / "plain")
+    assert not (tmp_path / "plain" / "index.pkl").exists()
+    db = sqlite3.connect(str(tmp_path / "plain" / "chunks.sqlite"))
+    assert db.execute("SELECT COUNT(*) FROM documents").fetchone()[0] == 1  # source etc. stored once
+    hit = load_store(tmp_path / "plain", emb, mmap=True).similarity_search("two", k=1)[0]
+    assert hit.page_content == "two"
+    assert hit.metadata == {"file_name": "a.pdf", "doc_id": "v1", "source": "/data/a.pdf", "page": 1}
+
+    # sessions written by FAISS.save_local are converted on their next ingest
+    FAISS.from_documents(docs, emb).save_local(str(tmp_path / "legacy"))
+    fm = FaissManager(tmp_path / "legacy", _FakeLoader())
+    fm.sync_documents(_chunks("b.pdf", "v1", ["four"]))
+    seg = tmp_path / "legacy" / "segments" / "seg_000001"
+    assert (seg / "chunks.sqlite").exists() and not (seg / "index.pkl").exists()
+    assert fm.load_or_create().ntotal == 4
+
+
+def test_query_path_never_unpickles_legacy_indexes(tmp_path, monkeypatch):
+    import pickle
+    from langchain_community.vectorstores import FAISS
+    from src.document_ingestion.chunk_store import LegacyIndexError
+    from src.document_ingestion.segments import load_index, migrate_legacy_index
+
+    emb = _FakeLoader().load_embedding_model()
+    session = tmp_path / "session_1"
+    FAISS.from_documents(_chunks("a.pdf", "v1", ["one", "two"]), emb).save_local(str(session))
+
+    def no_unpickle(*args, **kwargs):
+        raise AssertionError("pickle.load on the query path")
+
+    monkeypatch.setattr(pickle, "load", no_unpickle)
+    with pytest.raises(LegacyIndexError):
+        load_index(session, emb)
+    monkeypatch.setattr("api.main.FAISS_BASE", str(tmp_path))
+    res = client.post("/chat/query", data={"question": "one?", "session_id": "session_1"})
+    assert res.status_code == 409 and "migrate_indexes" in res.json()["detail"]
+
+    monkeypatch.undo()  # the one-time migration is the only place that unpickles
+    assert migrate_legacy_index(session) is True and migrate_legacy_index(session) is False
+    assert load_index(session, emb).ntotal == 2
+
+
+
+def test_query_while_index_job_is_queued_returns_409(tmp_path, monkeypatch):
+    from src.document_ingestion import jobs
+    from src.document_ingestion.segments import ensure_manifest
+
+    queue = jobs.QUEUE_BACKENDS["sqlite"](tmp_path / "jobs")
+    monkeypatch.setattr("api.main.FAISS_BASE", str(tmp_path / "faiss"))
+    monkeypatch.setattr("api.main.UPLOAD_BASE", str(tmp_path / "data"))
+    monkeypatch.setattr("api.main.JOBS_RUN_IN_API", False)  # nobody picks the job up
+    monkeypatch.setattr("api.main.get_job_queue", lambda: queue)
+
+    res = client.post("/chat/index", files={"files": ("notes.txt", b"some notes", "text/plain")},
+                      data={"session_id": "session_q"})
+    assert res.status_code == 202 and queue.get(res.json()["job_id"])["state"] == jobs.QUEUED
+    session = tmp_path / "faiss" / "session_q"
+    assert session.is_dir()
+
+    res = client.post("/chat/query", data={"question": "notes?", "session_id": "session_q"})
+    assert res.status_code == 409 and "/chat/index/" in res.json()["detail"]
+    ensure_manifest(session)  # a running job has written its (still empty) manifest
+    res = client.post("/chat/query/stream", data={"question": "notes?", "session_id": "session_q"})
+    assert res.status_code == 409
+
+def test_pymupdf_loader_yields_pages_with_metadata(tmp_path):
+    import fitz
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from utils.document_ops import PyMuPDFPageLoader, load_documents
+
+    pdf = tmp_path / "doc.pdf"
+    doc = fitz.open()
+    for text in ("first page", "", "third page"):
+        page = doc.new_page()
+        if text:
+            page.insert_text((72, 72), text)
+    doc.save(str(pdf))
+    doc.close()
+
+    pages = PyMuPDFPageLoader(pdf).lazy_load()
+    first = next(pages)
+    assert first.page_content.strip() == "first page"
+    assert first.metadata == {"source": str(pdf), "page": 0, "page_label": "1", "total_pages": 3}
+    docs = load_documents([pdf])
+    assert [d.metadata["page"] for d in docs] == [0, 1, 2] and not docs[1].page_content.strip()  # kept, like PyPDF
+    splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=0)
+    assert [c.metadata["page"] for c in splitter.split_documents(docs)] == [0, 2]  # blank page has no chunks
+
+
+def test_parallel_parse_matches_sequential(tmp_path, monkeypatch):
+    import fitz
+    import utils.document_ops as ops
+    from utils.executors import shutdown_executors
+
+    paths = []
+    for name, n in (("big.pdf", 10), ("small.pdf", 2)):
+        doc = fitz.open()
+        for i in range(n):
+            doc.new_page().insert_text((72, 72), f"{name} page {i}")
+        doc.save(str(tmp_path / name))
+        doc.close()
+        paths.append(tmp_path / name)
+
+    monkeypatch.setattr(ops, "load_config_section", lambda name: {"parallel": False})
+    sequential = list(ops.parse_files(paths))
+    monkeypatch.setattr(ops, "load_config_section", lambda name: {"parallel": True, "page_range_size": 3})
+    assert len(ops._plan(paths, 3)) == 5  # 4 ranges of big.pdf + small.pdf
+    try:
+        parallel = list(ops.parse_files(paths))
+    finally:
+        shutdown_executors()
+    as_tuples = lambda files: [[(d.page_content, d.metadata) for d in pages] for pages in files]
+    assert as_tuples(parallel) == as_tuples(sequential)
+    assert [d.metadata["page"] for d in parallel[0]] == list(range(10))
+
+
+
+def test_iter_pages_streams_ranges_and_caches_only_complete_parses(tmp_path, monkeypatch):
+    import fitz
+    import utils.blob_store as blob_store
+    import utils.document_ops as ops
+    from utils.blob_store import BlobStore
+
+    store = BlobStore(tmp_path / "blobs")
+    monkeypatch.setattr(blob_store, "_STORE", store)
+    monkeypatch.setattr(ops, "load_config_section", lambda name: {"parallel": False, "page_range_size": 2})
+    doc = fitz.open()
+    for i in range(6):
+        doc.new_page().insert_text((72, 72), f"page {i}")
+    doc.save(str(tmp_path / "long.pdf"))
+    doc.close()
+    parse_calls = []
+    real_task = ops._parse_task
+    monkeypatch.setattr(ops, "_parse_task", lambda *args: parse_calls.append(args) or real_task(*args))
+
+    pages = ops.iter_pages(tmp_path / "long.pdf", "f" * 64)
+    assert next(pages).metadata["page"] == 0
+    assert len(parse_calls) == 1  # only the first range extracted so far
+    pages.close()
+    assert not store.has_parsed("f" * 64)  # abandoned parse is not cached
+
+    assert [d.metadata["page"] for d in ops.iter_pages(tmp_path / "long.pdf", "f" * 64)] == list(range(6))
+    assert len(parse_calls) == 4
+    assert [d.page_content for d in ops.iter_pages(tmp_path / "long.pdf", "f" * 64)][5].startswith("page 5")
+    assert len(parse_calls) == 4  # served from the cache
+
+def test_uploads_stream_to_disk_with_hash_and_limit(tmp_path):
+    import hashlib
+    import io
+    from utils.file_io import UploadTooLargeError, iter_upload_chunks, stream_to_file
+
+    class _Upload(io.BytesIO):
+        name = "big.pdf"
+
+    data = b"%PDF" + bytes(range(256)) * 20000  # ~5 MB
+    upload = _Upload(data)
+    assert max(len(c) for c in iter_upload_chunks(upload, chunk_size=65536)) == 65536
+    upload.seek(0)
+    sha, size = stream_to_file(upload, tmp_path / "big.pdf")
+    assert (sha, size) == (hashlib.sha256(data).hexdigest(), len(data))
+    assert (tmp_path / "big.pdf").read_bytes() == data
+
+    with pytest.raises(UploadTooLargeError):
+        stream_to_file(_Upload(data), tmp_path / "limited.pdf", max_bytes=2**20)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["big.pdf"]  # no partial file left
+
+
+def test_blob_store_dedupes_uploads_and_caches_parses(tmp_path, monkeypatch):
+    import io
+    import shutil
+    import fitz
+    import utils.blob_store as blob_store
+    import utils.document_ops as ops
+    from utils.blob_store import BlobStore
+
+    store = BlobStore(tmp_path / "blobs")
+    monkeypatch.setattr(blob_store, "_STORE", store)
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "contract text")
+    pdf = doc.tobytes()
+    doc.close()
+
+    class _Upload(io.BytesIO):
+        name = "contract.pdf"
+
+    a = store.put(_Upload(pdf), tmp_path / "s1" / "contract.pdf")
+    b = store.put(_Upload(pdf), tmp_path / "s2" / "contract.pdf")
+    assert a.sha256 == b.sha256 and store.refcount(a.sha256, ".pdf") == 2
+    rescans = []
+    monkeypatch.setattr(store, "_rescan", lambda: rescans.append(1))
+    assert (store.stats()["blobs"], store.stats()["bytes"]) == (1, len(pdf))
+
+    parse_calls = []
+    real_task = ops._parse_task
+    monkeypatch.setattr(ops, "_parse_task", lambda *args: parse_calls.append(args) or real_task(*args))
+    first = ops.load_documents([a.path], [a.sha256])
+    second = ops.load_documents([b.path], [b.sha256])
+    assert len(parse_calls) == 1  # second session served from the parse cache
+    assert second[0].page_content == first[0].page_content
+    assert second[0].metadata["source"] == str(b.path)
+
+    shutil.rmtree(tmp_path / "s1")
+    assert store.gc() == 0
+    store.release(b.path)
+    assert store.stats()["blobs"] == 0 and not list((tmp_path / "blobs" / "parsed").iterdir())
+    assert store.stats()["bytes"] == 0 and not rescans  # running counts; /metrics never walks the store
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "spool"])
+def test_job_queue_runs_jobs_and_reports_status(tmp_path, monkeypatch, backend):
+    from src.document_ingestion import jobs
+
+    def fake_index(payload, on_progress):
+        on_progress({"parse": {"items": payload["n"], "seconds": 0.1}})
+        if payload["n"] < 0:
+            raise ValueError("bad upload")
+        return {"added": payload["n"]}
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, "fake_index", fake_index)
+    queue = jobs.QUEUE_BACKENDS[backend](tmp_path / "jobs")
+    ok = queue.submit("fake_index", {"n": 3})
+    bad = queue.submit("fake_index", {"n": -1})
+    assert queue.get(ok)["state"] == jobs.QUEUED
+
+    assert jobs.run_job(queue, queue.claim("w1")) is True
+    assert jobs.run_job(queue, queue.claim("w1")) is False
+    assert queue.claim("w1") is None
+
+    monkeypatch.setitem(jobs._QUEUES, jobs.queue_location(), queue)  # what the API process uses
+    body = client.get(f"/chat/index/{ok}").json()
+    assert body["state"] == jobs.SUCCEEDED and body["result"] == {"added": 3}
+    assert body["progress"]["parse"]["items"] == 3 and body["timings"]["run_s"] is not None
+    assert client.get(f"/chat/index/{bad}").json()["error"] == "bad upload"
+    assert client.get("/chat/index/missing").status_code == 404
+
+    stale = queue.submit("fake_index", {"n": 1})
+    queue.claim("w2")
+    assert queue.requeue_stale(older_than_s=-1) == 1 and queue.get(stale)["state"] == jobs.QUEUED
+
+
+def test_compare_pages_sends_only_changed_pages_to_llm(monkeypatch):
+    import asyncio
+    import json
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.runnables import RunnableLambda
+    from src.doc_compare.doc_comparator import DocumentComparatorLLM
+    from src.doc_compare.page_diff import MODIFIED, UNCHANGED, diff_pages
+    from utils.model_loader import MODEL_REGISTRY
+
+    ref = [(1, "Intro\nterms apply"), (2, "Fees: 10 USD\nNet 30"), (3, "Signatures")]
+    act = [(1, "Intro \n\n terms  apply"), (2, "Fees: 12 USD\nNet 30"), (3, "Signatures"), (4, "Annex A")]
+    pairs = diff_pages(ref, act)
+    assert [p.status for p in pairs[:3]] == [UNCHANGED, MODIFIED, UNCHANGED]
+    assert "~ Fees: [-10-] {+12+} USD" in pairs[1].diff and pairs[3].label == "4 (added)"
+
+    # an inserted page shifts the numbering, not the pairing
+    body = [(i + 1, " ".join(f"clause {i} word {w}" for w in range(60))) for i in range(6)]
+    shifted = body[:2] + [(0, "cover letter for the revised agreement")] + body[2:5]
+    shifted = [(n + 1, text) for n, (_, text) in enumerate(shifted)]
+    aligned = diff_pages(body, shifted)
+    assert [(p.label, p.status) for p in aligned] == [
+        ("1", UNCHANGED), ("2", UNCHANGED), ("3 (added)", "inserted"),
+        ("4 (was 3)", UNCHANGED), ("5 (was 4)", UNCHANGED), ("6 (was 5)", UNCHANGED), ("6 (removed)", "deleted"),
+    ]
+    # a removed page's number is a reference page: never matched to (or from) actual page 6
+    rows = DocumentComparatorLLM._window_rows(aligned, [5, 6], [{"Page": "6 (removed)", "changes": "clause 5 cut"}])
+    assert [r["changes"] for r in rows] == ["Text changed.", "clause 5 cut"]
+    rows = DocumentComparatorLLM._window_rows(aligned, [5, 6], [{"Page": "Page 6", "changes": "renumbered"}])
+    assert [r["changes"] for r in rows] == ["renumbered", "Page removed."]
+
+    llm = FakeListChatModel(responses=[json.dumps([{"Page": "2", "changes": "Fee raised from 10 to 12 USD"}])])
+    monkeypatch.setattr(MODEL_REGISTRY, "get_llm", lambda: llm)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")  # ModelLoader validates keys; no call is made
+    comp = DocumentComparatorLLM()
+    seen = []
+    comp.diff_chain = RunnableLambda(lambda x: seen.append(x) or x) | comp.diff_chain
+
+    rows = comp.compare_pages(ref, act).to_dict(orient="records")
+    assert rows == [
+        {"Page": "1", "changes": "NO CHANGE"},
+        {"Page": "2", "changes": "Fee raised from 10 to 12 USD"},
+        {"Page": "3", "changes": "NO CHANGE"},
+        {"Page": "4 (added)", "changes": "Page added."},  # missing from the LLM output
+    ]
+    assert seen[0]["changed_pages"] == "2, 4 (added)"
+    assert "Intro" not in seen[0]["page_diffs"] and "Signatures" not in seen[0]["page_diffs"]
+
+    # one window per changed page, finishing in reverse: streamed out of order, merged in page order
+    async def slow_first(x):
+        await asyncio.sleep(0.05 if x["changed_pages"] == "2" else 0)
+        return [{"Page": x["changed_pages"], "changes": "edited"}]
+
+    async def collect():
+        return [row async for row in comp.astream_rows(ref, act)]
+
+    comp.window_pages, comp.diff_chain = 1, RunnableLambda(slow_first)
+    streamed = asyncio.run(collect())
+    assert [r["Page"] for r in streamed] == ["1", "3", "4 (added)", "2"]
+    df = asyncio.run(comp.acompare_pages(ref, act))
+    assert list(df["Page"]) == ["1", "2", "3", "4 (added)"] and list(df.columns) == ["Page", "changes"]
+
+
+def test_large_documents_are_analyzed_by_map_reduce(monkeypatch):
+    import asyncio
+    from langchain_core.runnables import RunnableLambda
+    from src.doc_analyzer.data_analysis import DocumentAnalyzer, split_pages
+    from utils.model_loader import MODEL_REGISTRY
+
+    text = "\n".join(f"\n--- Page {n} ---\n" + f"page {n} body " * 50 for n in range(1, 8))
+    assert [n for n, _ in split_pages(text)] == list(range(1, 8))
+
+    monkeypatch.setattr(MODEL_REGISTRY, "get_llm", lambda: RunnableLambda(lambda _: "unused"))
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    analyzer = DocumentAnalyzer()
+    analyzer.threshold_tokens, analyzer.window_pages = 200, 3
+    mapped, reduced = [], []
+    analyzer.map_chain = RunnableLambda(lambda x: mapped.append(x["section"]) or "summary " * 60)
+    analyzer.reduce_chain = RunnableLambda(lambda x: reduced.append(x) or {"Summary": ["whole document"]})
+
+    result = asyncio.run(analyzer.aanalyze_document(text))
+    assert result["Summary"] == ["whole document"] and result["PageCount"] == "7"
+    # 3 page windows; their summaries (~3 x 120 tokens) are still too long, so one collapse round
+    assert sorted(mapped[:3]) == ["page 7", "pages 1-3", "pages 4-6"] and mapped[3:] == ["summaries of parts 1-3"]
+    assert reduced[0]["section_summaries"].count("Section ") == 1
+
+    mapped.clear()  # the sync path runs the same steps through batch/invoke
+    assert analyzer.analyze_document(text) == result
+    assert sorted(mapped) == ["page 7", "pages 1-3", "pages 4-6", "summaries of parts 1-3"]
+
+
+def test_pdf_metadata_is_read_locally_and_merged_with_llm_fields(tmp_path, monkeypatch):
+    import fitz
+    from langchain_core.runnables import RunnableLambda
+    from src.doc_analyzer.data_analysis import DocumentAnalyzer
+    from src.document_ingestion.data_ingestion import DocHandler
+    from utils.model_loader import MODEL_REGISTRY
+
+    path = tmp_path / "report.pdf"
+    doc = fitz.open()
+    for _ in range(3):
+        doc.new_page().insert_text((72, 72), "The report shows that the results of the year are in line with the plan.")
+    doc.set_metadata({"title": "Annual Report", "author": "Finance Team", "creationDate": "D:20240102030405+01'00'"})
+    doc.save(str(path))
+
+    meta = DocHandler(data_dir=str(tmp_path)).read_metadata(str(path))
+    assert meta["Title"] == "Annual Report" and meta["Author"] == "Finance Team"
+    assert meta["DateCreated"] == "2024-01-02T03:04:05+01:00" and meta["LastModifiedDate"] == "Unknown"
+    assert meta["PageCount"] == "3" and meta["Language"] == "English"
+
+    seen = []
+    llm = RunnableLambda(lambda p: seen.append(p.to_string()) or '{"Summary": ["on plan"], "SentimentTone": "neutral"}')
+    monkeypatch.setattr(MODEL_REGISTRY, "get_llm", lambda: llm)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    result = DocumentAnalyzer().analyze_document("--- Page 1 ---\nthe report", metadata=meta)
+    assert result == {**meta, "Summary": ["on plan"], "SentimentTone": "neutral"}
+    assert "SentimentTone" in seen[0] and "PageCount" not in seen[0]  # reduced schema in the prompt
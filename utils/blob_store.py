@@ -0,0 +1,213 @@
+from __future__ import annotations
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+from logger import GLOBAL_LOGGER as log
+from utils.config_loader import load_config_section
+from utils.file_io import UploadRecord, stream_to_file
+from utils.metrics import Counters
+
+try:  # advisory cross-process lock; not available on Windows
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+# bump when extraction output changes so stale parse results are ignored
+PARSE_CACHE_VERSION = 2
+
+
+class BlobStore:
+    """
+    Content-addressed store for uploaded files, shared by all sessions.
+
+    Layout under root:
+        objects/<sha[:2]>/<sha><ext>   one copy per distinct file content
+        parsed/<sha>.v<N>.json         cached extraction result of that blob
+        tmp/                           uploads being streamed in
+
+    A session references a blob through a hard link at its own path, so the
+    link count is the reference count: deleting a session dir drops its
+    references and gc() removes blobs nobody links to anymore. Where hard
+    links are unavailable (other filesystem) the session gets a private copy
+    and only the parse cache is shared.
+    """
+
+    def __init__(self, root: Path, stats_rescan_s: float = 300):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.parsed = self.root / "parsed"
+        self.tmp = self.root / "tmp"
+        for d in (self.objects, self.parsed, self.tmp):
+            d.mkdir(parents=True, exist_ok=True)
+        self.counters = Counters(("puts", "dedup_hits", "parse_hits", "parse_misses", "collected", "blobs", "bytes"))
+        self._lock = threading.Lock()
+        # blobs/bytes are kept current by put() and gc(); other workers' changes show up after a rescan
+        self.stats_rescan_s = stats_rescan_s
+        self._scanned_at = 0.0
+        self._rescan()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # threads of this process + other workers sharing the store
+        with self._lock, open(self.root / ".lock", "a+") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    def blob_path(self, sha256: str, ext: str) -> Path:
+        return self.objects / sha256[:2] / f"{sha256}{ext.lower()}"
+
+    # ---------- Uploads ----------
+
+    def put(self, uploaded_file, link_path: Path) -> UploadRecord:
+        """Stream an upload into the store (deduplicated by content) and reference it at link_path."""
+        link_path = Path(link_path)
+        tmp = self.tmp / f"{uuid.uuid4().hex}.part"
+        sha, size = stream_to_file(uploaded_file, tmp)
+        blob = self.blob_path(sha, link_path.suffix)
+        with self._locked():
+            if blob.exists():
+                tmp.unlink()
+                self.counters.incr("dedup_hits")
+            else:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp, blob)
+                self.counters.incr("blobs")
+                self.counters.incr("bytes", size)
+            self._link(blob, link_path)
+        self.counters.incr("puts")
+        name = getattr(uploaded_file, "name", link_path.name)
+        return UploadRecord(path=link_path, name=name, sha256=sha, size=size)
+
+    @staticmethod
+    def _link(blob: Path, link_path: Path) -> None:
+        link_path.parent.mkdir(parents=True, exist_ok=True)
+        link_path.unlink(missing_ok=True)
+        try:
+            os.link(blob, link_path)
+        except OSError:  # cross-device or no hard-link support
+            shutil.copyfile(blob, link_path)
+
+    def refcount(self, sha256: str, ext: str) -> int:
+        blob = self.blob_path(sha256, ext)
+        return blob.stat().st_nlink - 1 if blob.exists() else 0
+
+    def release(self, link_path: Path) -> None:
+        """Drop one session reference; the blob goes once nothing links to it."""
+        Path(link_path).unlink(missing_ok=True)
+        self.gc()
+
+    def gc(self) -> int:
+        """Delete blobs (and their parse results) that no session links to; returns the count."""
+        removed = freed = 0
+        with self._locked():
+            for blob in self.objects.glob("*/*"):
+                st = blob.stat()
+                if st.st_nlink <= 1:
+                    sha = blob.name[:64]
+                    blob.unlink()
+                    for cached in self.parsed.glob(f"{sha}.*"):
+                        cached.unlink()
+                    removed += 1
+                    freed += st.st_size
+        if removed:
+            self.counters.incr("collected", removed)
+            self.counters.incr("blobs", -removed)
+            self.counters.incr("bytes", -freed)
+            log.info("Unreferenced upload blobs removed", count=removed)
+        return removed
+
+    # ---------- Parse cache ----------
+
+    def _parsed_path(self, sha256: str) -> Path:
+        return self.parsed / f"{sha256}.v{PARSE_CACHE_VERSION}.json"
+
+    def load_parsed(self, sha256: str, source: str) -> Optional[List[Document]]:
+        """Cached pages of a blob, re-pointed at this session's copy (`source`)."""
+        path = self._parsed_path(sha256)
+        try:
+            rows = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            self.counters.incr("parse_misses")
+            return None
+        self.counters.incr("parse_hits")
+        return [Document(page_content=r["text"], metadata={**r["metadata"], "source": source}) for r in rows]
+
+    def has_parsed(self, sha256: str) -> bool:
+        """Whether a parse result is cached; a miss is counted when not (the caller parses instead)."""
+        if self._parsed_path(sha256).exists():
+            return True
+        self.counters.incr("parse_misses")
+        return False
+
+    def save_parsed(self, sha256: str, docs: Iterable[Document]) -> None:
+        for _ in self.cache_parsed(sha256, docs):
+            pass
+
+    def cache_parsed(self, sha256: str, docs: Iterable[Document]) -> Iterator[Document]:
+        """
+        Pass `docs` through while writing them to the parse cache row by row.
+        The entry only appears once every page went by; a consumer that
+        stops early (or a parse error) leaves nothing behind.
+        """
+        path = self._parsed_path(sha256)
+        tmp = path.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.write("[")
+                for n, d in enumerate(docs):
+                    row = {"text": d.page_content, "metadata": {k: v for k, v in d.metadata.items() if k != "source"}}
+                    fh.write(("," if n else "") + json.dumps(row, ensure_ascii=False, default=str))
+                    yield d
+                fh.write("]")
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def _rescan(self) -> None:
+        # one walk over objects/ (at open, then at most every stats_rescan_s)
+        sizes = []
+        for blob in self.objects.glob("*/*"):
+            try:
+                sizes.append(blob.stat().st_size)
+            except FileNotFoundError:  # collected by another worker meanwhile
+                continue
+        self.counters.set("blobs", len(sizes))
+        self.counters.set("bytes", sum(sizes))
+        self._scanned_at = time.monotonic()
+
+    def stats(self) -> Dict[str, float]:
+        """Counters for /metrics; blob totals are running counts, not a scan per call."""
+        if self.stats_rescan_s and time.monotonic() - self._scanned_at > self.stats_rescan_s:
+            self._rescan()
+        return self.counters.snapshot()
+
+
+_STORE: Optional[BlobStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """Process-wide store rooted at blob_store.dir (env BLOB_STORE_DIR)."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            cfg = load_config_section("blob_store")
+            _STORE = BlobStore(
+                Path(os.getenv("BLOB_STORE_DIR", cfg.get("dir", "data/blobs"))),
+                stats_rescan_s=float(cfg.get("stats_rescan_s", 300)),
+            )
+        return _STORE
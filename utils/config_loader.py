@@ -1,5 +1,10 @@
 import yaml
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
 def load_config(config_file_path : str ='config/config.yaml')-> dict:
+    # parsed once per process; callers must treat the returned dict as read-only
     
     
     with open(config_file_path , 'r') as file :
@@ -10,6 +15,14 @@ def load_config(config_file_path : str ='config/config.yaml')-> dict:
     return config
 
 
+def load_config_section(name : str) -> dict:
+    """Return one top-level config block ({} if absent or config.yaml is not reachable)."""
+    try:
+        return load_config().get(name) or {}
+    except FileNotFoundError:
+        return {}
+
+
 # load_config('config/config.yaml')
     
     
\ No newline at end of file
@@ -1,32 +1,193 @@
 from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Iterable, List
+from typing import Deque, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+import fitz  # PyMuPDF
 from fastapi import UploadFile
 # from langchain.schema import Document
 from langchain_core.documents import Document
+from langchain_core.document_loaders import BaseLoader
 
-from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+from langchain_community.document_loaders import Docx2txtLoader, TextLoader
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentportalException
+from utils.config_loader import load_config_section
+from utils.executors import get_executor
+from utils.blob_store import get_blob_store
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 
 
-def load_documents(paths: Iterable[Path]) -> List[Document]:
-    """Load docs using appropriate loader based on extension."""
-    docs: List[Document] = []
-    try:
-        for p in paths:
-            ext = p.suffix.lower()
-            if ext == ".pdf":
-                loader = PyPDFLoader(str(p))
-            elif ext == ".docx":
-                loader = Docx2txtLoader(str(p))
-            elif ext == ".txt":
-                loader = TextLoader(str(p), encoding="utf-8")
-            else:
-                log.warning("Unsupported extension skipped", path=str(p))
+class PyMuPDFPageLoader(BaseLoader):
+    """
+    One Document per PDF page, extracted with PyMuPDF (fitz).
+
+    Like PyPDFLoader, blank or scanned pages are yielded too (empty text), so
+    page counts and page positions stay aligned; the text splitter drops
+    them. Metadata matches PyPDFLoader's (source, page, page_label,
+    total_pages) so downstream splitting and citations are unchanged. Pages
+    are yielded one at a time; only the current page's text is held in memory.
+    """
+
+    def __init__(self, file_path: Union[str, Path], start: int = 0, stop: Optional[int] = None):
+        self.file_path = str(file_path)
+        self.start = start
+        self.stop = stop  # exclusive; None = last page
+
+    def lazy_load(self) -> Iterator[Document]:
+        with fitz.open(self.file_path) as doc:
+            if doc.is_encrypted:
+                raise ValueError(f"PDF is encrypted: {self.file_path}")
+            total = doc.page_count
+            stop = total if self.stop is None else min(self.stop, total)
+            for page_num in range(self.start, stop):
+                page = doc.load_page(page_num)
+                text = page.get_text()  # type: ignore
+                yield Document(
+                    page_content=text,
+                    metadata={
+                        "source": self.file_path,
+                        "page": page_num,
+                        "page_label": page.get_label() or str(page_num + 1),
+                        "total_pages": total,
+                    },
+                )
+
+
+def _parse_task(path: str, start: int = 0, stop: Optional[int] = None) -> List[Document]:
+    """Extract one file (or one page range of a PDF); runs in the "parse" process pool."""
+    ext = Path(path).suffix.lower()
+    if ext == ".pdf":
+        loader: BaseLoader = PyMuPDFPageLoader(path, start, stop)
+    elif ext == ".docx":
+        loader = Docx2txtLoader(path)
+    else:
+        loader = TextLoader(path, encoding="utf-8")
+    return list(loader.lazy_load())
+
+
+def _plan(paths: List[Path], range_size: int) -> List[Tuple[int, str, int, Optional[int]]]:
+    """(file index, path, start page, stop page) tasks; PDFs above range_size pages are split."""
+    tasks = []
+    for i, p in enumerate(paths):
+        if p.suffix.lower() == ".pdf" and range_size > 0:
+            with fitz.open(str(p)) as doc:
+                total = doc.page_count
+            if total > range_size:
+                tasks.extend((i, str(p), s, s + range_size) for s in range(0, total, range_size))
                 continue
-            docs.extend(loader.load())
+        tasks.append((i, str(p), 0, None))
+    return tasks
+
+
+def _iter_ranges(tasks: List[Tuple[int, str, int, Optional[int]]], parallel: bool) -> Iterator[Tuple[int, List[Document]]]:
+    """
+    (file index, pages) of every task, in submission order. In the parse
+    pool at most two tasks per worker are in flight, so finished ranges do
+    not pile up ahead of a slow consumer.
+    """
+    if len(tasks) <= 1 or not parallel:
+        for i, path, start, stop in tasks:
+            yield i, _parse_task(path, start, stop)
+        return
+    pool = get_executor("parse")
+    queued = iter(tasks)
+    pending: Deque[Tuple[int, Future]] = deque()
+
+    def submit() -> None:
+        task = next(queued, None)
+        if task is not None:
+            i, path, start, stop = task
+            pending.append((i, pool.submit(_parse_task, path, start, stop)))
+
+    try:
+        for _ in range(2 * pool.max_workers):
+            submit()
+        while pending:
+            i, fut = pending.popleft()
+            docs = fut.result()
+            submit()
+            yield i, docs
+        log.info("Files parsed in parallel", tasks=len(tasks), workers=pool.max_workers)
+    finally:
+        for _, fut in pending:
+            fut.cancel()
+
+
+def iter_pages(path: Union[str, Path], sha256: Optional[str] = None) -> Iterator[Document]:
+    """
+    Pages of one file, yielded as each page range is extracted; at most a
+    few ranges are held in memory. With a content hash, a cached parse is
+    served from the blob store, and a fresh one is written to it as the
+    pages stream by.
+    """
+    cfg = load_config_section("document_loading")
+    path = Path(path)
+    if path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+        log.warning("Unsupported extension skipped", path=str(path))
+        return
+    store = get_blob_store() if cfg.get("parse_cache", True) and sha256 else None
+    if store is not None and store.has_parsed(sha256):
+        cached = store.load_parsed(sha256, str(path))
+        if cached is not None:
+            yield from cached
+            return
+    tasks = _plan([path], int(cfg.get("page_range_size", 64)))
+    pages = (d for _, docs in _iter_ranges(tasks, cfg.get("parallel", True)) for d in docs)
+    yield from (store.cache_parsed(sha256, pages) if store is not None else pages)
+
+
+def parse_files(paths: Iterable[Path], hashes: Optional[Sequence[Optional[str]]] = None) -> Iterator[List[Document]]:
+    """
+    Extract every file, yielding its pages in file order.
+
+    Files (and page ranges of large PDFs) are parsed concurrently in the
+    shared "parse" process pool; results are reassembled in submission
+    order, so the output is identical to a sequential parse. Each file is
+    yielded once complete, so only that file (plus the ranges in flight)
+    is in memory. When content hashes are given, blobs parsed before are
+    served from the blob store's parse cache and fresh results are added
+    to it.
+    """
+    cfg = load_config_section("document_loading")
+    paths = [Path(p) for p in paths]
+    hashes = list(hashes) if hashes is not None else [None] * len(paths)
+    files: List[Path] = []
+    file_hashes: List[Optional[str]] = []
+    for p, sha in zip(paths, hashes):
+        if p.suffix.lower() in SUPPORTED_EXTENSIONS:
+            files.append(p)
+            file_hashes.append(sha)
+        else:
+            log.warning("Unsupported extension skipped", path=str(p))
+
+    store = get_blob_store() if cfg.get("parse_cache", True) and any(file_hashes) else None
+    cached = [bool(store is not None and sha and store.has_parsed(sha)) for sha in file_hashes]
+    todo = [i for i, hit in enumerate(cached) if not hit]
+    range_size = int(cfg.get("page_range_size", 64))
+    tasks = [(todo[j], path, start, stop) for j, path, start, stop in _plan([files[i] for i in todo], range_size)]
+    ranges = _iter_ranges(tasks, cfg.get("parallel", True))
+    ready = next(ranges, None)
+
+    for i, (p, sha) in enumerate(zip(files, file_hashes)):
+        if cached[i]:
+            pages = store.load_parsed(sha, str(p))
+            if pages is None:  # collected since the check
+                pages = _parse_task(str(p))
+        else:
+            pages = []
+            while ready is not None and ready[0] == i:
+                pages.extend(ready[1])
+                ready = next(ranges, None)
+            if store is not None and sha:
+                store.save_parsed(sha, pages)
+        yield pages
+
+
+def load_documents(paths: Iterable[Path], hashes: Optional[Sequence[Optional[str]]] = None) -> List[Document]:
+    """Load docs using appropriate loader based on extension (parse cache used when hashes are given)."""
+    try:
+        docs = [d for pages in parse_files(paths, hashes) for d in pages]
         log.info("Documents loaded", count=len(docs))
         return docs
     except Exception as e:
@@ -47,11 +208,16 @@ def concat_for_comparison(ref_docs: List[Document], act_docs: List[Document]) ->
 
 # ---------- Helpers ----------
 class FastAPIFileAdapter:
-    """Adapt FastAPI UploadFile -> .name + .getbuffer() API"""
+    """Adapt FastAPI UploadFile -> .name + .stream() / .getbuffer() API"""
     def __init__(self, uf: UploadFile):
         self._uf = uf
         self.name = uf.filename
+    def stream(self):
+        """The spooled upload file, rewound; read it in chunks (see utils.file_io.stream_to_file)."""
+        self._uf.file.seek(0)
+        return self._uf.file
     def getbuffer(self) -> bytes:
+        # whole upload in memory; prefer stream() for anything large
         self._uf.file.seek(0)
         return self._uf.file.read()
 
@@ -0,0 +1,292 @@
+from __future__ import annotations
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from logger import GLOBAL_LOGGER as log
+from utils.config_loader import load_config_section
+from utils.embedding_engine import embed_array
+from utils.metrics import Counters
+
+_WS = re.compile(r"\s+")
+
+
+def text_key(text: str) -> str:
+    """Content hash of a chunk after unicode + whitespace normalization."""
+    norm = _WS.sub(" ", unicodedata.normalize("NFC", text)).strip()
+    return hashlib.sha256(norm.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed vector cache for one embedding model.
+
+    Layout (one directory per model id):
+        vectors.bin   fixed-width rows (8-byte key tag + float32/float16 vector), by slot
+        index.sqlite  key -> slot, last_used; free slots; dim/dtype
+
+    Slots of evicted (least recently used) entries are recycled, so the vector
+    file never grows past max_entries rows. SQLite serializes writers, which
+    keeps the cache safe to share between uvicorn workers; the key tag lets a
+    reader detect a slot recycled under it and treat it as a miss.
+    """
+
+    def __init__(self, root: Path, model_id: str, dtype: str = "float32", max_size_mb: int = 1024):
+        self.model_id = model_id
+        self.dtype = np.dtype(dtype)
+        self.max_size_bytes = max_size_mb * 2**20
+        self.dir = Path(root) / hashlib.sha1(model_id.encode("utf-8")).hexdigest()[:16]
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.dir / "vectors.bin"
+        self.vectors_path.touch(exist_ok=True)
+        self.counters = Counters(("hits", "misses", "evictions"))
+        self._lock = threading.Lock()
+        # autocommit mode; multi-statement updates open explicit transactions
+        self._db = sqlite3.connect(
+            str(self.dir / "index.sqlite"), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER NOT NULL, last_used REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_used);
+            CREATE TABLE IF NOT EXISTS free_slots (slot INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT NOT NULL);
+            """
+        )
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('model_id', ?)", (model_id,))
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('dtype', ?)", (self.dtype.name,))
+        stored_dtype = self._meta("dtype")
+        if stored_dtype != self.dtype.name:
+            log.warning("Embedding cache dtype differs from config; using stored dtype",
+                        stored=stored_dtype, configured=self.dtype.name)
+            self.dtype = np.dtype(stored_dtype)
+        dim = self._meta("dim")
+        self.dim: Optional[int] = int(dim) if dim else None
+
+    # ---------- Public API ----------
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        if self.dim is None:
+            dim = self._meta("dim")  # another worker may have written the first vectors
+            self.dim = int(dim) if dim else None
+        if not keys or self.dim is None:
+            self.counters.incr("misses", len(keys))
+            return {}
+        with self._lock:
+            found: Dict[str, int] = {}
+            uniq = list(dict.fromkeys(keys))
+            for i in range(0, len(uniq), 500):  # stay below SQLite's variable limit
+                batch = uniq[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                found.update(self._db.execute(
+                    f"SELECT key, slot FROM entries WHERE key IN ({marks})", batch
+                ).fetchall())
+            if found:
+                now = time.time()
+                self._db.execute("BEGIN")
+                self._db.executemany("UPDATE entries SET last_used=? WHERE key=?", [(now, k) for k in found])
+                self._db.execute("COMMIT")
+                found = {k: s for k, s in found.items() if s < self._rows_on_disk()}
+                tags, vecs = self._read_rows(list(found.values())) if found else ([], None)
+        out: Dict[str, np.ndarray] = {}
+        if found:
+            for i, k in enumerate(found):
+                if int(tags[i]) == self._tag(k):
+                    out[k] = vecs[i]
+        self.counters.incr("hits", len(out))
+        self.counters.incr("misses", len(uniq) - len(out))
+        return out
+
+    def put_many(self, items: Dict[str, Sequence[float]]) -> None:
+        if not items:
+            return
+        vecs = {k: np.asarray(v, dtype=np.float32) for k, v in items.items()}
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(next(iter(vecs.values())).shape[0])
+                self._db.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+                self.dim = int(self._meta("dim"))
+            cur = self._db.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                keys = list(vecs)
+                existing = set()
+                for i in range(0, len(keys), 500):
+                    batch = keys[i:i + 500]
+                    marks = ",".join("?" * len(batch))
+                    existing.update(r[0] for r in cur.execute(
+                        f"SELECT key FROM entries WHERE key IN ({marks})", batch
+                    ))
+                new_keys = [k for k in keys if k not in existing]
+                slots = self._allocate(cur, len(new_keys))
+                self._write_rows(slots, new_keys, [vecs[k] for k in new_keys])
+                now = time.time()
+                cur.executemany(
+                    "INSERT INTO entries(key, slot, last_used) VALUES (?, ?, ?)",
+                    [(k, s, now) for k, s in zip(new_keys, slots)],
+                )
+                self._evict(cur)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        out = self.counters.snapshot()
+        lookups = out["hits"] + out["misses"]
+        out.update(
+            entries=entries,
+            hit_ratio=round(out["hits"] / lookups, 3) if lookups else 0.0,
+            size_on_disk_bytes=sum(f.stat().st_size for f in self.dir.iterdir() if f.is_file()),
+            max_size_bytes=self.max_size_bytes,
+        )
+        return out
+
+    # ---------- Internals (caller holds self._lock) ----------
+
+    def _meta(self, k: str) -> Optional[str]:
+        row = self._db.execute("SELECT v FROM meta WHERE k=?", (k,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _tag(key: str) -> int:
+        return int(key[:16], 16)
+
+    @property
+    def _row_dtype(self) -> np.dtype:
+        return np.dtype([("tag", "<u8"), ("vec", self.dtype, (int(self.dim),))])
+
+    @property
+    def _row_bytes(self) -> int:
+        return self._row_dtype.itemsize
+
+    @property
+    def _max_entries(self) -> int:
+        return max(1, self.max_size_bytes // self._row_bytes)
+
+    def _allocate(self, cur: sqlite3.Cursor, n: int) -> List[int]:
+        slots = [r[0] for r in cur.execute("SELECT slot FROM free_slots LIMIT ?", (n,))]
+        if slots:
+            cur.executemany("DELETE FROM free_slots WHERE slot=?", [(s,) for s in slots])
+        if len(slots) < n:
+            row = cur.execute("SELECT v FROM meta WHERE k='next_slot'").fetchone()
+            start = int(row[0]) if row else 0
+            slots.extend(range(start, start + n - len(slots)))
+            cur.execute("INSERT OR REPLACE INTO meta VALUES ('next_slot', ?)", (str(slots[-1] + 1),))
+        return slots
+
+    def _evict(self, cur: sqlite3.Cursor) -> None:
+        count = cur.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        excess = count - self._max_entries
+        if excess <= 0:
+            return
+        victims = cur.execute(
+            "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (excess,)
+        ).fetchall()
+        cur.executemany("DELETE FROM entries WHERE key=?", [(k,) for k, _ in victims])
+        cur.executemany("INSERT OR IGNORE INTO free_slots(slot) VALUES (?)", [(s,) for _, s in victims])
+        self.counters.incr("evictions", len(victims))
+
+    def _write_rows(self, slots: List[int], keys: List[str], vectors: List[np.ndarray]) -> None:
+        if not slots:
+            return
+        row = np.zeros(1, dtype=self._row_dtype)
+        with open(self.vectors_path, "r+b") as f:
+            for slot, key, vec in zip(slots, keys, vectors):
+                row["tag"] = self._tag(key)
+                row["vec"] = vec
+                f.seek(slot * self._row_bytes)
+                f.write(row.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rows_on_disk(self) -> int:
+        return self.vectors_path.stat().st_size // self._row_bytes
+
+    def _read_rows(self, slots: List[int]):
+        # explicit shape ignores a torn tail row from a concurrent writer
+        rows = np.memmap(self.vectors_path, dtype=self._row_dtype, mode="r", shape=(self._rows_on_disk(),))
+        rows = rows[np.asarray(slots)]
+        return list(rows["tag"]), np.asarray(rows["vec"], dtype=np.float32)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves previously seen chunks from EmbeddingCache
+    and only sends unseen texts to the underlying model.
+    """
+
+    def __init__(self, base: Embeddings, cache: EmbeddingCache):
+        self.base = base
+        self.cache = cache
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        keys = [text_key(t) for t in texts]
+        cached = self.cache.get_many(keys)
+        missing: Dict[str, str] = {}
+        for k, t in zip(keys, texts):
+            if k not in cached and k not in missing:
+                missing[k] = t
+        if missing:
+            fresh = embed_array(self.base, list(missing.values()))
+            computed = dict(zip(missing.keys(), fresh))
+            self.cache.put_many(computed)
+            cached.update(computed)
+        log.info("Embeddings resolved", total=len(texts), cache_hits=len(texts) - len(missing))
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([cached[k] for k in keys]).astype(np.float32, copy=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
+
+    def __getattr__(self, name: str):
+        # expose model_name etc. of the wrapped embeddings
+        if name == "base":
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+
+_CACHES: Dict[str, EmbeddingCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def open_embedding_cache(model_id: str) -> Optional[EmbeddingCache]:
+    """Shared cache for model_id per process, or None when disabled in config."""
+    cfg = load_config_section("embedding_cache")
+    if not cfg.get("enabled", True):
+        return None
+    with _CACHES_LOCK:
+        cache = _CACHES.get(model_id)
+        if cache is None:
+            root = Path(os.getenv("EMBEDDING_CACHE_DIR", cfg.get("dir", "cache/embeddings")))
+            cache = EmbeddingCache(
+                root,
+                model_id,
+                dtype=cfg.get("dtype", "float32"),
+                max_size_mb=int(cfg.get("max_size_mb", 2048)),
+            )
+            _CACHES[model_id] = cache
+            log.info("Embedding cache opened", model=model_id, path=str(cache.dir), dtype=cache.dtype.name)
+        return cache
+
+
+def embedding_cache_stats() -> Dict[str, Dict[str, float]]:
+    with _CACHES_LOCK:
+        caches = dict(_CACHES)
+    return {model_id: cache.stats() for model_id, cache in caches.items()}
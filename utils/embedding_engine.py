@@ -0,0 +1,125 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from logger import GLOBAL_LOGGER as log
+
+
+def embed_array(embeddings: Embeddings, texts: Sequence[str]) -> np.ndarray:
+    """(n, dim) float32 vectors; zero-copy for engines that produce arrays, list round-trip otherwise."""
+    fn = getattr(embeddings, "embed_array", None)
+    if fn is not None:
+        return fn(list(texts))
+    vectors = np.asarray(embeddings.embed_documents(list(texts)), dtype=np.float32)
+    return vectors.reshape(len(texts), -1) if len(texts) else vectors
+
+
+class BatchEmbeddings(Embeddings):
+    """
+    SentenceTransformer encoder tuned for bulk ingestion; a drop-in for
+    HuggingFaceEmbeddings.
+
+    Texts are sorted by length (longest first) before batching, so each
+    batch pads to similar lengths; results come back in input order.
+    Encoding uses `batch_size` texts per forward pass and, with
+    `processes` > 1, SentenceTransformer's multi-process pool for inputs
+    large enough to amortize its IPC. embed_array() hands the float32
+    matrix straight to FAISS; embed_documents() keeps the LangChain API.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = 64,
+        normalize: bool = False,
+        processes: int = 0,
+        device: Optional[str] = None,
+        pool_min_texts: int = 512,
+        model: Any = None,
+    ):
+        if model is None:
+            from sentence_transformers import SentenceTransformer  # heavy; load only when used
+
+            model = SentenceTransformer(model_name, device=device)
+        self.model = model
+        self.model_name = model_name
+        self.batch_size = int(batch_size)
+        self.normalize = bool(normalize)
+        self.processes = int(processes)
+        self.pool_min_texts = int(pool_min_texts)
+        self._pool: Optional[Dict[str, Any]] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> Optional[Dict[str, Any]]:
+        if self.processes <= 1:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+                log.info("Embedding process pool started", model=self.model_name, processes=self.processes)
+            return self._pool
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        started = time.perf_counter()
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        ordered = [texts[i] for i in order]
+        pool = self._get_pool() if len(texts) >= self.pool_min_texts else None
+        if pool is not None:
+            vectors = self.model.encode_multi_process(
+                ordered, pool, batch_size=self.batch_size,
+                chunk_size=max(self.batch_size, -(-len(ordered) // (self.processes * 4))),
+            )
+            vectors = np.asarray(vectors, dtype=np.float32)
+            if self.normalize:
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        else:
+            vectors = self.model.encode(
+                ordered, batch_size=self.batch_size, convert_to_numpy=True,
+                normalize_embeddings=self.normalize, show_progress_bar=False,
+            )
+        out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        out[order] = vectors
+        elapsed = time.perf_counter() - started
+        log.info("Texts embedded", count=len(texts), batch_size=self.batch_size, processes=self.processes if pool else 1,
+                 chunks_per_sec=round(len(texts) / elapsed, 1) if elapsed else None)
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.model.encode(text, convert_to_numpy=True, normalize_embeddings=self.normalize,
+                                   show_progress_bar=False)
+        return np.asarray(vector, dtype=np.float32).tolist()
+
+    def close(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self.model.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+
+def engine_settings(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """BatchEmbeddings kwargs from the embedding_model config block (env EMBEDDING_BATCH_SIZE / EMBEDDING_PROCESSES)."""
+    processes = os.getenv("EMBEDDING_PROCESSES", cfg.get("processes", 0))
+    if str(processes).lower() == "auto":
+        processes = os.cpu_count() or 1
+    return {
+        "batch_size": int(os.getenv("EMBEDDING_BATCH_SIZE", cfg.get("batch_size", 64))),
+        "normalize": bool(cfg.get("normalize", False)),
+        "processes": int(processes),
+        "device": cfg.get("device"),
+        "pool_min_texts": int(cfg.get("pool_min_texts", 512)),
+    }
+
+
+def cache_id(model_name: str, settings: Dict[str, Any]) -> str:
+    """Embedding cache id: the model plus every engine setting that changes the vectors it returns."""
+    return f"{model_name}|norm={bool(settings.get('normalize', False))}"
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from logger import GLOBAL_LOGGER as log
+from utils.config_loader import load_config_section
+
+# pool name -> (kind, default size); sizes are overridable in config.yaml
+# (executors.<name>_workers) or via EXECUTOR_<NAME>_WORKERS
+POOL_DEFAULTS = {
+    "io": ("thread", 8),    # upload persistence, index save/load
+    "cpu": ("thread", 2),   # splitting, embedding, FAISS build (GIL released in C)
+    "parse": ("process", min(4, os.cpu_count() or 1)),  # PDF text extraction (holds the GIL)
+    "ingest": ("process", 1),  # queued /chat/index jobs (parse + embed + index write)
+}
+
+
+class BoundedExecutor:
+    """
+    Fixed-size thread/process pool that reports its queue depth.
+
+    Blocking stages are submitted here instead of running on the asyncio loop,
+    so a slow ingest cannot stall other requests on the same uvicorn worker.
+    """
+
+    def __init__(self, name: str, max_workers: int, kind: str = "thread"):
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        if kind == "process":
+            # spawn: forking a process that runs threads (uvicorn, pools) can deadlock
+            self._pool: Executor = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        with self._lock:
+            self._in_flight += 1
+        try:
+            fut = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        fut.add_done_callback(self._on_done)
+        return fut
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Await fn(*args, **kwargs) on this pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _on_done(self, fut: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+            if not fut.cancelled() and fut.exception() is not None:
+                self._failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.max_workers,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.max_workers),
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+
+_POOLS: Dict[str, BoundedExecutor] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _pool_size(name: str, default: int) -> int:
+    cfg = load_config_section("executors")
+    return int(os.getenv(f"EXECUTOR_{name.upper()}_WORKERS", cfg.get(f"{name}_workers", default)))
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    """Return the shared pool `name`, creating it on first use."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(name)
+        if pool is None:
+            if name not in POOL_DEFAULTS:
+                raise KeyError(f"Unknown executor pool: {name}")
+            kind, default = POOL_DEFAULTS[name]
+            pool = BoundedExecutor(name, max(1, _pool_size(name, default)), kind=kind)
+            _POOLS[name] = pool
+            log.info("Executor pool started", pool=name, kind=kind, workers=pool.max_workers)
+        return pool
+
+
+async def run_in_pool(name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Shortcut for `await get_executor(name).run(fn, *args, **kwargs)`."""
+    return await get_executor(name).run(functools.partial(fn, *args, **kwargs))
+
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    with _POOLS_LOCK:
+        return {name: pool.stats() for name, pool in _POOLS.items()}
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.shutdown(wait=wait)
+        _POOLS.clear()
@@ -1,16 +1,28 @@
 from __future__ import annotations
+import os
 import re
 import uuid
+import hashlib
+from dataclasses import dataclass
 from pathlib import Path
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import uuid
-from typing import Iterable, List
+from typing import Iterable, Iterator, List, Optional, Tuple
 from logger import GLOBAL_LOGGER as log
 from exception.custom_exception import DocumentportalException
+from utils.config_loader import load_config_section
 
 SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".txt"}
 
+_UPLOAD_CFG = load_config_section("uploads")
+UPLOAD_CHUNK_BYTES = int(_UPLOAD_CFG.get("chunk_kb", 1024)) * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", _UPLOAD_CFG.get("max_file_mb", 200))) * 2**20
+
+
+class UploadTooLargeError(ValueError):
+    """An upload exceeded MAX_UPLOAD_BYTES while being written."""
+
 # ----------------------------- #
 # Helpers (file I/O + loading)  #
 # ----------------------------- #
@@ -18,11 +30,80 @@ def generate_session_id(prefix: str = "session") -> str:
     ist = ZoneInfo("Asia/Kolkata")
     return f"{prefix}_{datetime.now(ist).strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
 
+@dataclass(frozen=True)
+class UploadRecord:
+    """A persisted upload: local path, original name and content hash."""
+    path: Path
+    name: str
+    sha256: str
+    size: int
+
+
+def iter_upload_chunks(uploaded_file, chunk_size: int = UPLOAD_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    Read an upload in fixed-size chunks: FastAPI adapters via .stream(),
+    file-likes (Streamlit UploadedFile, open files) via .read(n); objects that
+    only offer getbuffer() are already in memory and are sliced.
+    """
+    if hasattr(uploaded_file, "stream"):
+        src = uploaded_file.stream()
+    elif hasattr(uploaded_file, "read"):
+        src = uploaded_file
+    else:
+        buf = memoryview(uploaded_file.getbuffer())
+        for i in range(0, len(buf), chunk_size):
+            yield bytes(buf[i:i + chunk_size])
+        return
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_to_file(uploaded_file, out: Path, max_bytes: Optional[int] = MAX_UPLOAD_BYTES) -> Tuple[str, int]:
+    """
+    Copy an upload to `out` chunk by chunk, hashing as it goes; returns
+    (sha256, size). Memory use is one chunk regardless of file size. The file
+    is written under a temporary name and only renamed into place once
+    complete, so an oversized or failed upload leaves nothing behind.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp = out.with_name(out.name + ".part")
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in iter_upload_chunks(uploaded_file):
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLargeError(
+                        f"{getattr(uploaded_file, 'name', out.name)} exceeds the {max_bytes // 2**20} MB upload limit"
+                    )
+                digest.update(chunk)
+                f.write(chunk)
+        os.replace(tmp, out)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return digest.hexdigest(), size
+
+
+def persist_upload(uploaded_file, out: Path) -> UploadRecord:
+    sha, size = stream_to_file(uploaded_file, out)
+    return UploadRecord(path=out, name=getattr(uploaded_file, "name", out.name), sha256=sha, size=size)
+
+
 def save_uploaded_files(uploaded_files: Iterable, target_dir: Path) -> List[Path]:
     """Save uploaded files (Streamlit-like) and return local paths."""
+    return [r.path for r in save_uploads(uploaded_files, target_dir)]
+
+def save_uploads(uploaded_files: Iterable, target_dir: Path) -> List[UploadRecord]:
+    """Save uploaded files and return one UploadRecord (path, name, sha256) per file."""
+    from utils.blob_store import get_blob_store  # blob_store builds on this module
+
     try:
         target_dir.mkdir(parents=True, exist_ok=True)
-        saved: List[Path] = []
+        saved: List[UploadRecord] = []
         for uf in uploaded_files:
             name = getattr(uf, "name", "file")
             ext = Path(name).suffix.lower()
@@ -34,14 +115,11 @@ def save_uploaded_files(uploaded_files: Iterable, target_dir: Path) -> List[Path
             fname = f"{safe_name}_{uuid.uuid4().hex[:6]}{ext}"
             fname = f"{uuid.uuid4().hex[:8]}{ext}"
             out = target_dir / fname
-            with open(out, "wb") as f:
-                if hasattr(uf, "read"):
-                    f.write(uf.read())
-                else:
-                    f.write(uf.getbuffer())  # fallback
-            saved.append(out)
-            log.info("File saved for ingestion", uploaded=name, saved_as=str(out))
+            # stored once per content in the shared blob store; `out` links to it
+            record = get_blob_store().put(uf, out)
+            saved.append(record)
+            log.info("File saved for ingestion", uploaded=name, saved_as=str(out), sha256=record.sha256, bytes=record.size)
         return saved
     except Exception as e:
         log.error("Failed to save uploaded files", error=str(e), dir=str(target_dir))
-        raise DocumentportalException("Failed to save uploaded files", e) from e
\ No newline at end of file
+        raise DocumentportalException("Failed to save uploaded files", e) from e
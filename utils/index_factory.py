@@ -0,0 +1,213 @@
+from __future__ import annotations
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from logger import GLOBAL_LOGGER as log
+from utils.config_loader import load_config_section
+from utils.embedding_engine import embed_array
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+# vector storage of flat / HNSW / IVF-Flat indexes; IVF-PQ is compressed regardless
+STORAGE_TYPES = {
+    "float32": None,
+    "fp16": faiss.ScalarQuantizer.QT_fp16,  # half the bytes, recall practically unchanged
+    "sq8": faiss.ScalarQuantizer.QT_8bit,   # a quarter of the bytes; trained per segment
+}
+
+# faiss_db.index in config.yaml overrides these; FAISS_INDEX_TYPE overrides `type`
+_DEFAULTS: Dict[str, Any] = {
+    "type": "auto",
+    "flat_max": 20_000,       # exact search below this many vectors
+    "hnsw_max": 200_000,      # HNSW up to here, IVF above
+    "ivf_pq_min": 1_000_000,  # compress with PQ from here on
+    "nlist": None,            # IVF lists; default 4 * sqrt(n)
+    "nprobe": 16,
+    "hnsw_m": 32,
+    "ef_construction": 80,
+    "ef_search": 64,
+    "pq_m": 16,               # sub-quantizers; rounded down to a divisor of dim
+    "pq_bits": 8,
+    "train_sample": 50_000,
+    "storage": "float32",     # float32 | fp16 | sq8 (env FAISS_STORAGE)
+    "rescore_factor": 4,      # quantized storage: re-rank k * this candidates exactly; 0 = off
+}
+
+
+def index_settings(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    settings = dict(_DEFAULTS)
+    settings.update(load_config_section("faiss_db").get("index") or {})
+    if os.getenv("FAISS_INDEX_TYPE"):
+        settings["type"] = os.environ["FAISS_INDEX_TYPE"]
+    if os.getenv("FAISS_STORAGE"):
+        settings["storage"] = os.environ["FAISS_STORAGE"]
+    settings.update(overrides or {})
+    return settings
+
+
+def choose_index_type(n: int, settings: Optional[Dict[str, Any]] = None) -> str:
+    s = settings or index_settings()
+    kind = str(s["type"]).lower()
+    if kind != "auto":
+        if kind not in INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type: {kind}")
+        return kind
+    if n < s["flat_max"]:
+        return "flat"
+    if n < s["hnsw_max"]:
+        return "hnsw"
+    return "ivf_pq" if n >= s["ivf_pq_min"] else "ivf_flat"
+
+
+def _nlist(n: int, s: Dict[str, Any]) -> int:
+    nlist = int(s["nlist"] or 4 * math.sqrt(n))
+    # k-means wants ~39 training points per centroid
+    return max(1, min(nlist, n // 39))
+
+
+def _pq_m(dim: int, wanted: int) -> int:
+    return max(m for m in range(1, min(wanted, dim) + 1) if dim % m == 0)
+
+
+def _qtype(s: Dict[str, Any]):
+    storage = str(s.get("storage") or "float32").lower()
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown FAISS vector storage: {storage}")
+    return STORAGE_TYPES[storage]
+
+
+def new_index(dim: int, n: int, kind: str, settings: Optional[Dict[str, Any]] = None) -> faiss.Index:
+    """Empty (possibly untrained) L2 index of type `kind` sized for n vectors, in the configured storage."""
+    s = settings or index_settings()
+    qtype = _qtype(s)
+    if kind == "flat":
+        if qtype is not None:
+            return faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2)
+        return faiss.IndexFlatL2(dim)
+    if kind == "hnsw":
+        if qtype is not None:
+            index = faiss.IndexHNSWSQ(dim, qtype, int(s["hnsw_m"]))
+        else:
+            index = faiss.IndexHNSWFlat(dim, int(s["hnsw_m"]))
+        index.hnsw.efConstruction = int(s["ef_construction"])
+        return index
+    quantizer = faiss.IndexFlatL2(dim)
+    if kind == "ivf_flat":
+        if qtype is not None:
+            return faiss.IndexIVFScalarQuantizer(quantizer, dim, _nlist(n, s), qtype, faiss.METRIC_L2)
+        return faiss.IndexIVFFlat(quantizer, dim, _nlist(n, s))
+    if kind == "ivf_pq":
+        return faiss.IndexIVFPQ(quantizer, dim, _nlist(n, s), _pq_m(dim, int(s["pq_m"])), int(s["pq_bits"]))
+    raise ValueError(f"Unknown FAISS index type: {kind}")
+
+
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def storage_of(index: faiss.Index) -> str:
+    """float32 / fp16 / sq8 for scalar-quantized indexes; "pq" for IVF-PQ."""
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    sq = getattr(index, "sq", None)
+    if sq is None:
+        return "float32"
+    return next((name for name, qt in STORAGE_TYPES.items() if qt == sq.qtype), "sq")
+
+
+def apply_search_params(index: faiss.Index, settings: Optional[Dict[str, Any]] = None) -> None:
+    """Set query-time knobs (nprobe / efSearch) from config; no-op for flat indexes."""
+    s = settings or index_settings()
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = int(s["ef_search"])
+        return
+    try:
+        faiss.extract_index_ivf(index).nprobe = int(s["nprobe"])
+    except RuntimeError:
+        pass
+
+
+def reconstruct_all(index: faiss.Index) -> Optional[np.ndarray]:
+    """Stored vectors in insertion order, or None when the index only keeps lossy codes."""
+    if storage_of(index) not in ("float32", "fp16"):  # fp16 round-trips exactly
+        return None
+    try:
+        if isinstance(index, faiss.IndexIVF):
+            index.make_direct_map()
+        return index.reconstruct_n(0, int(index.ntotal))
+    except RuntimeError:
+        return None
+
+
+def read_index(path: str, index_type: str = "flat", mmap: bool = False) -> faiss.Index:
+    """
+    Read an index file; with mmap=True the vectors stay in the OS page cache
+    (shared across processes) instead of being copied onto this process' heap.
+    Memory-mapped indexes are read-only.
+    """
+    if not mmap:
+        return faiss.read_index(str(path))
+    if index_type in ("ivf_flat", "ivf_pq"):
+        flags = faiss.IO_FLAG_MMAP  # maps the inverted lists
+    else:
+        # zero-copy codes of flat / HNSW storage; older faiss builds lack the flag
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    return faiss.read_index(str(path), flags | faiss.IO_FLAG_READ_ONLY)
+
+
+def build_vectorstore(
+    texts: Sequence[str],
+    vectors: Iterable[Sequence[float]],
+    embeddings: Embeddings,
+    metadatas: Optional[List[dict]] = None,
+    ids: Optional[List[str]] = None,
+    settings: Optional[Dict[str, Any]] = None,
+) -> FAISS:
+    """LangChain FAISS store over pre-computed vectors, with the index type picked for their count."""
+    s = settings or index_settings()
+    matrix = np.asarray(vectors if isinstance(vectors, np.ndarray) else list(vectors), dtype=np.float32)
+    n, dim = matrix.shape
+    kind = choose_index_type(n, s)
+    index = new_index(dim, n, kind, s)
+    if not index.is_trained:
+        sample = matrix
+        if n > int(s["train_sample"]):
+            rows = np.random.default_rng(0).choice(n, int(s["train_sample"]), replace=False)
+            sample = matrix[rows]
+        index.train(sample)
+    apply_search_params(index, s)
+    store = FAISS(embeddings, index, InMemoryDocstore(), {})
+    store.add_embeddings(zip(texts, matrix), metadatas=metadatas, ids=ids)
+    if storage_of(index) in ("fp16", "sq8") and int(s.get("rescore_factor") or 0) > 0:
+        store.exact_vectors = matrix  # saved as a float32 side file for exact re-ranking
+    log.info("FAISS index built", index_type=kind, storage=storage_of(index), vectors=n, dim=dim)
+    return store
+
+
+def build_from_documents(
+    docs: List[Document],
+    embeddings: Embeddings,
+    ids: Optional[List[str]] = None,
+    settings: Optional[Dict[str, Any]] = None,
+) -> FAISS:
+    """Drop-in for FAISS.from_documents that goes through the index factory."""
+    texts = [d.page_content for d in docs]
+    return build_vectorstore(
+        texts, embed_array(embeddings, texts), embeddings, [d.metadata for d in docs], ids, settings
+    )
@@ -0,0 +1,68 @@
+from __future__ import annotations
+import os
+import sys
+import threading
+from typing import Dict, Iterable
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (falls back to peak RSS off Linux)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+        except Exception:
+            return 0
+
+
+def memory_breakdown() -> Dict[str, int]:
+    """
+    RSS split into private heap (rss_anon) and file-backed pages (rss_file).
+
+    Memory-mapped indexes show up under rss_file: those pages live in the OS
+    page cache and are shared by every worker mapping the same file.
+    """
+    out = {"rss": current_rss_bytes()}
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("RssAnon", "RssFile", "RssShmem"):
+                    out["rss_" + key[3:].lower()] = int(rest.split()[0]) * 1024
+    except OSError:
+        pass
+    return out
+
+
+class Counters:
+    """Thread-safe named counters, snapshotted by the /metrics endpoint."""
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._lock = threading.Lock()
+        self._values: Dict[str, float] = {n: 0 for n in names}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + value
+
+    def set(self, name: str, value: float) -> None:
+        with self._lock:
+            self._values[name] = value
+
+    def get(self, name: str) -> float:
+        with self._lock:
+            return self._values.get(name, 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self) -> None:
+        with self._lock:
+            for k in self._values:
+                self._values[k] = 0
@@ -1,6 +1,9 @@
 from dotenv import load_dotenv
 import os
 import sys
+import time
+import threading
+from typing import Any, Callable, Dict, Optional
 # from langchain_groq import ChatGroq #s
 # from langchain_huggingface.embeddings import HuggingFaceEmbeddings
 from langchain_community.embeddings import HuggingFaceEmbeddings
@@ -9,6 +12,9 @@ from utils.config_loader import load_config
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from logger.custom_logger import CustomLogger
 from exception.custom_exception import DocumentportalException
+from utils.metrics import current_rss_bytes
+from utils.embedding_cache import CachedEmbeddings, open_embedding_cache
+from utils.embedding_engine import BatchEmbeddings, cache_id, engine_settings
 # from langchain_google_genai import ChatGoogleGenerativeAI
 # from langchain_groq import ChatGroq
 
@@ -53,7 +59,12 @@ class ModelLoader:
             log.info("logading embedding model")
             model_name = self.config['embedding_model']['model']
             
-            return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")         
+            # length-sorted batches, optional multi-process encoding, float32 arrays for FAISS
+            settings = engine_settings(self.config['embedding_model'])
+            embeddings = BatchEmbeddings(model_name, **settings)
+            # previously embedded chunks are served from the on-disk cache (per model + normalize setting)
+            cache = open_embedding_cache(cache_id(model_name, settings))
+            return CachedEmbeddings(embeddings, cache) if cache else embeddings
         
         except Exception as e:
             log.error("Error loading embedding model" , error = str(e))
@@ -115,8 +126,86 @@ class ModelLoader:
             log.error("Unsupported LLM provider", provider=provider)
             raise ValueError(f"Unsupported LLM provider: {provider}")
         
-        
-        
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models, keyed by their config key.
+
+    Every request used to build a fresh ModelLoader (dotenv + config parse) and a
+    fresh SentenceTransformer. The registry loads each model once per process,
+    hands out the shared instance afterwards and records load time / RSS growth.
+
+    Usage:
+        emb = MODEL_REGISTRY.get_embedding_model()
+        llm = MODEL_REGISTRY.get_llm()
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loader: Optional[ModelLoader] = None
+        self._models: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def loader(self) -> ModelLoader:
+        with self._lock:
+            if self._loader is None:
+                self._loader = ModelLoader()
+            return self._loader
+
+    def _get_or_load(self, key: str, factory: Callable[[], Any]) -> Any:
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                rss_before = current_rss_bytes()
+                started = time.perf_counter()
+                model = factory()
+                self._stats[key] = {
+                    "load_seconds": round(time.perf_counter() - started, 3),
+                    "rss_delta_mb": round((current_rss_bytes() - rss_before) / 2**20, 1),
+                    "loaded_at": time.time(),
+                }
+                self._models[key] = model
+                log.info("Model loaded into registry", key=key, **self._stats[key])
+        return model
+
+    def embedding_key(self) -> str:
+        return f"embedding:{self.loader.config['embedding_model']['model']}"
+
+    def llm_key(self) -> str:
+        provider_key = os.getenv("LLM_PROVIDER", "openai")
+        llm_config = self.loader.config["llm"].get(provider_key) or {}
+        return f"llm:{provider_key}:{llm_config.get('model_name')}"
+
+    def get_embedding_model(self):
+        return self._get_or_load(self.embedding_key(), self.loader.load_embedding_model)
+
+    def get_llm(self):
+        return self._get_or_load(self.llm_key(), self.loader.load_llm)
+
+    def warm(self) -> Dict[str, Dict[str, Any]]:
+        """Load every configured model up front (called at API startup)."""
+        self.get_embedding_model()
+        self.get_llm()
+        return self.stats()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {k: dict(v) for k, v in self._stats.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+            self._stats.clear()
+            self._loader = None
+
+
+# Shared per-process instance
+MODEL_REGISTRY = ModelRegistry()
 
 
 if __name__ == '__main__':
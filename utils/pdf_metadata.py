@@ -0,0 +1,125 @@
+from __future__ import annotations
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import fitz  # PyMuPDF
+
+UNKNOWN = "Unknown"
+
+# PDF date strings: D:YYYYMMDDHHmmSSOHH'mm' (every part after the year optional)
+_PDF_DATE = re.compile(
+    r"^D?:?(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?(?:([Zz+\-])(\d{2})?'?(\d{2})?'?)?"
+)
+_XMP_PUBLISHER = re.compile(r"<dc:publisher>.*?<rdf:li[^>]*>(.*?)</rdf:li>", re.DOTALL)
+_WORD = re.compile(r"[^\W\d_]+")
+
+# most frequent function words; enough to tell these languages apart on a page of text
+_STOPWORD_TEXT = {
+    "English": "the of and to in is that for it with as was on be by this are or from at which not have an",
+    "French": "le la les de des et un une du en est que qui dans pour pas sur au par avec ce sont plus",
+    "German": "der die das und ist nicht ein eine zu den von mit sich des auf für im dem auch als wird",
+    "Spanish": "el la los las de y que en un una es por con para del se no su al lo como más",
+    "Italian": "il la di che e un una per non del della con sono gli le si nel alla anche come più",
+    "Portuguese": "o a os as de e que do da em um uma para com não dos das se na no por mais",
+    "Dutch": "de het een en van is dat op te in zijn niet met voor die er aan ook als bij",
+}
+_STOPWORDS = {lang: set(words.split()) for lang, words in _STOPWORD_TEXT.items()}
+# scripts identify the language on their own: (first, last code point, language)
+_SCRIPTS = [
+    (0x0400, 0x04FF, "Russian"), (0x0600, 0x06FF, "Arabic"), (0x0900, 0x097F, "Hindi"),
+    (0x3040, 0x30FF, "Japanese"), (0xAC00, 0xD7AF, "Korean"), (0x4E00, 0x9FFF, "Chinese"),
+]
+_LANG_CODES = {
+    "en": "English", "fr": "French", "de": "German", "es": "Spanish", "it": "Italian", "pt": "Portuguese",
+    "nl": "Dutch", "ru": "Russian", "ar": "Arabic", "hi": "Hindi", "ja": "Japanese", "ko": "Korean", "zh": "Chinese",
+}
+
+
+def parse_pdf_date(value: Optional[str]) -> Optional[str]:
+    """ISO 8601 from a PDF date string ("D:20240102030405+01'00'"); None if unparseable."""
+    m = _PDF_DATE.match((value or "").strip())
+    if not m:
+        return None
+    year, month, day, hour, minute, second, sign, tz_h, tz_m = m.groups()
+    try:
+        tz = None
+        if sign in ("Z", "z"):
+            tz = timezone.utc
+        elif sign:
+            offset = timedelta(hours=int(tz_h or 0), minutes=int(tz_m or 0))
+            tz = timezone(offset if sign == "+" else -offset)
+        dt = datetime(int(year), int(month or 1), int(day or 1), int(hour or 0), int(minute or 0), int(second or 0),
+                      tzinfo=tz)
+    except ValueError:
+        return None
+    return dt.isoformat()
+
+
+def detect_language(text: str, min_hits: int = 5) -> Optional[str]:
+    """
+    Language name from the text itself: non-Latin scripts by code point
+    range, Latin-script languages by stopword frequency. None when the
+    sample is too small to tell.
+    """
+    scripts = Counter()
+    for ch in text:
+        cp = ord(ch)
+        if cp >= 0x0400:
+            for first, last, lang in _SCRIPTS:
+                if first <= cp <= last:
+                    scripts[lang] += 1
+                    break
+    letters = sum(ch.isalpha() for ch in text)
+    if scripts:
+        lang, count = scripts.most_common(1)[0]
+        if lang == "Chinese" and scripts["Japanese"]:
+            lang = "Japanese"  # kanji + kana
+        if letters and count / letters > 0.3:
+            return lang
+    hits = Counter()
+    for word in _WORD.findall(text.lower()):
+        for lang, stopwords in _STOPWORDS.items():
+            if word in stopwords:
+                hits[lang] += 1
+    if not hits:
+        return None
+    lang, count = hits.most_common(1)[0]
+    return lang if count >= min_hits else None
+
+
+def _catalog_language(doc: fitz.Document) -> Optional[str]:
+    # the document's declared /Lang (e.g. "en-US"), set by most authoring tools
+    try:
+        kind, value = doc.xref_get_key(doc.pdf_catalog(), "Lang")
+    except Exception:
+        return None
+    if kind != "string" or not value:
+        return None
+    return _LANG_CODES.get(value.split("-")[0].lower(), value)
+
+
+def extract_pdf_metadata(path: Union[str, Path], sample_pages: int = 5) -> Dict[str, str]:
+    """
+    The Metadata fields a PDF carries itself: Title, Author, DateCreated,
+    LastModifiedDate, Publisher (XMP dc:publisher), PageCount and Language
+    (detected from the first `sample_pages` pages, else the catalog /Lang).
+    Missing values are "Unknown"; Title falls back to the first text line.
+    """
+    with fitz.open(str(path)) as doc:
+        info = doc.metadata or {}
+        sample = "\n".join(doc.load_page(i).get_text() for i in range(min(sample_pages, doc.page_count)))
+        xmp = doc.get_xml_metadata() or ""
+        publisher = _XMP_PUBLISHER.search(xmp)
+        first_line = next((line.strip() for line in sample.splitlines() if line.strip()), "")
+        return {
+            "Title": (info.get("title") or "").strip() or first_line[:200] or UNKNOWN,
+            "Author": (info.get("author") or "").strip() or UNKNOWN,
+            "DateCreated": parse_pdf_date(info.get("creationDate")) or UNKNOWN,
+            "LastModifiedDate": parse_pdf_date(info.get("modDate")) or UNKNOWN,
+            "Publisher": publisher.group(1).strip() if publisher else UNKNOWN,
+            "PageCount": str(doc.page_count),
+            "Language": detect_language(sample) or _catalog_language(doc) or UNKNOWN,
+        }
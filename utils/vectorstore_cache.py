@@ -0,0 +1,162 @@
+from __future__ import annotations
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from logger import GLOBAL_LOGGER as log
+from utils.config_loader import load_config_section
+from utils.metrics import Counters
+
+# files whose (mtime, size) identify one on-disk version of an index directory
+VERSION_FILES = ("{index_name}.faiss", "{index_name}.pkl", "manifest.json")
+
+
+def index_version(index_dir: str, index_name: str = "index") -> Tuple:
+    """Cheap version stamp of an index dir: (name, mtime_ns, size) of its files."""
+    stamp = []
+    for pattern in VERSION_FILES:
+        path = os.path.join(index_dir, pattern.format(index_name=index_name))
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        stamp.append((os.path.basename(path), st.st_mtime_ns, st.st_size))
+    return tuple(stamp)
+
+
+def _estimate_bytes(index_dir: str, index_name: str, vectorstore: Any) -> int:
+    # segmented stores know their own size; manifest.json alone says nothing about it
+    approx = getattr(vectorstore, "approx_bytes", None)
+    if approx:
+        return int(approx)
+    # on-disk size tracks the in-memory footprint closely (raw vectors + pickled texts)
+    size = 0
+    for _, _, st_size in index_version(index_dir, index_name):
+        size += st_size
+    if size:
+        return size
+    index = getattr(vectorstore, "index", None)
+    if index is not None:
+        return int(index.ntotal) * int(index.d) * 4
+    return 0
+
+
+class VectorStoreCache:
+    """
+    Per-worker LRU cache of loaded vector stores.
+
+    Entries are keyed by (index dir, index name) and tagged with the on-disk
+    version; a changed version is treated as a miss and reloaded. Least recently
+    used stores are evicted once the estimated memory budget is exceeded.
+    """
+
+    def __init__(self, max_bytes: int, max_entries: int = 32):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._total_bytes = 0
+        self.counters = Counters(("hits", "misses", "stale", "evictions", "puts"))
+
+    @staticmethod
+    def _key(index_dir: str, index_name: str) -> Tuple[str, str]:
+        return os.path.abspath(index_dir), index_name
+
+    def _key_lock(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, index_dir: str, index_name: str = "index") -> Optional[Any]:
+        key = self._key(index_dir, index_name)
+        version = index_version(key[0], index_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["version"] != version:
+                self.counters.incr("stale")
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self.counters.incr("hits")
+            return entry["store"]
+
+    def get_or_load(self, index_dir: str, index_name: str, loader: Callable[[], Any]) -> Any:
+        """Return the cached store for index_dir, loading it with `loader` on a miss."""
+        key = self._key(index_dir, index_name)
+        store = self.get(index_dir, index_name)
+        if store is not None:
+            return store
+        # one loader per key so concurrent queries don't deserialize the same index twice
+        with self._key_lock(key):
+            store = self.get(index_dir, index_name)
+            if store is not None:
+                return store
+            self.counters.incr("misses")
+            store = loader()
+            self.put(index_dir, index_name, store, count=False)
+            return store
+
+    def put(self, index_dir: str, index_name: str, store: Any, count: bool = True) -> None:
+        key = self._key(index_dir, index_name)
+        entry = {
+            "store": store,
+            "version": index_version(key[0], index_name),
+            "bytes": _estimate_bytes(key[0], index_name, store),
+        }
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._total_bytes += entry["bytes"]
+            if count:
+                self.counters.incr("puts")
+            self._evict()
+
+    def invalidate(self, index_dir: str, index_name: str = "index") -> None:
+        with self._lock:
+            self._drop(self._key(index_dir, index_name))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = self.counters.snapshot()
+            out.update(
+                entries=len(self._entries),
+                bytes=self._total_bytes,
+                max_bytes=self.max_bytes,
+            )
+            return out
+
+    # ---------- Internals (caller holds self._lock) ----------
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry["bytes"]
+
+    def _evict(self) -> None:
+        # always keep the most recent entry, even if it alone exceeds the budget
+        while len(self._entries) > 1 and (
+            self._total_bytes > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            key, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry["bytes"]
+            self.counters.incr("evictions")
+            log.info("Vector store evicted from cache", index_dir=key[0], bytes=entry["bytes"])
+
+
+def _build_default_cache() -> VectorStoreCache:
+    cfg = load_config_section("vectorstore_cache")
+    max_mb = int(os.getenv("VECTORSTORE_CACHE_MB", cfg.get("max_memory_mb", 1024)))
+    return VectorStoreCache(max_bytes=max_mb * 2**20, max_entries=int(cfg.get("max_entries", 32)))
+
+
+# Shared per-process instance
+VECTORSTORE_CACHE = _build_default_cache()